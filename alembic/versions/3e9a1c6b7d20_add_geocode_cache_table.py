@@ -0,0 +1,31 @@
+"""add geocode cache table
+
+Revision ID: 3e9a1c6b7d20
+Revises: c5d8a2e94f17
+Create Date: 2026-10-18 23:12:40.518362
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3e9a1c6b7d20'
+down_revision = 'c5d8a2e94f17'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+table_name = 'geocode_cache'
+
+
+def upgrade():
+    op.create_table(table_name,
+                    sa.Column('location', sa.Text(), nullable=False),
+                    sa.Column('result', sa.types.JSON(), nullable=False),
+                    sa.Column('created', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('location')
+                    )
+
+
+def downgrade():
+    op.drop_table(table_name)
@@ -0,0 +1,41 @@
+"""add clusters pyramid table
+
+Revision ID: 3fd1a2b9c8e4
+Revises: 16c2d576e01e
+Create Date: 2026-10-18 10:12:41.382613
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3fd1a2b9c8e4'
+down_revision = '16c2d576e01e'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+table_name = 'clusters_pyramid'
+
+
+def upgrade():
+    op.create_table(table_name,
+                    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+                    sa.Column('zoom', sa.Integer(), nullable=False),
+                    sa.Column('tile_x', sa.Integer(), nullable=False),
+                    sa.Column('tile_y', sa.Integer(), nullable=False),
+                    sa.Column('accident_year', sa.Integer(), nullable=False),
+                    sa.Column('accident_month', sa.Integer(), nullable=False),
+                    sa.Column('provider_code', sa.Integer(), nullable=False),
+                    sa.Column('accident_severity', sa.Integer(), nullable=True),
+                    sa.Column('latitude', sa.Float(), nullable=False),
+                    sa.Column('longitude', sa.Float(), nullable=False),
+                    sa.Column('size', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('clusters_pyramid_zoom_tile_idx', table_name, ['zoom', 'tile_x', 'tile_y'], unique=False)
+
+
+def downgrade():
+    op.drop_index('clusters_pyramid_zoom_tile_idx', table_name=table_name)
+    op.drop_table(table_name)
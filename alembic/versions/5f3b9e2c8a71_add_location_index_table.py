@@ -0,0 +1,31 @@
+"""add location index table
+
+Revision ID: 5f3b9e2c8a71
+Revises: 8d2c5a1f7e34
+Create Date: 2026-10-19 11:03:52.771940
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5f3b9e2c8a71'
+down_revision = '8d2c5a1f7e34'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+table_name = 'location_index'
+
+
+def upgrade():
+    op.create_table(table_name,
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('markers', sa.LargeBinary(), nullable=False),
+                    sa.Column('created', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+
+
+def downgrade():
+    op.drop_table(table_name)
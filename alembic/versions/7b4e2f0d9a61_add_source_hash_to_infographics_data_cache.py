@@ -0,0 +1,30 @@
+"""add source_hash to infographics data cache tables
+
+Revision ID: 7b4e2f0d9a61
+Revises: 3fd1a2b9c8e4
+Create Date: 2026-10-18 21:22:05.618204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7b4e2f0d9a61'
+down_revision = '3fd1a2b9c8e4'
+branch_labels = None
+depends_on = None
+
+import sqlalchemy as sa
+
+from alembic import op
+
+table_name = 'infographics_data_cache'
+table_name_temp = 'infographics_data_cache_temp'
+
+
+def upgrade():
+    op.add_column(table_name, sa.Column('source_hash', sa.Text(), nullable=True))
+    op.add_column(table_name_temp, sa.Column('source_hash', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column(table_name_temp, 'source_hash')
+    op.drop_column(table_name, 'source_hash')
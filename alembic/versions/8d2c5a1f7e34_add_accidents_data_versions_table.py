@@ -0,0 +1,31 @@
+"""add accidents data versions table
+
+Revision ID: 8d2c5a1f7e34
+Revises: 3e9a1c6b7d20
+Create Date: 2026-10-19 09:41:17.204519
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8d2c5a1f7e34'
+down_revision = '3e9a1c6b7d20'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+table_name = 'accidents_data_versions'
+
+
+def upgrade():
+    op.create_table(table_name,
+                    sa.Column('source', sa.Text(), nullable=False),
+                    sa.Column('version', sa.Integer(), nullable=False),
+                    sa.Column('updated', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('source')
+                    )
+
+
+def downgrade():
+    op.drop_table(table_name)
@@ -0,0 +1,162 @@
+"""partition markers, involved and vehicles by accident_year
+
+Revision ID: c5d8a2e94f17
+Revises: 7b4e2f0d9a61
+Create Date: 2026-10-18 21:48:12.203941
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8a2e94f17'
+down_revision = '7b4e2f0d9a61'
+branch_labels = None
+depends_on = None
+
+import logging
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# in the order of their foreign keys
+TABLES = ('markers', 'involved', 'vehicles')
+PARTITIONED_PRIMARY_KEYS = {
+    'markers': 'PRIMARY KEY (id, provider_code, accident_year)',
+    'involved': 'PRIMARY KEY (id, accident_year)',
+    'vehicles': 'PRIMARY KEY (id, accident_year)',
+}
+PRIMARY_KEYS = {
+    'markers': 'PRIMARY KEY (id, provider_code, accident_year)',
+    'involved': 'PRIMARY KEY (id)',
+    'vehicles': 'PRIMARY KEY (id)',
+}
+# foreign keys referencing partitioned tables need PostgreSQL 12
+MIN_SERVER_VERSION = (12,)
+
+DEPENDENT_VIEWS = """
+WITH RECURSIVE dependent_views(oid) AS (
+    SELECT rewrite.ev_class
+    FROM pg_depend depend JOIN pg_rewrite rewrite ON rewrite.oid = depend.objid
+    WHERE depend.refobjid IN ('markers'::regclass, 'involved'::regclass, 'vehicles'::regclass)
+    UNION
+    SELECT rewrite.ev_class
+    FROM dependent_views
+    JOIN pg_depend depend ON depend.refobjid = dependent_views.oid
+    JOIN pg_rewrite rewrite ON rewrite.oid = depend.objid
+    WHERE rewrite.ev_class <> dependent_views.oid
+)
+SELECT class.relname, pg_get_viewdef(class.oid)
+FROM dependent_views JOIN pg_class class ON class.oid = dependent_views.oid
+WHERE class.relkind = 'v'
+ORDER BY class.oid
+"""
+# primary key, unique, foreign key, check and exclusion constraints
+CONSTRAINT_TYPES = ('p', 'u', 'f', 'c', 'x')
+# the foreign keys last, they may reference the other constraints of the table
+CONSTRAINTS = """
+SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+WHERE conrelid = CAST(:table AS regclass) AND conparentid = 0
+ORDER BY contype = 'f', conname
+"""
+INDEXES = """
+SELECT indexname, indexdef FROM pg_indexes
+WHERE tablename = :table
+AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass))
+"""
+
+
+def is_partitioned(conn):
+    return conn.execute("SELECT relkind FROM pg_class WHERE oid = 'markers'::regclass").scalar() == 'p'
+
+
+def check_constraints(constraints, partitioned):
+    """
+    fails before anything is changed when a constraint can't be carried over to the rebuilt table
+    """
+    for table, rows in constraints.items():
+        for name, constraint_type, definition in rows:
+            if constraint_type not in CONSTRAINT_TYPES:
+                raise RuntimeError(
+                    f'{table} constraint {name} of type {constraint_type} can not be carried over'
+                )
+            # unique and exclusion constraints of a partitioned table must include its partition key
+            if partitioned and constraint_type in ('u', 'x') and 'accident_year' not in definition:
+                raise RuntimeError(
+                    f'{table} constraint {name} does not include accident_year, '
+                    f'it can not be carried over to the partitioned table: {definition}'
+                )
+
+
+def rebuild_tables(partitioned):
+    """
+    recreates the tables, with their data, constraints, indexes and dependent views, as tables
+    partitioned by accident_year with a partition per year, or back as regular tables
+    """
+    conn = op.get_bind()
+    views = conn.execute(DEPENDENT_VIEWS).fetchall()
+    for name, _ in reversed(views):
+        op.execute(f'DROP VIEW {name}')
+    constraints = {}
+    indexes = {}
+    sequences = {}
+    for table in TABLES:
+        constraints[table] = conn.execute(sa.text(CONSTRAINTS), table=table).fetchall()
+        indexes[table] = conn.execute(sa.text(INDEXES), table=table).fetchall()
+        sequences[table] = conn.execute(
+            sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), table=table
+        ).scalar()
+    check_constraints(constraints, partitioned)
+
+    for table in TABLES:
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_rebuild')
+        if sequences[table]:
+            op.execute(f'ALTER SEQUENCE {sequences[table]} OWNED BY NONE')
+        if partitioned:
+            op.execute(
+                f'CREATE TABLE {table} (LIKE {table}_rebuild INCLUDING DEFAULTS) '
+                f'PARTITION BY LIST (accident_year)'
+            )
+            years = conn.execute(
+                f'SELECT DISTINCT accident_year FROM {table}_rebuild WHERE accident_year IS NOT NULL'
+            ).fetchall()
+            for (year,) in years:
+                op.execute(f'CREATE TABLE {table}_{year} PARTITION OF {table} FOR VALUES IN ({year})')
+            op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        else:
+            op.execute(f'CREATE TABLE {table} (LIKE {table}_rebuild INCLUDING DEFAULTS)')
+        op.execute(f'INSERT INTO {table} SELECT * FROM {table}_rebuild')
+    for table in reversed(TABLES):
+        op.execute(f'DROP TABLE {table}_rebuild')
+
+    primary_keys = PARTITIONED_PRIMARY_KEYS if partitioned else PRIMARY_KEYS
+    for table in TABLES:
+        for name, constraint_type, definition in constraints[table]:
+            if constraint_type == 'p':
+                definition = primary_keys[table]
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+        for _, definition in indexes[table]:
+            # the indexes of a partitioned table are listed as created on it ONLY
+            op.execute(definition.replace(' ON ONLY ', ' ON '))
+        if sequences[table]:
+            op.execute(f'ALTER SEQUENCE {sequences[table]} OWNED BY {table}.id')
+    for name, definition in views:
+        op.execute(f'CREATE VIEW {name} AS {definition}')
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.server_version_info < MIN_SERVER_VERSION:
+        logging.getLogger('alembic.runtime.migration').warning(
+            'PostgreSQL %s does not support partitioned tables with foreign keys, '
+            'markers, involved and vehicles are left unpartitioned',
+            '.'.join(map(str, conn.dialect.server_version_info)),
+        )
+        return
+    if not is_partitioned(conn):
+        rebuild_tables(partitioned=True)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.server_version_info >= MIN_SERVER_VERSION and is_partitioned(conn):
+        rebuild_tables(partitioned=False)
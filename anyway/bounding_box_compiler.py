@@ -0,0 +1,312 @@
+"""
+Compiles the /markers filters of AccidentMarker.bounding_box_query into a single cached SQL
+statement. The filters that are active decide the shape of the statement and their values are
+bound as parameters, so each shape is built and compiled by SQLAlchemy once per process, and
+accident and RSA markers are fetched together, told apart by an is_rsa column.
+"""
+from sqlalchemy import and_, bindparam, case, cast, desc, func, or_, sql
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.ext import baked
+from sqlalchemy.orm import load_only
+
+from anyway.app_and_db import db
+from anyway.backend_constants import BE_CONST
+from anyway.models import (
+    AccidentMarker,
+    Involved,
+    MarkerResult,
+    Vehicle,
+    MARKER_FIELDS,
+    THIN_MARKER_FIELDS,
+)
+
+bakery = baked.bakery()
+
+
+def get_markers_filter(kwargs):
+    """
+    Reads the accident markers filters of bounding_box_query out of kwargs.
+    :return: (shape, params) - shape is a hashable description of the active filters, None when
+             no accident marker can match, and params the values of its bind parameters
+    """
+    shape = []
+    params = {}
+    approx = kwargs.get("approx", True)
+    accurate = kwargs.get("accurate", True)
+
+    if not kwargs["show_accidents"]:
+        shape.append(("hide_accidents",))
+    if accurate and not approx:
+        shape.append(("accurate_only",))
+    elif approx and not accurate:
+        shape.append(("approx_only",))
+    for severity, arg in ((1, "show_fatal"), (2, "show_severe"), (3, "show_light")):
+        if not kwargs.get(arg, True):
+            shape.append(("hide_severity", severity))
+    for arg in ("show_urban", "show_intersection", "show_lane"):
+        if kwargs.get(arg, 3) != 3:
+            if kwargs[arg] not in (1, 2):
+                return None, {}
+            shape.append((arg, kwargs[arg]))
+
+    if kwargs.get("show_day", 7) != 7:
+        shape.append(("show_day",))
+        params["show_day"] = kwargs["show_day"]
+    if kwargs.get("show_holiday", 0) != 0:
+        shape.append(("show_holiday",))
+        params["show_holiday"] = kwargs["show_holiday"]
+    if kwargs.get("show_time", 24) != 24:
+        if kwargs["show_time"] in (25, 26):
+            shape.append(("show_time", kwargs["show_time"]))
+        else:
+            shape.append(("show_time",))
+            params["start_hour"] = kwargs["show_time"]
+            params["end_hour"] = kwargs["show_time"] + 6
+    elif kwargs.get("start_time", 25) != 25 and kwargs.get("end_time", 25) != 25:
+        shape.append(("show_time",))
+        params["start_hour"] = kwargs["start_time"]
+        params["end_hour"] = kwargs["end_time"]
+    for arg in ("weather", "road", "separation", "surface", "controlmeasure", "district"):
+        if kwargs.get(arg, 0) != 0:
+            shape.append((arg,))
+            params[arg] = kwargs[arg]
+    if kwargs.get("acctype", 0) != 0:
+        if kwargs["acctype"] <= 20:
+            shape.append(("acctype",))
+            params["acctype"] = kwargs["acctype"]
+        elif kwargs["acctype"] == BE_CONST.BIKE_ACCIDENTS:
+            shape.append(("bike_accidents",))
+    if kwargs.get("case_type", 0) != 0:
+        shape.append(("case_type",))
+        params["case_type"] = kwargs["case_type"]
+
+    if not kwargs.get("age_groups"):
+        return None, {}
+    age_groups_list = kwargs["age_groups"].split(",")
+    if kwargs.get("light_transportation", False) == True:
+        shape.append(("light_transportation",))
+        params["age_groups"] = age_groups_list
+    elif len(age_groups_list) < (BE_CONST.AGE_GROUPS_NUMBER + 1):
+        shape.append(("age_groups",))
+        params["age_groups"] = age_groups_list
+    return tuple(shape), params
+
+
+def get_markers_criteria(shape):
+    """
+    Builds the accident markers criteria of a filters shape, see get_markers_filter.
+    """
+    if shape is None:
+        return sql.false()
+    hour = func.extract("hour", AccidentMarker.created)
+    criteria = [AccidentMarker.provider_code != BE_CONST.RSA_PROVIDER_CODE]
+    for name, *option in shape:
+        if name == "hide_accidents":
+            criteria.append(
+                AccidentMarker.provider_code.notin_(
+                    [
+                        BE_CONST.CBS_ACCIDENT_TYPE_1_CODE,
+                        BE_CONST.CBS_ACCIDENT_TYPE_3_CODE,
+                        BE_CONST.UNITED_HATZALA_CODE,
+                    ]
+                )
+            )
+        elif name == "accurate_only":
+            criteria.append(AccidentMarker.location_accuracy == 1)
+        elif name == "approx_only":
+            criteria.append(AccidentMarker.location_accuracy != 1)
+        elif name == "hide_severity":
+            criteria.append(AccidentMarker.accident_severity != option[0])
+        elif name == "show_urban":
+            criteria.append(
+                AccidentMarker.road_type.between(1, 2)
+                if option[0] == 2
+                else AccidentMarker.road_type.between(3, 4)
+            )
+        elif name == "show_intersection":
+            criteria.append(AccidentMarker.road_type.notin_([2, 4] if option[0] == 2 else [1, 3]))
+        elif name == "show_lane":
+            criteria.append(
+                AccidentMarker.one_lane.between(2, 3)
+                if option[0] == 2
+                else AccidentMarker.one_lane == 1
+            )
+        elif name == "show_day":
+            criteria.append(func.extract("dow", AccidentMarker.created) == bindparam("show_day"))
+        elif name == "show_holiday":
+            criteria.append(AccidentMarker.day_type == bindparam("show_holiday"))
+        elif name == "show_time":
+            if option == [25]:  # Daylight (6-18)
+                criteria.append(and_(hour >= 6, hour < 18))
+            elif option == [26]:  # Darktime (18-6)
+                criteria.append(or_(hour >= 18, hour < 6))
+            else:
+                criteria.append(and_(hour >= bindparam("start_hour"), hour < bindparam("end_hour")))
+        elif name == "weather":
+            criteria.append(AccidentMarker.weather == bindparam("weather"))
+        elif name == "road":
+            criteria.append(AccidentMarker.road_shape == bindparam("road"))
+        elif name == "separation":
+            criteria.append(AccidentMarker.multi_lane == bindparam("separation"))
+        elif name == "surface":
+            criteria.append(AccidentMarker.road_surface == bindparam("surface"))
+        elif name == "controlmeasure":
+            criteria.append(AccidentMarker.road_control == bindparam("controlmeasure"))
+        elif name == "district":
+            criteria.append(AccidentMarker.police_unit == bindparam("district"))
+        elif name == "acctype":
+            criteria.append(AccidentMarker.accident_type == bindparam("acctype"))
+        elif name == "bike_accidents":
+            criteria.append(
+                AccidentMarker.vehicles.any(Vehicle.vehicle_type == BE_CONST.VEHICLE_TYPE_BIKE)
+            )
+        elif name == "case_type":
+            criteria.append(AccidentMarker.provider_code == bindparam("case_type"))
+        elif name == "age_groups":
+            criteria.append(
+                AccidentMarker.involved.any(
+                    Involved.age_group.in_(bindparam("age_groups", expanding=True))
+                )
+            )
+        elif name == "light_transportation":
+            # a single EXISTS instead of one per injured type
+            criteria.append(
+                AccidentMarker.involved.any(
+                    and_(
+                        Involved.injury_severity.between(1, 3),
+                        Involved.age_group.in_(bindparam("age_groups", expanding=True)),
+                        or_(Involved.injured_type == 1, Involved.vehicle_type.in_([15, 21, 23])),
+                    )
+                )
+            )
+    return and_(*criteria)
+
+
+def _is_rsa_column():
+    return (AccidentMarker.provider_code == BE_CONST.RSA_PROVIDER_CODE).label("is_rsa")
+
+
+def _query_entities(session, is_thin):
+    query = session.query(AccidentMarker, _is_rsa_column())
+    if is_thin:
+        query = query.options(load_only(*THIN_MARKER_FIELDS))
+    return query
+
+
+def _description_column():
+    # decoded by the database rather than by a json.loads per row. United Hatzala descriptions
+    # are not json, they come as json strings
+    return case(
+        [
+            (
+                AccidentMarker.provider_code == BE_CONST.UNITED_HATZALA_CODE,
+                cast(func.to_json(AccidentMarker.description), JSON),
+            )
+        ],
+        else_=cast(AccidentMarker.description, JSON),
+    ).label("description")
+
+
+def _query_columns(session, is_thin):
+    if is_thin:
+        columns = [getattr(AccidentMarker, field) for field in THIN_MARKER_FIELDS]
+    else:
+        columns = [
+            _description_column() if field == "description" else getattr(AccidentMarker, field)
+            for field in MARKER_FIELDS
+        ]
+    return session.query(*columns, _is_rsa_column())
+
+
+def _filter_markers(query, shape, show_rsa):
+    markers_criteria = get_markers_criteria(shape)
+    if show_rsa:
+        markers_criteria = or_(
+            markers_criteria, AccidentMarker.provider_code == BE_CONST.RSA_PROVIDER_CODE
+        )
+    return (
+        query.filter(AccidentMarker.geom.intersects(bindparam("polygon")))
+        .filter(AccidentMarker.created >= bindparam("start_date"))
+        .filter(AccidentMarker.created < bindparam("end_date"))
+        .filter(markers_criteria)
+        .order_by(desc(AccidentMarker.created))
+    )
+
+
+def _get_baked_query(is_thin, as_columns, shape, show_rsa):
+    # the args after the baking functions are only part of the cache key, the functions get
+    # their values through the closures
+    query = _query_columns if as_columns else _query_entities
+    baked_query = bakery(lambda session: query(session, is_thin), as_columns, is_thin)
+    baked_query.add_criteria(lambda q: _filter_markers(q, shape, show_rsa), shape, show_rsa)
+    return baked_query
+
+
+def get_markers_queries(is_thin=False, as_columns=False, yield_per=None, **kwargs):
+    """
+    :param yield_per: when given, rows are fetched in batches of that size through a server side
+                      cursor instead of loading the whole result
+    :return: the cached queries of the accident and RSA markers of bounding_box_query, bound to
+             the values of kwargs, to run in order. Rows are (AccidentMarker, is_rsa) pairs, or
+             with as_columns, tuples of the fields AccidentMarker.serialize reads and is_rsa.
+             A single query, unless accident markers are paginated - pages don't include the
+             RSA markers, so they are queried apart.
+    """
+    queries = _get_markers_queries(is_thin, as_columns, **kwargs)
+    if yield_per:
+        queries = [query.with_post_criteria(lambda q: q.yield_per(yield_per)) for query in queries]
+    return queries
+
+
+def _get_markers_queries(is_thin, as_columns, **kwargs):
+    if not kwargs.get("show_markers", True):
+        return []
+    if not kwargs.get("accurate", True) and not kwargs.get("approx", True):
+        return []
+    shape, params = get_markers_filter(kwargs)
+    show_rsa = bool(kwargs["show_rsa"])
+
+    params["polygon"] = "POLYGON(({0} {1},{0} {3},{2} {3},{2} {1},{0} {1}))".format(
+        float(kwargs["sw_lng"]),
+        float(kwargs["sw_lat"]),
+        float(kwargs["ne_lng"]),
+        float(kwargs["ne_lat"]),
+    )
+    params["start_date"] = kwargs["start_date"]
+    params["end_date"] = kwargs["end_date"]
+
+    page = kwargs.get("page")
+    per_page = kwargs.get("per_page")
+    if not (page and per_page):
+        if shape is None and not show_rsa:
+            return []
+        baked_query = _get_baked_query(is_thin, as_columns, shape, show_rsa)
+        return [baked_query(db.session).params(**params)]
+
+    queries = []
+    if shape is not None:
+        baked_query = _get_baked_query(is_thin, as_columns, shape, False)
+        queries.append(
+            baked_query(db.session)
+            .params(**params)
+            .with_post_criteria(lambda q: q.offset((page - 1) * per_page).limit(per_page))
+        )
+    if show_rsa:
+        baked_query = _get_baked_query(is_thin, as_columns, None, True)
+        queries.append(baked_query(db.session).params(**params))
+    return queries
+
+
+def query_markers_in_bounding_box(is_thin=False, **kwargs):
+    """
+    Same as AccidentMarker.bounding_box_query, in one cached statement and round-trip.
+    :return: MarkerResult of accident markers and RSA markers lists
+    """
+    accident_markers = []
+    rsa_markers = []
+    for query in get_markers_queries(is_thin, **kwargs):
+        for marker, is_rsa in query:
+            (rsa_markers if is_rsa else accident_markers).append(marker)
+    return MarkerResult(
+        accident_markers=accident_markers, rsa_markers=rsa_markers, total_records=None
+    )
@@ -1,14 +1,157 @@
 import logging
 import time
-from anyway.models import AccidentMarker
-from anyway.pymapcluster import calculate_clusters
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, desc, or_, tuple_
+
+from anyway import globalmaptiles as globaltiles
+from anyway.backend_constants import BE_CONST
+from anyway.bounding_box_compiler import query_markers_in_bounding_box
+from anyway.models import ClustersPyramid
+from anyway.app_and_db import db
+from anyway.pymapcluster import calculate_clusters, calculate_weighted_clusters
+
+# filters the clusters pyramid is not keyed by, with their "show everything" values
+PYRAMID_UNFILTERED_ARGS = {
+    "approx": True,
+    "accurate": True,
+    "show_urban": 3,
+    "show_intersection": 3,
+    "show_lane": 3,
+    "show_day": 7,
+    "show_holiday": 0,
+    "show_time": 24,
+    "weather": 0,
+    "road": 0,
+    "separation": 0,
+    "surface": 0,
+    "acctype": 0,
+    "controlmeasure": 0,
+    "district": 0,
+}
+
+
+def is_pyramid_query(kwargs):
+    """
+    whether the request only filters by the dimensions the clusters pyramid is keyed by:
+    dates, severity and provider
+    """
+    if not kwargs.get("show_markers", True) or kwargs.get("light_transportation", False):
+        return False
+    if any(kwargs.get(arg, value) != value for arg, value in PYRAMID_UNFILTERED_ARGS.items()):
+        return False
+    if kwargs["start_time"] != 25 and kwargs["end_time"] != 25:
+        return False
+    age_groups = kwargs.get("age_groups")
+    return bool(age_groups) and len(age_groups.split(",")) >= BE_CONST.AGE_GROUPS_NUMBER + 1
+
+
+def get_full_months_range(start_date, end_date):
+    """
+    :return: the [start, end) range of the whole months between start_date and end_date
+    """
+    if start_date.day == 1:
+        months_start = start_date
+    else:
+        months_start = start_date.replace(day=1) + relativedelta(months=1)
+    return months_start, end_date.replace(day=1)
+
+
+def get_pyramid_markers_filter(kwargs):
+    """
+    the provider and severity filters of AccidentMarker.bounding_box_query, on the pyramid
+    """
+    accidents = ClustersPyramid.provider_code != BE_CONST.RSA_PROVIDER_CODE
+    if not kwargs["show_accidents"]:
+        accidents = and_(
+            accidents,
+            ClustersPyramid.provider_code.notin_(
+                [
+                    BE_CONST.CBS_ACCIDENT_TYPE_1_CODE,
+                    BE_CONST.CBS_ACCIDENT_TYPE_3_CODE,
+                    BE_CONST.UNITED_HATZALA_CODE,
+                ]
+            ),
+        )
+    if kwargs.get("case_type", 0) != 0:
+        accidents = and_(accidents, ClustersPyramid.provider_code == kwargs["case_type"])
+    # like the markers query, hiding a severity also hides the markers without a severity
+    for severity, arg in ((1, "show_fatal"), (2, "show_severe"), (3, "show_light")):
+        if not kwargs.get(arg, True):
+            accidents = and_(accidents, ClustersPyramid.accident_severity != severity)
+    if kwargs["show_rsa"]:
+        return or_(accidents, ClustersPyramid.provider_code == BE_CONST.RSA_PROVIDER_CODE)
+    return accidents
+
+
+def retrieve_clusters_from_pyramid(**kwargs):
+    """
+    Merges the precomputed clusters of the whole months in the requested dates with the markers
+    of the partial months at its edges.
+    :return: the clusters, or None when the pyramid can't answer the request
+    """
+    zoom = kwargs["zoom"]
+    start_date = kwargs["start_date"]
+    end_date = kwargs["end_date"]
+    months_start, months_end = get_full_months_range(start_date, end_date)
+    if months_start >= months_end:
+        return None
+    if db.session.query(ClustersPyramid.id).filter(ClustersPyramid.zoom == zoom).first() is None:
+        return None
+
+    sw_lat = float(kwargs["sw_lat"])
+    sw_lng = float(kwargs["sw_lng"])
+    ne_lat = float(kwargs["ne_lat"])
+    ne_lng = float(kwargs["ne_lng"])
+    mercator = globaltiles.GlobalMercator()
+    sw_tile, ne_tile = [
+        mercator.GoogleTile(*mercator.MetersToTile(*mercator.LatLonToMeters(lat, lng), zoom), zoom)
+        for lat, lng in ((sw_lat, sw_lng), (ne_lat, ne_lng))
+    ]
+    months = tuple_(ClustersPyramid.accident_year, ClustersPyramid.accident_month)
+    pyramid_clusters = (
+        db.session.query(ClustersPyramid.latitude, ClustersPyramid.longitude, ClustersPyramid.size)
+        .filter(ClustersPyramid.zoom == zoom)
+        .filter(ClustersPyramid.tile_x.between(sw_tile[0], ne_tile[0]))
+        .filter(ClustersPyramid.tile_y.between(ne_tile[1], sw_tile[1]))
+        .filter(ClustersPyramid.latitude.between(sw_lat, ne_lat))
+        .filter(ClustersPyramid.longitude.between(sw_lng, ne_lng))
+        .filter(months >= (months_start.year, months_start.month))
+        .filter(months < (months_end.year, months_end.month))
+        .filter(get_pyramid_markers_filter(kwargs))
+        .order_by(desc(ClustersPyramid.size))
+        .all()
+    )
+
+    edge_markers = []
+    for edge_start, edge_end in ((start_date, months_start), (months_end, end_date)):
+        if edge_start < edge_end:
+            result = query_markers_in_bounding_box(
+                is_thin=True, **dict(kwargs, start_date=edge_start, end_date=edge_end)
+            )
+            edge_markers += result.accident_markers + result.rsa_markers
+
+    points = pyramid_clusters + [(marker.latitude, marker.longitude, 1) for marker in edge_markers]
+    if not points:
+        return []
+    lats, lngs, weights = np.array(points, dtype=float).T
+    return calculate_weighted_clusters(lats, lngs, weights, zoom)
 
 
 def retrieve_clusters(**kwargs):
+    if is_pyramid_query(kwargs):
+        start_time = time.time()
+        clusters = retrieve_clusters_from_pyramid(**kwargs)
+        if clusters is not None:
+            logging.debug(
+                "getting clusters from pyramid took %f seconds" % (time.time() - start_time)
+            )
+            return clusters
     start_time = time.time()
-    result = AccidentMarker.bounding_box_query(is_thin=True, **kwargs)
-    accident_markers_in_box = result.accident_markers.all()
-    rsa_markers_in_box = result.rsa_markers.all()
+    result = query_markers_in_bounding_box(is_thin=True, **kwargs)
+    accident_markers_in_box = result.accident_markers
+    rsa_markers_in_box = result.rsa_markers
     logging.debug("getting cluster data from db took %f seconds" % (time.time() - start_time))
     start_time = time.time()
     clusters = calculate_clusters(accident_markers_in_box + rsa_markers_in_box, kwargs["zoom"])
@@ -0,0 +1,61 @@
+"""
+Process wide cache of the CBS dictionary tables (TABLES_DICT of parsers.cbs.executor), that map
+the codes of the markers, involved and vehicles fields to their hebrew values, per provider code
+and year. A table is loaded whole by a single query the first time it is used, and kept until
+invalidate() is called - which the dictionary tables importers do - or, for changes made by other
+processes, until DICTIONARY_CACHE_TTL seconds have passed.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from anyway.app_and_db import db
+from anyway.database import Base
+
+DICTIONARY_CACHE_TTL = 60 * 60
+DICTIONARY_KEY_COLUMNS = ("id", "year", "provider_code")
+
+_tables = {}
+_lock = threading.Lock()
+
+
+def _load_table(table_name):
+    table = Base.metadata.tables[table_name]
+    (value_column,) = [c for c in table.columns if c.name not in DICTIONARY_KEY_COLUMNS]
+    rows = db.session.execute(
+        select([table.c.provider_code, table.c.year, table.c.id, value_column])
+    )
+    values = defaultdict(dict)
+    for provider_code, year, code, value in rows:
+        values[(provider_code, year)][code] = value
+    logging.debug(f"loaded dictionary table {table_name}")
+    return dict(values)
+
+
+def get_dictionary(table_name, provider_code, year):
+    """
+    :return: dict of the codes of the dictionary table to their hebrew values for provider_code
+             and year, None if it has none
+    """
+    now = time.monotonic()
+    entry = _tables.get(table_name)
+    if entry is None or now - entry[0] > DICTIONARY_CACHE_TTL:
+        with _lock:
+            entry = _tables.get(table_name)
+            if entry is None or now - entry[0] > DICTIONARY_CACHE_TTL:
+                entry = _tables[table_name] = (now, _load_table(table_name))
+    return entry[1].get((int(provider_code), int(year)))
+
+
+def invalidate(table_name=None):
+    """
+    drops table_name from the cache, or all tables when not given
+    """
+    with _lock:
+        if table_name is None:
+            _tables.clear()
+        else:
+            _tables.pop(table_name, None)
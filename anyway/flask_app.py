@@ -7,12 +7,13 @@ import logging
 from io import StringIO
 import os
 import time
+import zlib
 import flask_admin as admin
 import flask_login as login
 import jinja2
 import pandas as pd
 from flask import make_response, render_template, Response, jsonify, url_for, flash, abort
-from flask import request, redirect, session
+from flask import request, redirect, session, stream_with_context
 from flask_admin import helpers, expose, BaseView
 from flask_admin.contrib import sqla
 from flask_assets import Environment
@@ -39,8 +40,9 @@ from werkzeug.security import check_password_hash
 from werkzeug.exceptions import BadRequestKeyError
 from wtforms import form, fields, validators, StringField, PasswordField, Form
 
-from anyway import utilities
+from anyway import dictionary_cache, utilities
 from anyway.base import user_optional
+from anyway.bounding_box_compiler import get_markers_queries
 from anyway.clusters_calculator import retrieve_clusters
 from anyway.config import ENTRIES_PER_PAGE
 from anyway.backend_constants import BE_CONST
@@ -58,20 +60,12 @@ from anyway.models import (
     GeneralPreferences,
     NewsFlash,
     ReportProblem,
-    EngineVolume,
-    PopulationType,
-    Region,
-    District,
-    NaturalArea,
-    MunicipalStatus,
-    YishuvShape,
-    TotalWeight,
-    DrivingDirections,
-    AgeGroup,
     AccidentMarkerView,
     EmbeddedReports,
+    MARKER_FIELDS,
 )
 from anyway.oauth import OAuthSignIn
+from anyway.vector_tiles import MVT_MIMETYPE, retrieve_markers_tile
 from anyway.infographics_utils import get_infographics_data
 from anyway.app_and_db import app, db
 from anyway.views.schools.api import (
@@ -194,6 +188,14 @@ DICTCOLUMN3 = "TEUR"
 cbs_dict_files = {DICTIONARY: "Dictionary.csv"}
 content_encoding = "cp1255"
 
+app.config["COMPRESS_MIMETYPES"] = [
+    "text/html",
+    "text/css",
+    "text/xml",
+    "application/json",
+    "application/javascript",
+    MVT_MIMETYPE,
+]
 Compress(app)
 
 
@@ -202,48 +204,96 @@ def shutdown_session(exception=None):
     db.session.remove()
 
 
-def generate_json(accidents, rsa_markers, discussions, is_thin, total_records=None):
-    markers = accidents.all()
-    total_accidents = len(markers)
+MARKERS_JSON_CHUNK_SIZE = 1000
 
-    rsa = rsa_markers.all()
-    total_rsa = len(rsa)
-    markers += rsa
 
+def generate_markers_json(queries, discussions, is_thin, total_records=None):
+    """
+    Streams the /markers json out of the column rows of get_markers_queries, in chunks of
+    MARKERS_JSON_CHUNK_SIZE markers, without loading AccidentMarker objects or the whole response
+    into memory
+    """
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    total_accidents = 0
+    total_rsa = 0
+    chunk = []
+    yield '{"markers":['
+    separator = ""
+    for query in queries:
+        for row in query:
+            if row.is_rsa:
+                total_rsa += 1
+            else:
+                total_accidents += 1
+            chunk.append(encode(AccidentMarker.serialize_fields(row, is_thin)))
+            if len(chunk) == MARKERS_JSON_CHUNK_SIZE:
+                yield separator + ",".join(chunk)
+                separator = ","
+                chunk = []
+    total_discussions = 0
     if not is_thin:
-        markers += discussions.all()
+        for discussion in discussions:
+            total_discussions += 1
+            chunk.append(encode(discussion.serialize(is_thin)))
+    if chunk:
+        yield separator + ",".join(chunk)
 
     if total_records is None:
-        total_records = len(markers)
+        total_records = total_accidents + total_rsa + total_discussions
+    pagination = {
+        "totalRecords": total_records,
+        "totalAccidents": total_accidents,
+        "totalRSA": total_rsa,
+    }
+    yield '],"pagination":' + encode(pagination) + "}"
 
-    entries = [marker.serialize(is_thin) for marker in markers]
-    return jsonify(
-        {
-            "markers": entries,
-            "pagination": {
-                "totalRecords": total_records,
-                "totalAccidents": total_accidents,
-                "totalRSA": total_rsa,
-            },
-        }
-    )
+
+CSV_CHUNK_SIZE = 64 * 1024
+CSV_YIELD_PER = 1000
 
 
-def generate_csv(results):
+def generate_csv(queries):
+    """
+    Streams the markers of the column rows of get_markers_queries as csv, in chunks of about
+    CSV_CHUNK_SIZE characters
+    """
     output_file = StringIO()
+    output = csv.DictWriter(output_file, MARKER_FIELDS, restval="")
+    output.writeheader()
+    for query in queries:
+        for row in query:
+            output.writerow(AccidentMarker.serialize_fields(row))
+            if output_file.tell() >= CSV_CHUNK_SIZE:
+                yield output_file.getvalue()
+                output_file.seek(0)
+                output_file.truncate()
     yield output_file.getvalue()
-    output_file.truncate(0)
-    output = None
-    for marker in results.all():
-        serialized = marker.serialize()
-        if not output:
-            output = csv.DictWriter(output_file, serialized.keys())
-            output.writeheader()
 
-        row = {k: v.encode("utf8") if type(v) is str else v for k, v in serialized.items()}
-        output.writerow(row)
-        yield output_file.getvalue()
-        output_file.truncate(0)
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(
+        app.config["COMPRESS_LEVEL"], zlib.DEFLATED, 16 + zlib.MAX_WBITS  # gzip container
+    )
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode("utf-8"))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_response(chunks, mimetype, headers=None):
+    """
+    Streams the text chunks, gzipped on the fly when the client accepts it.
+    Flask-Compress would buffer the whole response to compress it, so it is bypassed by setting
+    the Content-Encoding here.
+    """
+    headers = dict(headers or {})
+    chunks = stream_with_context(chunks)
+    if "gzip" in request.headers.get("Accept-Encoding", "").lower():
+        chunks = gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return Response(chunks, mimetype=mimetype, headers=headers)
 
 
 ARG_TYPES = {
@@ -331,23 +381,17 @@ def markers():
     kwargs = get_kwargs()
     logging.debug("querying markers in bounding box: %s" % kwargs)
     is_thin = kwargs["zoom"] < CONST.MINIMAL_ZOOM
-    result = AccidentMarker.bounding_box_query(
-        is_thin, yield_per=50, involved_and_vehicles=False, **kwargs
-    )
-    accident_markers = result.accident_markers
-    rsa_markers = result.rsa_markers
-
-    discussion_args = ("ne_lat", "ne_lng", "sw_lat", "sw_lng", "show_discussions")
-    discussions = DiscussionMarker.bounding_box_query(
-        **{arg: kwargs[arg] for arg in discussion_args}
-    )
 
     if request.values.get("format") == "csv":
+        # the csv export has accident markers only
+        queries = get_markers_queries(
+            as_columns=True, yield_per=CSV_YIELD_PER, **dict(kwargs, show_rsa=False)
+        )
         date_format = "%Y-%m-%d"
-        return Response(
-            generate_csv(accident_markers),
+        return stream_response(
+            generate_csv(queries),
+            mimetype="text/csv",
             headers={
-                "Content-Type": "text/csv",
                 "Content-Disposition": "attachment; "
                 'filename="Anyway-accidents-from-{0}-to-{1}.csv"'.format(
                     kwargs["start_date"].strftime(date_format),
@@ -357,8 +401,13 @@ def markers():
         )
 
     else:  # defaults to json
-        return generate_json(
-            accident_markers, rsa_markers, discussions, is_thin, total_records=result.total_records
+        discussion_args = ("ne_lat", "ne_lng", "sw_lat", "sw_lng", "show_discussions")
+        discussions = DiscussionMarker.bounding_box_query(
+            **{arg: kwargs[arg] for arg in discussion_args}
+        )
+        queries = get_markers_queries(is_thin, as_columns=True, **kwargs)
+        return stream_response(
+            generate_markers_json(queries, discussions, is_thin), mimetype="application/json"
         )
 
 
@@ -553,202 +602,77 @@ def involved_data_refinement(involved):
     return involved
 
 
-def get_involved_dict(provider_code, accident_year):
-    involved = {}
-    age_group = (
-        db.session.query(AgeGroup)
-        .filter(and_(AgeGroup.provider_code == provider_code, AgeGroup.year == accident_year))
-        .all()
-    )
-    involved["age_group"] = {g.id: g.age_group_hebrew for g in age_group} if age_group else None
-
-    population_type = (
-        db.session.query(PopulationType)
-        .filter(
-            and_(
-                PopulationType.provider_code == provider_code, PopulationType.year == accident_year
-            )
-        )
-        .all()
-    )
-
-    involved["population_type"] = (
-        {g.id: g.population_type_hebrew for g in population_type} if population_type else None
-    )
+# fields of involved and vehicles to the dictionary tables of their values
+INVOLVED_DICTIONARY_TABLES = {
+    "age_group": "age_group",
+    "population_type": "population_type",
+    "home_region": "region",
+    "home_district": "district",
+    "home_natural_area": "natural_area",
+    "home_municipal_status": "municipal_status",
+    "home_yishuv_shape": "yishuv_shape",
+}
+VEHICLE_DICTIONARY_TABLES = {
+    "engine_volume": "engine_volume",
+    "total_weight": "total_weight",
+    "driving_directions": "driving_directions",
+}
 
-    home_region = (
-        db.session.query(Region)
-        .filter(and_(Region.provider_code == provider_code, Region.year == accident_year))
-        .all()
-    )
 
-    involved["home_region"] = {g.id: g.region_hebrew for g in home_region} if home_region else None
+def get_involved_dict(provider_code, accident_year):
+    return {
+        field: dictionary_cache.get_dictionary(table_name, provider_code, accident_year)
+        for field, table_name in INVOLVED_DICTIONARY_TABLES.items()
+    }
 
-    home_district = (
-        db.session.query(District)
-        .filter(and_(District.provider_code == provider_code, District.year == accident_year))
-        .all()
-    )
 
-    involved["home_district"] = (
-        {g.id: g.district_hebrew for g in home_district} if home_district else None
-    )
+def get_vehicle_dict(provider_code, accident_year):
+    return {
+        field: dictionary_cache.get_dictionary(table_name, provider_code, accident_year)
+        for field, table_name in VEHICLE_DICTIONARY_TABLES.items()
+    }
 
-    home_natural_area = (
-        db.session.query(NaturalArea)
-        .filter(and_(NaturalArea.provider_code == provider_code, NaturalArea.year == accident_year))
-        .all()
-    )
 
-    involved["home_natural_area"] = (
-        {g.id: g.natural_area_hebrew for g in home_natural_area} if home_natural_area else None
-    )
+@app.route("/markers/all", methods=["GET"])
+def marker_all():
+    marker_id = request.args.get("marker_id", None)
+    provider_code = request.args.get("provider_code", None)
+    accident_year = request.args.get("accident_year", None)
 
-    home_municipal_status = (
-        db.session.query(MunicipalStatus)
+    involved = (
+        db.session.query(Involved)
         .filter(
             and_(
-                MunicipalStatus.provider_code == provider_code,
-                MunicipalStatus.year == accident_year,
+                Involved.accident_id == marker_id,
+                Involved.provider_code == provider_code,
+                Involved.accident_year == accident_year,
             )
         )
         .all()
     )
-    involved["home_municipal_status"] = (
-        {g.id: g.municipal_status_hebrew for g in home_municipal_status}
-        if home_municipal_status
-        else None
-    )
 
-    home_yishuv_shape = (
-        db.session.query(YishuvShape)
-        .filter(and_(YishuvShape.provider_code == provider_code, YishuvShape.year == accident_year))
-        .all()
-    )
-
-    involved["home_yishuv_shape"] = (
-        {g.id: g.yishuv_shape_hebrew for g in home_yishuv_shape} if home_yishuv_shape else None
-    )
-
-    return involved
-
-
-def get_vehicle_dict(provider_code, accident_year):
-    vehicle = {}
-    engine_volume = (
-        db.session.query(EngineVolume)
-        .filter(
-            and_(EngineVolume.provider_code == provider_code, EngineVolume.year == accident_year)
-        )
-        .all()
-    )
-
-    vehicle["engine_volume"] = (
-        {g.id: g.engine_volume_hebrew for g in engine_volume} if engine_volume else None
-    )
-
-    total_weight = (
-        db.session.query(TotalWeight)
-        .filter(and_(TotalWeight.provider_code == provider_code, TotalWeight.year == accident_year))
-        .all()
-    )
-    vehicle["total_weight"] = (
-        {g.id: g.total_weight_hebrew for g in total_weight} if total_weight else None
-    )
-
-    driving_directions = (
-        db.session.query(DrivingDirections)
+    vehicles = (
+        db.session.query(Vehicle)
         .filter(
             and_(
-                DrivingDirections.provider_code == provider_code,
-                DrivingDirections.year == accident_year,
+                Vehicle.accident_id == marker_id,
+                Vehicle.provider_code == provider_code,
+                Vehicle.accident_year == accident_year,
             )
         )
         .all()
     )
-    vehicle["driving_directions"] = (
-        {g.id: g.driving_directions_hebrew for g in driving_directions}
-        if driving_directions
-        else None
-    )
-
-    return vehicle
-
-
-@app.route("/markers/all", methods=["GET"])
-def marker_all():
-    marker_id = request.args.get("marker_id", None)
-    provider_code = request.args.get("provider_code", None)
-    accident_year = request.args.get("accident_year", None)
-
-    involved = db.session.query(Involved).filter(
-        and_(
-            Involved.accident_id == marker_id,
-            Involved.provider_code == provider_code,
-            Involved.accident_year == accident_year,
-        )
-    )
-
-    vehicles = db.session.query(Vehicle).filter(
-        and_(
-            Vehicle.accident_id == marker_id,
-            Vehicle.provider_code == provider_code,
-            Vehicle.accident_year == accident_year,
-        )
-    )
 
     list_to_return = list()
-    for inv in involved:
-        obj = inv.serialize()
-        new_inv = get_involved_dict(provider_code, accident_year)
-        obj["age_group"] = (
-            new_inv["age_group"].get(obj["age_group"]) if new_inv["age_group"] else None
-        )
-        obj["population_type"] = (
-            new_inv["population_type"].get(obj["population_type"])
-            if new_inv["population_type"]
-            else None
-        )
-        obj["home_region"] = (
-            new_inv["home_region"].get(obj["home_region"]) if new_inv["home_region"] else None
-        )
-        obj["home_district"] = (
-            new_inv["home_district"].get(obj["home_district"]) if new_inv["home_district"] else None
-        )
-        obj["home_natural_area"] = (
-            new_inv["home_natural_area"].get(obj["home_natural_area"])
-            if new_inv["home_natural_area"]
-            else None
-        )
-        obj["home_municipal_status"] = (
-            new_inv["home_municipal_status"].get(obj["home_municipal_status"])
-            if new_inv["home_municipal_status"]
-            else None
-        )
-        obj["home_yishuv_shape"] = (
-            new_inv["home_yishuv_shape"].get(obj["home_yishuv_shape"])
-            if new_inv["home_yishuv_shape"]
-            else None
-        )
-
-        list_to_return.append(obj)
-
-    for veh in vehicles:
-        obj = veh.serialize()
-        new_veh = get_vehicle_dict(provider_code, accident_year)
-        obj["engine_volume"] = (
-            new_veh["engine_volume"].get(obj["engine_volume"]) if new_veh["engine_volume"] else None
-        )
-        obj["total_weight"] = (
-            new_veh["total_weight"].get(obj["total_weight"]) if new_veh["total_weight"] else None
-        )
-        obj["driving_directions"] = (
-            new_veh["driving_directions"].get(obj["driving_directions"])
-            if new_veh["driving_directions"]
-            else None
-        )
-
-        list_to_return.append(obj)
+    for rows, dictionaries in (
+        (involved, get_involved_dict(provider_code, accident_year) if involved else {}),
+        (vehicles, get_vehicle_dict(provider_code, accident_year) if vehicles else {}),
+    ):
+        for row in rows:
+            obj = row.serialize()
+            for field, dictionary in dictionaries.items():
+                obj[field] = dictionary.get(obj[field]) if dictionary else None
+            list_to_return.append(obj)
     return make_response(json.dumps(list_to_return, ensure_ascii=False))
 
 
@@ -800,6 +724,17 @@ def clusters():
     return Response(json.dumps({"clusters": results}), mimetype="application/json")
 
 
+@app.route("/tiles/<int:z>/<int:x>/<int:y>.mvt", methods=["GET"])
+def markers_tile(z, x, y):
+    kwargs = get_kwargs()
+    tile = retrieve_markers_tile(z, x, y, **kwargs)
+    response = Response(tile, mimetype=MVT_MIMETYPE)
+    # markers are only updated by the daily imports
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
+
+
 @app.route("/highlightpoints", methods=["POST"])
 @user_optional
 def highlightpoint():
@@ -4,7 +4,7 @@ import datetime
 import json
 import pandas as pd
 from collections import defaultdict
-from sqlalchemy import func
+from sqlalchemy import case, func, tuple_
 from sqlalchemy import cast, Numeric
 from sqlalchemy import desc
 from anyway.backend_constants import BE_CONST
@@ -89,15 +89,18 @@ def get_query(table_obj, filters, start_time, end_time):
     return query
 
 
-def get_accident_count_by_accident_type(location_info, start_time, end_time):
-    all_accident_type_count = get_accidents_stats(
-        table_obj=AccidentMarkerView,
-        filters=location_info,
-        group_by="accident_type_hebrew",
-        count="accident_type_hebrew",
-        start_time=start_time,
-        end_time=end_time,
-    )
+def get_accident_count_by_accident_type(
+    location_info, start_time, end_time, all_accident_type_count=None
+):
+    if all_accident_type_count is None:
+        all_accident_type_count = get_accidents_stats(
+            table_obj=AccidentMarkerView,
+            filters=location_info,
+            group_by="accident_type_hebrew",
+            count="accident_type_hebrew",
+            start_time=start_time,
+            end_time=end_time,
+        )
     merged_accident_type_count = [{"accident_type": "התנגשות", "count": 0}]
     for item in all_accident_type_count:
         if "התנגשות" in item["accident_type"]:
@@ -164,6 +167,40 @@ def get_accidents_stats(
     )
 
 
+def get_accidents_stats_by_columns(
+    table_obj, filters=None, group_by=(), start_time=None, end_time=None
+):
+    """
+    Same as get_accidents_stats grouped by and counting each column of group_by, computed by
+    a single scan of table_obj with GROUPING SETS
+    :return: dict of the group_by columns to their get_accidents_stats records
+    """
+    filters = dict(filters or {})
+    filters["provider_code"] = [
+        BE_CONST.CBS_ACCIDENT_TYPE_1_CODE,
+        BE_CONST.CBS_ACCIDENT_TYPE_3_CODE,
+    ]
+    query = get_query(table_obj, filters, start_time, end_time)
+    columns = [getattr(table_obj, column) for column in group_by]
+    query = query.with_entities(
+        *columns, *[func.grouping(column) for column in columns], func.count()
+    ).group_by(func.grouping_sets(*columns))
+    stats = {column: [] for column in group_by}
+    for row in query:
+        values, groupings, count = row[: len(columns)], row[len(columns) : -1], row[-1]
+        # grouping is 0 only for the column the row is grouped by
+        index = groupings.index(0)
+        value = values[index]
+        stats[group_by[index]].append(
+            {
+                group_by[index].replace("_hebrew", ""): value,
+                # like count(column), nulls are not counted
+                "count": count if value is not None else 0,
+            }
+        )
+    return stats
+
+
 def get_injured_filters(location_info):
     new_filters = {}
     for curr_filter, curr_values in location_info.items():
@@ -276,15 +313,18 @@ def get_most_severe_accidents_table_title(location_text):
     return "תאונות חמורות ב" + location_text
 
 
-def get_accident_count_by_severity(location_info, location_text, start_time, end_time):
-    count_by_severity = get_accidents_stats(
-        table_obj=AccidentMarkerView,
-        filters=location_info,
-        group_by="accident_severity_hebrew",
-        count="accident_severity_hebrew",
-        start_time=start_time,
-        end_time=end_time,
-    )
+def get_accident_count_by_severity(
+    location_info, location_text, start_time, end_time, count_by_severity=None
+):
+    if count_by_severity is None:
+        count_by_severity = get_accidents_stats(
+            table_obj=AccidentMarkerView,
+            filters=location_info,
+            group_by="accident_severity_hebrew",
+            count="accident_severity_hebrew",
+            start_time=start_time,
+            end_time=end_time,
+        )
     severity_dict = {"קטלנית": "fatal", "קשה": "severe", "קלה": "light"}
     items = {}
     total_accidents_count = 0
@@ -312,19 +352,15 @@ def get_most_severe_accidents_table(location_info, start_time, end_time):
         end_time=end_time,
     )
     # Add casualties
+    casualties_counts = get_casualties_count_in_accidents(accidents)
     for accident in accidents:
         accident["type"] = accident["accident_type"]
         dt = accident["accident_timestamp"].to_pydatetime()
         accident["date"] = dt.strftime("%d/%m/%y")
         accident["hour"] = dt.strftime("%H:%M")
-        num = get_casualties_count_in_accident(
-            accident["id"], accident["provider_code"], 1, accident["accident_year"]
-        )
-        accident["killed_count"] = num
-        num = get_casualties_count_in_accident(
-            accident["id"], accident["provider_code"], [2, 3], accident["accident_year"]
-        )
-        accident["injured_count"] = num
+        accident["killed_count"], accident["injured_count"] = casualties_counts[
+            get_accident_key(accident)
+        ]
         del (
             accident["accident_timestamp"],
             accident["accident_type"],
@@ -353,24 +389,38 @@ def count_accidents_by_driver_type(data):
     return output
 
 
-# count of dead and severely injured
-def get_casualties_count_in_accident(accident_id, provider_code, injury_severity, accident_year):
-    filters = {
-        "accident_id": accident_id,
-        "provider_code": provider_code,
-        "injury_severity": injury_severity,
-        "accident_year": accident_year,
-    }
-    casualties = get_accidents_stats(
-        table_obj=InvolvedMarkerView,
-        filters=filters,
-        group_by="injury_severity",
-        count="injury_severity",
+def get_accident_key(accident):
+    return int(accident["id"]), int(accident["provider_code"]), int(accident["accident_year"])
+
+
+# count of dead and injured
+def get_casualties_count_in_accidents(accidents):
+    """
+    :return: dict of the (id, provider_code, accident_year) keys of the accidents to their
+             (killed, injured) counts, computed by a single grouped query
+    """
+    keys = [get_accident_key(accident) for accident in accidents]
+    if not keys:
+        return {}
+    accident_key_columns = (
+        InvolvedMarkerView.accident_id,
+        InvolvedMarkerView.provider_code,
+        InvolvedMarkerView.accident_year,
     )
-    res = 0
-    for ca in casualties:
-        res += ca["count"]
-    return res
+    query = (
+        db.session.query(
+            *accident_key_columns,
+            func.count(case([(InvolvedMarkerView.injury_severity == 1, 1)])),
+            func.count(case([(InvolvedMarkerView.injury_severity.in_([2, 3]), 1)])),
+        )
+        .filter(tuple_(*accident_key_columns).in_(keys))
+        .filter(InvolvedMarkerView.injury_severity.in_([1, 2, 3]))
+        .group_by(*accident_key_columns)
+    )
+    casualties_counts = {key: (0, 0) for key in keys}
+    for accident_id, provider_code, accident_year, killed, injured in query:
+        casualties_counts[(accident_id, provider_code, accident_year)] = (killed, injured)
+    return casualties_counts
 
 
 # generate text describing location or road segment of news flash
@@ -498,6 +548,17 @@ def count_accidents_by_car_type(involved_by_vehicle_type_data):  # Temporary for
     ]
 
 
+INFOGRAPHICS_ACCIDENTS_STATS_COLUMNS = (
+    "accident_severity_hebrew",
+    "accident_type_hebrew",
+    "accident_year",
+    "day_night_hebrew",
+    "accident_hour",
+    "road_light_hebrew",
+)
+INFOGRAPHICS_INJURED_STATS_COLUMNS = ("accident_year", "age_group_hebrew", "involve_vehicle_type")
+
+
 def create_infographics_data(news_flash_id, number_of_years_ago):
     output = {}
     try:
@@ -529,12 +590,29 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
 
     start_time = datetime.date(end_time.year + 1 - number_of_years_ago, 1, 1)
 
+    # the counts of the location accidents and injured, each in a single scan
+    accidents_stats = get_accidents_stats_by_columns(
+        table_obj=AccidentMarkerView,
+        filters=location_info,
+        group_by=INFOGRAPHICS_ACCIDENTS_STATS_COLUMNS,
+        start_time=start_time,
+        end_time=end_time,
+    )
+    injured_stats = get_accidents_stats_by_columns(
+        table_obj=InvolvedMarkerView,
+        filters=get_injured_filters(location_info),
+        group_by=INFOGRAPHICS_INJURED_STATS_COLUMNS,
+        start_time=start_time,
+        end_time=end_time,
+    )
+
     # accident_severity count
     items = get_accident_count_by_severity(
         location_info=location_info,
         location_text=location_text,
         start_time=start_time,
         end_time=end_time,
+        count_by_severity=accidents_stats["accident_severity_hebrew"],
     )
 
     accident_count_by_severity = Widget(name="accident_count_by_severity", rank=1, items=items)
@@ -583,7 +661,10 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
         name="accident_count_by_accident_type",
         rank=6,
         items=get_accident_count_by_accident_type(
-            location_info=location_info, start_time=start_time, end_time=end_time
+            location_info=location_info,
+            start_time=start_time,
+            end_time=end_time,
+            all_accident_type_count=accidents_stats["accident_type_hebrew"],
         ),
     )
     output["widgets"].append(accident_count_by_accident_type.serialize())
@@ -605,14 +686,7 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
     accident_count_by_accident_year = Widget(
         name="accident_count_by_accident_year",
         rank=8,
-        items=get_accidents_stats(
-            table_obj=AccidentMarkerView,
-            filters=location_info,
-            group_by="accident_year",
-            count="accident_year",
-            start_time=start_time,
-            end_time=end_time,
-        ),
+        items=accidents_stats["accident_year"],
         text={"title": "כמות תאונות"},
     )
     output["widgets"].append(accident_count_by_accident_year.serialize())
@@ -621,14 +695,7 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
     injured_count_by_accident_year = Widget(
         name="injured_count_by_accident_year",
         rank=9,
-        items=get_accidents_stats(
-            table_obj=InvolvedMarkerView,
-            filters=get_injured_filters(location_info),
-            group_by="accident_year",
-            count="accident_year",
-            start_time=start_time,
-            end_time=end_time,
-        ),
+        items=injured_stats["accident_year"],
         text={"title": "כמות פצועים"},
     )
     output["widgets"].append(injured_count_by_accident_year.serialize())
@@ -637,14 +704,7 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
     accident_count_by_day_night = Widget(
         name="accident_count_by_day_night",
         rank=10,
-        items=get_accidents_stats(
-            table_obj=AccidentMarkerView,
-            filters=location_info,
-            group_by="day_night_hebrew",
-            count="day_night_hebrew",
-            start_time=start_time,
-            end_time=end_time,
-        ),
+        items=accidents_stats["day_night_hebrew"],
         text={"title": "כמות תאונות ביום ובלילה"},
     )
     output["widgets"].append(accident_count_by_day_night.serialize())
@@ -653,14 +713,7 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
     accidents_count_by_hour = Widget(
         name="accidents_count_by_hour",
         rank=11,
-        items=get_accidents_stats(
-            table_obj=AccidentMarkerView,
-            filters=location_info,
-            group_by="accident_hour",
-            count="accident_hour",
-            start_time=start_time,
-            end_time=end_time,
-        ),
+        items=accidents_stats["accident_hour"],
         text={"title": "כמות תאונות לפי שעה"},
     )
     output["widgets"].append(accidents_count_by_hour.serialize())
@@ -669,14 +722,7 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
     accident_count_by_road_light = Widget(
         name="accident_count_by_road_light",
         rank=12,
-        items=get_accidents_stats(
-            table_obj=AccidentMarkerView,
-            filters=location_info,
-            group_by="road_light_hebrew",
-            count="road_light_hebrew",
-            start_time=start_time,
-            end_time=end_time,
-        ),
+        items=accidents_stats["road_light_hebrew"],
         text={"title": "כמות תאונות לפי תאורה"},
     )
     output["widgets"].append(accident_count_by_road_light.serialize())
@@ -695,14 +741,7 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
     output["widgets"].append(top_road_segments_accidents_per_km.serialize())
 
     # injured count per age group
-    data_of_injured_count_per_age_group_raw = get_accidents_stats(
-        table_obj=InvolvedMarkerView,
-        filters=get_injured_filters(location_info),
-        group_by="age_group_hebrew",
-        count="age_group_hebrew",
-        start_time=start_time,
-        end_time=end_time,
-    )
+    data_of_injured_count_per_age_group_raw = injured_stats["age_group_hebrew"]
     data_of_injured_count_per_age_group = filter_and_group_injured_count_per_age_group(
         data_of_injured_count_per_age_group_raw
     )
@@ -716,14 +755,7 @@ def create_infographics_data(news_flash_id, number_of_years_ago):
     output["widgets"].append(vision_zero.serialize())
 
     # involved by driver type
-    involved_by_vehicle_type_data = get_accidents_stats(
-        table_obj=InvolvedMarkerView,
-        filters=get_injured_filters(location_info),
-        group_by="involve_vehicle_type",
-        count="involve_vehicle_type",
-        start_time=start_time,
-        end_time=end_time,
-    )
+    involved_by_vehicle_type_data = injured_stats["involve_vehicle_type"]
     accident_count_by_driver_type = Widget(
         name="accident_count_by_driver_type",
         rank=16,
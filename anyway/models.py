@@ -38,6 +38,52 @@ from anyway.app_and_db import db
 
 MarkerResult = namedtuple("MarkerResult", ["accident_markers", "rsa_markers", "total_records"])
 
+# the fields AccidentMarker.serialize reads
+THIN_MARKER_FIELDS = (
+    "id",
+    "provider_code",
+    "accident_year",
+    "latitude",
+    "longitude",
+    "accident_severity",
+    "location_accuracy",
+    "created",
+)
+MARKER_FIELDS = THIN_MARKER_FIELDS + (
+    "title",
+    "address",
+    "type",
+    "accident_type",
+    "road_type",
+    "road_shape",
+    "day_type",
+    "police_unit",
+    "mainStreet",
+    "secondaryStreet",
+    "junction",
+    "description",
+    "one_lane",
+    "multi_lane",
+    "speed_limit",
+    "road_intactness",
+    "road_width",
+    "road_sign",
+    "road_light",
+    "road_control",
+    "weather",
+    "road_surface",
+    "road_object",
+    "object_distance",
+    "didnt_cross",
+    "cross_mode",
+    "cross_location",
+    "cross_direction",
+    "video_link",
+    "road1",
+    "road2",
+    "km",
+)
+
 db_encoding = "utf-8"
 
 logging.basicConfig(
@@ -298,7 +344,10 @@ class AccidentMarker(MarkerMixin, Base):
 
     @staticmethod
     def json_to_description(msg):
-        description = json.loads(msg, encoding=db_encoding)
+        return AccidentMarker.fields_to_description(json.loads(msg, encoding=db_encoding))
+
+    @staticmethod
+    def fields_to_description(description):
         return "\n".join(
             [
                 AccidentMarker.format_description(field, value)
@@ -307,59 +356,70 @@ class AccidentMarker(MarkerMixin, Base):
         )
 
     def serialize(self, is_thin=False):
+        return AccidentMarker.serialize_fields(self, is_thin)
+
+    @staticmethod
+    def serialize_fields(marker, is_thin=False):
+        """
+        serializes any object with the fields of a marker, e.g. a row of the MARKER_FIELDS columns
+        """
         fields = {
-            "id": str(self.id),
-            "provider_code": self.provider_code,
-            "accident_year": self.accident_year,
-            "latitude": self.latitude,
-            "longitude": self.longitude,
-            "accident_severity": self.accident_severity,
-            "location_accuracy": self.location_accuracy,
-            "created": self.created.isoformat(),
+            "id": str(marker.id),
+            "provider_code": marker.provider_code,
+            "accident_year": marker.accident_year,
+            "latitude": marker.latitude,
+            "longitude": marker.longitude,
+            "accident_severity": marker.accident_severity,
+            "location_accuracy": marker.location_accuracy,
+            "created": marker.created.isoformat(),
         }
         if not is_thin:
             fields.update(
                 {
-                    "title": self.title,
-                    "address": self.address,
-                    "type": self.type,
-                    "accident_type": self.accident_type,
-                    "road_type": self.road_type,
-                    "road_shape": self.road_shape,
-                    "day_type": self.day_type,
-                    "police_unit": self.police_unit,
-                    "mainStreet": self.mainStreet,
-                    "secondaryStreet": self.secondaryStreet,
-                    "junction": self.junction,
+                    "title": marker.title,
+                    "address": marker.address,
+                    "type": marker.type,
+                    "accident_type": marker.accident_type,
+                    "road_type": marker.road_type,
+                    "road_shape": marker.road_shape,
+                    "day_type": marker.day_type,
+                    "police_unit": marker.police_unit,
+                    "mainStreet": marker.mainStreet,
+                    "secondaryStreet": marker.secondaryStreet,
+                    "junction": marker.junction,
                 }
             )
+            description = marker.description
             # United Hatzala accidents description are not json:
-            if self.provider_code == BE_CONST.UNITED_HATZALA_CODE:
-                fields.update({"description": self.description})
-            else:
-                fields.update({"description": AccidentMarker.json_to_description(self.description)})
+            if marker.provider_code != BE_CONST.UNITED_HATZALA_CODE:
+                # the column rows of get_markers_queries have it decoded by the database
+                if isinstance(description, str):
+                    description = AccidentMarker.json_to_description(description)
+                else:
+                    description = AccidentMarker.fields_to_description(description)
+            fields.update({"description": description})
 
             optional = {
-                "one_lane": self.one_lane,
-                "multi_lane": self.multi_lane,
-                "speed_limit": self.speed_limit,
-                "road_intactness": self.road_intactness,
-                "road_width": self.road_width,
-                "road_sign": self.road_sign,
-                "road_light": self.road_light,
-                "road_control": self.road_control,
-                "weather": self.weather,
-                "road_surface": self.road_surface,
-                "road_object": self.road_object,
-                "object_distance": self.object_distance,
-                "didnt_cross": self.didnt_cross,
-                "cross_mode": self.cross_mode,
-                "cross_location": self.cross_location,
-                "cross_direction": self.cross_direction,
-                "video_link": self.video_link,
-                "road1": self.road1,
-                "road2": self.road2,
-                "km": self.km,
+                "one_lane": marker.one_lane,
+                "multi_lane": marker.multi_lane,
+                "speed_limit": marker.speed_limit,
+                "road_intactness": marker.road_intactness,
+                "road_width": marker.road_width,
+                "road_sign": marker.road_sign,
+                "road_light": marker.road_light,
+                "road_control": marker.road_control,
+                "weather": marker.weather,
+                "road_surface": marker.road_surface,
+                "road_object": marker.road_object,
+                "object_distance": marker.object_distance,
+                "didnt_cross": marker.didnt_cross,
+                "cross_mode": marker.cross_mode,
+                "cross_location": marker.cross_location,
+                "cross_direction": marker.cross_direction,
+                "video_link": marker.video_link,
+                "road1": marker.road1,
+                "road2": marker.road2,
+                "km": marker.km,
             }
             for name, value in optional.items():
                 if value != 0:
@@ -2091,10 +2151,40 @@ class EmbeddedReports(Base):
     url = Column(String())
 
 
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+    # normalized location text, as geocoded
+    location = Column(Text(), primary_key=True)
+    # the geocoder results - a list of google maps geocoding results, empty if none were found
+    result = Column(sqlalchemy.types.JSON(), nullable=False)
+    created = Column(DateTime, nullable=False)
+
+
+class LocationIndexData(Base):
+    __tablename__ = "location_index"
+    # a single row, of the markers of the index of anyway.parsers.location_index
+    id = Column(Integer(), primary_key=True)
+    # the markers as gzipped JSON
+    markers = Column(sqlalchemy.LargeBinary(), nullable=False)
+    created = Column(DateTime, nullable=False)
+
+
+class AccidentsDataVersion(Base):
+    __tablename__ = "accidents_data_versions"
+    # the data the infographics are computed from: "cbs_<year>" for the cbs markers of a year
+    # along with their involved and vehicles, "road_segments" for the road segments
+    source = Column(Text(), primary_key=True)
+    # incremented by every import of the source
+    version = Column(Integer(), nullable=False)
+    updated = Column(DateTime, nullable=False)
+
+
 class InfographicsDataCacheFields(object):
     news_flash_id = Column(BigInteger(), primary_key=True)
     years_ago = Column(Integer(), primary_key=True)
     data = Column(sqlalchemy.types.JSON())
+    # fingerprint of the news flash and accidents data the item was computed from
+    source_hash = Column(Text(), nullable=True)
 
 
 class InfographicsDataCache(InfographicsDataCacheFields, Base):
@@ -2130,6 +2220,37 @@ class InfographicsDataCacheTemp(InfographicsDataCacheFields, Base):
         return self.news_flash_id
 
 
+class ClustersPyramid(Base):
+    __tablename__ = "clusters_pyramid"
+    __table_args__ = (Index("clusters_pyramid_zoom_tile_idx", "zoom", "tile_x", "tile_y"),)
+
+    id = Column(BigInteger(), autoincrement=True, primary_key=True)
+    zoom = Column(Integer(), nullable=False)
+    tile_x = Column(Integer(), nullable=False)
+    tile_y = Column(Integer(), nullable=False)
+    accident_year = Column(Integer(), nullable=False)
+    accident_month = Column(Integer(), nullable=False)
+    provider_code = Column(Integer(), nullable=False)
+    accident_severity = Column(Integer(), nullable=True)
+    latitude = Column(Float(), nullable=False)
+    longitude = Column(Float(), nullable=False)
+    size = Column(Integer(), nullable=False)
+
+    def serialize(self):
+        return {
+            "zoom": self.zoom,
+            "tile_x": self.tile_x,
+            "tile_y": self.tile_y,
+            "accident_year": self.accident_year,
+            "accident_month": self.accident_month,
+            "provider_code": self.provider_code,
+            "accident_severity": self.accident_severity,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "size": self.size,
+        }
+
+
 class CasualtiesCosts(Base):
     __tablename__ = "casualties_costs"
     id = Column(Integer(), primary_key=True)
@@ -0,0 +1,97 @@
+"""
+Bulk loading of rows into the database through PostgreSQL COPY FROM STDIN.
+Rows are streamed in the COPY text format into a temporary staging table shaped like the target
+table, and merged into it by a single INSERT ... SELECT, which also fills the computed columns
+(e.g. the markers geom) so they don't need a second pass over the table.
+"""
+import logging
+from datetime import datetime
+
+from anyway.app_and_db import db
+
+COPY_NULL = "\\N"
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+MARKERS_COMPUTED_COLUMNS = {"geom": "ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)"}
+
+
+def format_copy_value(value):
+    """
+    :return: value in the COPY text format
+    """
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    return str(value)
+
+
+def format_copy_rows(rows, columns):
+    """
+    :return: generator of the lines of rows in the COPY text format, with the values of columns
+    """
+    for row in rows:
+        yield "\t".join(format_copy_value(row.get(column)) for column in columns) + "\n"
+
+
+class CopyStream:
+    """
+    read only file object over lines, for cursor.copy_expert to stream them without building
+    the whole input in memory
+    """
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def copy_rows(table, rows, computed_columns=None):
+    """
+    Loads rows into table in the transaction of db.session - commit it to keep them.
+    :param table: the sqlalchemy Table to load into
+    :param rows: list of dicts of column values, all with the same keys
+    :param computed_columns: dict of column names to SQL expressions over the other columns of
+                             the row, computed while merging the staging table into table
+    :return: number of rows loaded
+    """
+    if not rows:
+        return 0
+    computed_columns = computed_columns or {}
+    columns = [column for column in rows[0] if column not in computed_columns]
+    staging = f"{table.name}_staging"
+    columns_list = ", ".join(f'"{column}"' for column in columns)
+    target_columns = ", ".join([columns_list, *(f'"{column}"' for column in computed_columns)])
+    select_columns = ", ".join([columns_list, *computed_columns.values()])
+
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table.name} INCLUDING DEFAULTS)")
+        cursor.copy_expert(
+            f"COPY {staging} ({columns_list}) FROM STDIN",
+            CopyStream(format_copy_rows(rows, columns)),
+        )
+        cursor.execute(
+            f"INSERT INTO {table.name} ({target_columns}) SELECT {select_columns} FROM {staging}"
+        )
+        loaded = cursor.rowcount
+        cursor.execute(f"DROP TABLE {staging}")
+    finally:
+        cursor.close()
+    logging.debug(f"copied {loaded} rows into {table.name}")
+    return loaded
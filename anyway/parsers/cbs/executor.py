@@ -7,15 +7,25 @@ import shutil
 import tempfile
 import traceback
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from collections import OrderedDict, defaultdict
 from datetime import datetime
 
 import math
+import numpy as np
 import pandas as pd
 from sqlalchemy import or_, and_
+from sqlalchemy.dialects import postgresql
 
+from anyway.parsers import (
+    clusters_pyramid,
+    infographics_data_cache_updater,
+    location_index,
+    news_flash_db_adapter,
+)
 from anyway.parsers.cbs import preprocessing_cbs_files, importmail_cbs
-from anyway import field_names, localization
+from anyway.parsers.cbs.copy_loader import copy_rows, MARKERS_COMPUTED_COLUMNS
+from anyway import dictionary_cache, field_names, localization
 from anyway.backend_constants import BE_CONST
 from anyway.models import (
     AccidentMarker,
@@ -81,6 +91,7 @@ from anyway.models import (
 from anyway.utilities import ItmToWGS84, time_delta, ImporterUI, truncate_tables, chunks
 from anyway.db_views import VIEWS
 from anyway.app_and_db import db
+from anyway.database import Base
 from anyway.parsers.cbs.s3.s3_handler import S3Handler
 
 failed_dirs = OrderedDict()
@@ -234,20 +245,57 @@ TABLES_DICT = {
 coordinates_converter = ItmToWGS84()
 
 
+def get_streets_index(streets):
+    """
+    compiles the streets file into a {(yishuv_symbol, street_sign): street_name} index.
+    street signs that appear more than once in a settlement are left out, as get_street can't tell
+    their name.
+    """
+    keys = [field_names.settlement, field_names.street_sign]
+    counts = streets.groupby(keys)[field_names.street_sign].transform("size")
+    unique = streets[counts == 1]
+    return dict(
+        zip(
+            zip(
+                unique[field_names.settlement].astype(float).tolist(),
+                unique[field_names.street_sign].astype(float).tolist(),
+            ),
+            unique[field_names.street_name].tolist(),
+        )
+    )
+
+
 def get_street(yishuv_symbol, street_sign, streets):
     """
     extracts the street name using the settlement id and street id
     """
-    if yishuv_symbol not in streets:
-        # Changed to return blank string instead of None for correct presentation (Omer)
-        return ""
-    street_name = [
-        x[field_names.street_name]
-        for x in streets[yishuv_symbol]
-        if x[field_names.street_sign] == street_sign
-    ]
-    # there should be only one street name, or none if it wasn't found.
-    return street_name[0] if len(street_name) == 1 else ""
+    # Changed to return blank string instead of None for correct presentation (Omer)
+    return streets.get((yishuv_symbol, street_sign), "")
+
+
+def get_street_names(yishuv_symbols, street_signs, streets):
+    """
+    get_street of arrays of settlement ids and street ids, by a single lookup of all of them in
+    the streets index
+    """
+    if not streets:
+        return [""] * len(yishuv_symbols)
+    names = pd.Series(list(streets.values()), index=pd.MultiIndex.from_tuples(streets.keys()))
+    keys = pd.MultiIndex.from_arrays(
+        [np.asarray(yishuv_symbols, dtype=float), np.asarray(street_signs, dtype=float)]
+    )
+    return names.reindex(keys, fill_value="").tolist()
+
+
+def format_address(street, house_number, settlement):
+    if not house_number and not settlement:
+        return street
+    if not house_number and settlement:
+        return "{}, {}".format(street, settlement)
+    if house_number and not settlement:
+        return "{} {}".format(street, house_number)
+
+    return "{} {}, {}".format(street, house_number, settlement)
 
 
 def get_address(accident, streets):
@@ -270,15 +318,27 @@ def get_address(accident, streets):
         else None
     )
     settlement = localization.get_city_name(accident.get(field_names.yishuv_symbol))
+    return format_address(street, house_number, settlement)
 
-    if not house_number and not settlement:
-        return street
-    if not house_number and settlement:
-        return "{}, {}".format(street, settlement)
-    if house_number and not settlement:
-        return "{} {}".format(street, house_number)
 
-    return "{} {}, {}".format(street, house_number, settlement)
+def get_addresses(yishuv_symbols, street_signs, house_numbers, streets):
+    """
+    get_address of arrays of the accidents fields
+    """
+    house_numbers = np.asarray(house_numbers, dtype=float)
+    valid_house_numbers = ~np.isnan(house_numbers)
+    valid_house_numbers[valid_house_numbers] = (
+        house_numbers[valid_house_numbers].astype(np.int64) != 9999
+    )
+    house_numbers = np.where(valid_house_numbers, house_numbers, 0).astype(np.int64).astype(object)
+    house_numbers[~valid_house_numbers] = None
+    settlements = map_unique(localization.get_city_name, yishuv_symbols)
+    return [
+        format_address(street, house_number, settlement) if street else ""
+        for street, house_number, settlement in zip(
+            get_street_names(yishuv_symbols, street_signs, streets), house_numbers, settlements
+        )
+    ]
 
 
 def get_streets(accident, streets):
@@ -315,6 +375,89 @@ def get_non_urban_intersection(accident, roads):
     return None
 
 
+def get_junctions_index(roads):
+    """
+    indexes the junctions of roads for the nearest junction search of get_junctions
+    :return: {road: (kms, keys, orders)} - the distinct kms of the junctions on the road in
+             ascending order, and the key in roads and position in roads of the first junction at
+             each of them
+    """
+    first_keys = defaultdict(dict)
+    for order, key in enumerate(roads):
+        road, _, km = key
+        if not math.isnan(km):
+            first_keys[road].setdefault(km, (key, order))
+    index = {}
+    for road, keys_by_km in first_keys.items():
+        kms = sorted(keys_by_km)
+        index[road] = (
+            np.array(kms, dtype=float),
+            [keys_by_km[km][0] for km in kms],
+            np.array([keys_by_km[km][1] for km in kms]),
+        )
+    return index
+
+
+def get_nearest_junctions(road1s, kms, junctions_index):
+    """
+    finds the junction nearest to each km on its road, by binary search in the kms of the road.
+    Like get_junction, distances of 100000 and more don't count, and of equally near junctions
+    the one that comes first in roads is taken.
+    :return: list of the keys in roads of the junctions, None where there is none
+    """
+    kms = np.asarray(kms, dtype=float)
+    positions_by_road = defaultdict(list)
+    for position, road in enumerate(road1s):
+        if road in junctions_index:
+            positions_by_road[road].append(position)
+    nearest_keys = [None] * len(kms)
+    for road, positions in positions_by_road.items():
+        junction_kms, keys, orders = junctions_index[road]
+        accident_kms = kms[positions]
+        right = np.minimum(np.searchsorted(junction_kms, accident_kms), len(junction_kms) - 1)
+        left = np.maximum(right - 1, 0)
+        left_distances = np.abs(accident_kms - junction_kms[left])
+        right_distances = np.abs(accident_kms - junction_kms[right])
+        is_right = (right_distances < left_distances) | (
+            (right_distances == left_distances) & (orders[right] < orders[left])
+        )
+        nearest = np.where(is_right, right, left)
+        distances = np.where(is_right, right_distances, left_distances)
+        for position, junction, distance in zip(positions, nearest, distances):
+            if distance < 100000:  # False for NaN kms
+                nearest_keys[position] = keys[junction]
+    return nearest_keys
+
+
+def get_junctions(road1s, road2s, kms, non_urban_intersections, roads):
+    """
+    get_junction of arrays of the accidents fields, searching the nearest junctions of all of
+    them at once with get_nearest_junctions
+    """
+    junctions = [""] * len(kms)
+    nearest_positions = []
+    for position, (road1, road2, km, non_urban_intersection) in enumerate(
+        zip(road1s, road2s, kms, non_urban_intersections)
+    ):
+        if km is not None and non_urban_intersection is None:
+            nearest_positions.append(position)
+        elif non_urban_intersection is not None:
+            junctions[position] = roads.get((road1, road2, km), None) or ""
+    if nearest_positions:
+        nearest_keys = get_nearest_junctions(
+            [road1s[position] for position in nearest_positions],
+            [kms[position] for position in nearest_positions],
+            get_junctions_index(roads),
+        )
+        for position, key in zip(nearest_positions, nearest_keys):
+            junction = roads.get(key, None) if key else None
+            if junction:
+                junctions[position] = describe_junction(
+                    road1s[position], kms[position], key[2], junction
+                )
+    return junctions
+
+
 def get_non_urban_intersection_by_junction_number(accident, non_urban_intersection):
     non_urban_intersection_value = accident.get(field_names.non_urban_intersection)
     if non_urban_intersection_value is not None and not math.isnan(non_urban_intersection_value):
@@ -323,6 +466,29 @@ def get_non_urban_intersection_by_junction_number(accident, non_urban_intersecti
         return junction
 
 
+def describe_junction(road1, km, junc_km, junction):
+    """
+    :return: the distance and direction of km on road1 from junction, at junc_km
+    """
+    if km - junc_km > 0:
+        direction = "צפונית" if road1 % 2 == 0 else "מזרחית"
+    else:
+        direction = "דרומית" if road1 % 2 == 0 else "מערבית"
+    if abs(float(km - junc_km) / 10) >= 1:
+        string = str(abs(float(km) - junc_km) / 10) + " ק״מ " + direction + " ל" + junction
+    elif 0 < abs(float(km - junc_km) / 10) < 1:
+        string = (
+                str(int((abs(float(km) - junc_km) / 10) * 1000))
+                + " מטרים "
+                + direction
+                + " ל"
+                + junction
+        )
+    else:
+        string = junction
+    return string
+
+
 def get_junction(accident, roads):
     """
     extracts the junction from an accident
@@ -347,29 +513,9 @@ def get_junction(accident, roads):
                 junc_km = option[2]
         junction = roads.get(key, None)
         if junction:
-            if accident.get(field_names.km) - junc_km > 0:
-                direction = "צפונית" if accident.get(field_names.road1) % 2 == 0 else "מזרחית"
-            else:
-                direction = "דרומית" if accident.get(field_names.road1) % 2 == 0 else "מערבית"
-            if abs(float(accident["KM"] - junc_km) / 10) >= 1:
-                string = (
-                        str(abs(float(accident["KM"]) - junc_km) / 10)
-                        + " ק״מ "
-                        + direction
-                        + " ל"
-                        + junction
-                )
-            elif 0 < abs(float(accident["KM"] - junc_km) / 10) < 1:
-                string = (
-                        str(int((abs(float(accident.get(field_names.km)) - junc_km) / 10) * 1000))
-                        + " מטרים "
-                        + direction
-                        + " ל"
-                        + junction
-                )
-            else:
-                string = junction
-            return string
+            return describe_junction(
+                accident.get(field_names.road1), accident["KM"], junc_km, junction
+            )
         else:
             return ""
 
@@ -445,6 +591,54 @@ def get_data_value(value):
     return None if value is None or math.isnan(value) else int(value)
 
 
+# fields of markers that are the get_data_value of accidents fields
+MARKER_DATA_VALUE_FIELDS = {
+    "accident_type": field_names.accident_type,
+    "accident_severity": field_names.accident_severity,
+    "location_accuracy": field_names.location_accuracy,
+    "road_type": field_names.road_type,
+    "road_shape": field_names.road_shape,
+    "day_type": field_names.day_type,
+    "police_unit": field_names.police_unit,
+    "one_lane": field_names.one_lane,
+    "multi_lane": field_names.multi_lane,
+    "speed_limit": field_names.speed_limit,
+    "road_intactness": field_names.road_intactness,
+    "road_width": field_names.road_width,
+    "road_sign": field_names.road_sign,
+    "road_light": field_names.road_light,
+    "road_control": field_names.road_control,
+    "weather": field_names.weather,
+    "road_surface": field_names.road_surface,
+    "road_object": field_names.road_object,
+    "object_distance": field_names.object_distance,
+    "didnt_cross": field_names.didnt_cross,
+    "cross_mode": field_names.cross_mode,
+    "cross_location": field_names.cross_location,
+    "cross_direction": field_names.cross_direction,
+    "road1": field_names.road1,
+    "road2": field_names.road2,
+    "yishuv_symbol": field_names.yishuv_symbol,
+    "geo_area": field_names.geo_area,
+    "day_night": field_names.day_night,
+    "day_in_week": field_names.day_in_week,
+    "traffic_light": field_names.traffic_light,
+    "region": field_names.region,
+    "district": field_names.district,
+    "natural_area": field_names.natural_area,
+    "municipal_status": field_names.municipal_status,
+    "yishuv_shape": field_names.yishuv_shape,
+    "street1": field_names.street1,
+    "street2": field_names.street2,
+    "house_number": field_names.house_number,
+    "urban_intersection": field_names.urban_intersection,
+    "non_urban_intersection": field_names.non_urban_intersection,
+    "accident_year": field_names.accident_year,
+    "accident_month": field_names.accident_month,
+    "accident_day": field_names.accident_day,
+}
+
+
 def create_marker(accident, streets, roads, non_urban_intersection):
     if field_names.x not in accident or field_names.y not in accident:
         raise ValueError("Missing x and y coordinates")
@@ -552,22 +746,223 @@ def create_marker(accident, streets, roads, non_urban_intersection):
     return marker
 
 
+def get_data_values(values):
+    """
+    get_data_value of an array of values
+    """
+    values = np.asarray(values, dtype=float)
+    is_nan = np.isnan(values)
+    data_values = np.where(is_nan, 0, values).astype(np.int64).astype(object)
+    data_values[is_nan] = None
+    return data_values
+
+
+def get_int_values(values):
+    values = np.asarray(values, dtype=float)
+    if np.isnan(values).any():
+        raise ValueError("cannot convert float NaN to integer")
+    return values.astype(np.int64)
+
+
+def map_unique(func, *arrays):
+    """
+    :return: list of func(*values) of the values at each index of arrays, calling func once per
+             distinct values
+    """
+    results = {}
+    output = []
+    for values in zip(*arrays):
+        key = tuple(value if value == value else None for value in values)  # NaN != NaN
+        if key not in results:
+            results[key] = func(*values)
+        output.append(results[key])
+    return output
+
+
+def parse_dates(years, months, days, accident_hours):
+    """
+    parse_date of arrays of the date fields
+    :return: (accident datetimes list, hours array, minutes array)
+    """
+    minutes = get_int_values(accident_hours) * 15 - 15
+    hours = minutes // 60
+    minutes %= 60
+    accident_dates = [
+        datetime(year, month, day, hour, minute, 0)
+        for year, month, day, hour, minute in zip(
+            get_int_values(years).tolist(),
+            get_int_values(months).tolist(),
+            get_int_values(days).tolist(),
+            hours.tolist(),
+            minutes.tolist(),
+        )
+    ]
+    return accident_dates, hours, minutes
+
+
+def create_markers(accidents, streets, roads, non_urban_intersection):
+    """
+    Same as create_marker for each row of accidents, computed by columns: coordinates are
+    converted by one convert_many call, numeric fields and dates by array operations, and streets
+    and junctions are looked up once per distinct location.
+    """
+    if field_names.x not in accidents or field_names.y not in accidents:
+        raise ValueError("Missing x and y coordinates")
+    count = len(accidents)
+    # iterrows gives create_marker each row converted to the common dtype of the columns
+    columns = dict(zip(accidents.columns, accidents.values.T))
+    missing = np.full(count, None, dtype=object)
+
+    def column(field):
+        return columns.get(field, missing)
+
+    def map_accidents(func, fields, *args):
+        return map_unique(
+            lambda *values: func(dict(zip(fields, values)), *args),
+            *[column(field) for field in fields],
+        )
+
+    xs = np.asarray(column(field_names.x), dtype=float)
+    ys = np.asarray(column(field_names.y), dtype=float)
+    has_coordinates = (xs != 0) & ~np.isnan(xs) & (ys != 0) & ~np.isnan(ys)
+    longitudes = np.full(count, None, dtype=object)
+    latitudes = np.full(count, None, dtype=object)
+    if has_coordinates.any():
+        lngs, lats = coordinates_converter.convert_many(xs[has_coordinates], ys[has_coordinates])
+        longitudes[has_coordinates] = lngs.astype(object)
+        latitudes[has_coordinates] = lats.astype(object)
+
+    yishuv_symbols = column(field_names.yishuv_symbol)
+    main_streets = get_addresses(
+        yishuv_symbols, column(field_names.street1), column(field_names.house_number), streets
+    )
+    streets1 = get_street_names(yishuv_symbols, column(field_names.street1), streets)
+    secondary_streets = get_street_names(yishuv_symbols, column(field_names.street2), streets)
+    road_fields = (
+        field_names.road1,
+        field_names.road2,
+        field_names.km,
+        field_names.non_urban_intersection,
+    )
+    junctions = get_junctions(*[column(field) for field in road_fields], roads)
+
+    kms = np.asarray(column(field_names.km), dtype=float)
+    has_km = ~np.isnan(kms)
+    # create_marker's km string has a leading "-" when it isn't accurate
+    km_accurate = np.where(has_km, ~np.signbit(kms), None)
+    km_values = np.where(has_km, np.abs(kms), None)
+
+    accident_dates, hours, minutes = parse_dates(
+        column(field_names.accident_year),
+        column(field_names.accident_month),
+        column(field_names.accident_day),
+        column(field_names.accident_hour),
+    )
+
+    ids = get_int_values(column(field_names.id)).tolist()
+    provider_codes = get_int_values(column(field_names.file_type)).tolist()
+
+    descriptions = [{} for _ in range(count)]
+    for index, urban_intersection in enumerate(column(field_names.urban_intersection)):
+        if bool(urban_intersection):
+            if main_streets[index]:
+                descriptions[index][field_names.street1] = main_streets[index]
+            if secondary_streets[index]:
+                descriptions[index][field_names.street2] = secondary_streets[index]
+    for index, value in enumerate(column(field_names.non_urban_intersection)):
+        if bool(value) and junctions[index]:
+            descriptions[index][field_names.junction_name] = junctions[index]
+    for field in localization.get_supported_tables():
+        is_localized = map_unique(
+            lambda value: bool(value and localization.get_field(field, value)), column(field)
+        )
+        for index, value in enumerate(column(field)):
+            if is_localized[index]:
+                descriptions[index][field] = value
+
+    markers = {
+        "id": ids,
+        "provider_and_id": [
+            int(str(provider_code) + str(accident_id))
+            for provider_code, accident_id in zip(provider_codes, ids)
+        ],
+        "provider_code": provider_codes,
+        "file_type_police": get_data_values(column(field_names.file_type_police)),
+        "title": ["Accident"] * count,
+        "description": [json.dumps(description) for description in descriptions],
+        "address": main_streets,
+        "latitude": latitudes,
+        "longitude": longitudes,
+        "created": accident_dates,
+        "mainStreet": main_streets,
+        "secondaryStreet": secondary_streets,
+        "junction": junctions,
+        "km": km_values,
+        "km_raw": get_data_values(kms),
+        "km_accurate": km_accurate,
+        "yishuv_name": map_unique(localization.get_city_name, yishuv_symbols),
+        "street1_hebrew": streets1,
+        "street2_hebrew": secondary_streets,
+        "non_urban_intersection_hebrew": map_accidents(
+            get_non_urban_intersection, road_fields, roads
+        ),
+        "non_urban_intersection_by_junction_number": map_accidents(
+            get_non_urban_intersection_by_junction_number,
+            (field_names.non_urban_intersection,),
+            non_urban_intersection,
+        ),
+        "accident_hour_raw": get_data_values(column(field_names.accident_hour)),
+        "accident_hour": hours.tolist(),
+        "accident_minute": minutes.tolist(),
+        "x": column(field_names.x),
+        "y": column(field_names.y),
+        "vehicle_type_rsa": missing,
+        "violation_type_rsa": missing,
+        "geom": missing,
+    }
+    for name, field in MARKER_DATA_VALUE_FIELDS.items():
+        markers[name] = get_data_values(column(field))
+    return [dict(zip(markers.keys(), values)) for values in zip(*markers.values())]
+
+
+def import_in_chunks(name, data, create_rows, table, computed_columns=None):
+    """
+    creates the rows of each chunk of data by create_rows and loads them into table, committing
+    and reporting the progress after each chunk
+    :param data: a DataFrame, or an iterable of DataFrames as read by read_csv_chunks
+    :return: number of rows loaded
+    """
+    logging.info(f"Importing {name}")
+    started = datetime.now()
+    chunks_data = [data] if isinstance(data, pd.DataFrame) else data
+    total = 0
+    for chunk_number, chunk in enumerate(chunks_data, 1):
+        rows = create_rows(chunk)
+        copy_rows(table, rows, computed_columns=computed_columns)
+        db.session.commit()
+        total += len(rows)
+        seconds = (datetime.now() - started).total_seconds()
+        logging.info(
+            f"{name} chunk {chunk_number}: {len(rows)} rows, {total} in total"
+            f" ({total / seconds if seconds else 0:.0f} rows/sec)"
+        )
+    logging.info(f"Finished Importing {name}")
+    return total
+
+
 def import_accidents(accidents, streets, roads, non_urban_intersection, **kwargs):
-    logging.info("Importing markers")
-    accidents_result = []
-    for _, accident in accidents.iterrows():
-        marker = create_marker(accident, streets, roads, non_urban_intersection)
-        accidents_result.append(marker)
-    db.session.bulk_insert_mappings(AccidentMarker, accidents_result)
-    db.session.commit()
-    logging.info("Finished Importing markers")
-    logging.info("Inserted " + str(len(accidents_result)) + " new accident markers")
-    fill_db_geo_data()
-    return len(accidents_result)
+    accidents_count = import_in_chunks(
+        "markers",
+        accidents,
+        lambda chunk: create_markers(chunk, streets, roads, non_urban_intersection),
+        AccidentMarker.__table__,
+        computed_columns=MARKERS_COMPUTED_COLUMNS,
+    )
+    logging.info("Inserted " + str(accidents_count) + " new accident markers")
+    return accidents_count
 
 
-def import_involved(involved, **kwargs):
-    logging.info("Importing involved")
+def create_involved(involved):
     involved_result = []
     for _, involve in involved.iterrows():
         if not involve.get(field_names.id) or pd.isnull(
@@ -617,14 +1012,14 @@ def import_involved(involved, **kwargs):
                 "accident_month": get_data_value(involve.get(field_names.accident_month)),
             }
         )
-    db.session.bulk_insert_mappings(Involved, involved_result)
-    db.session.commit()
-    logging.info("Finished Importing involved")
-    return len(involved_result)
+    return involved_result
 
 
-def import_vehicles(vehicles, **kwargs):
-    logging.info("Importing vehicles")
+def import_involved(involved, **kwargs):
+    return import_in_chunks("involved", involved, create_involved, Involved.__table__)
+
+
+def create_vehicles(vehicles):
     vehicles_result = []
     for _, vehicle in vehicles.iterrows():
         vehicles_result.append(
@@ -650,12 +1045,27 @@ def import_vehicles(vehicles, **kwargs):
                 "vehicle_damage": get_data_value(vehicle.get(field_names.vehicle_damage)),
             }
         )
-    logging.info("Finished Importing vehicles")
-    db.session.bulk_insert_mappings(Vehicle, vehicles_result)
-    return len(vehicles_result)
+    return vehicles_result
 
 
-def get_files(directory):
+def import_vehicles(vehicles, **kwargs):
+    return import_in_chunks("vehicles", vehicles, create_vehicles, Vehicle.__table__)
+
+
+def read_csv_chunks(file_path, chunksize):
+    """
+    lazily reads file_path in DataFrames of up to chunksize rows
+    """
+    for chunk in pd.read_csv(file_path, encoding=CONTENT_ENCODING, chunksize=chunksize):
+        chunk.columns = [column.upper() for column in chunk.columns]
+        yield chunk
+
+
+def get_files(directory, chunksize=None):
+    """
+    :param chunksize: when given, the accidents, involved and vehicles files are read lazily in
+                      chunks of that many rows (see read_csv_chunks) instead of whole DataFrames
+    """
     output_files_dict = {}
     for name, filename in cbs_files.items():
         if name not in (STREETS, NON_URBAN_INTERSECTION, ACCIDENTS, INVOLVED, VEHICLES, DICTIONARY):
@@ -669,6 +1079,8 @@ def get_files(directory):
         file_path = os.path.join(directory, files[0])
         if name == DICTIONARY:
             output_files_dict[name] = read_dictionary(file_path)
+        elif name in (ACCIDENTS, INVOLVED, VEHICLES) and chunksize:
+            output_files_dict[name] = read_csv_chunks(file_path, chunksize)
         elif name in (ACCIDENTS, INVOLVED, VEHICLES):
             df = pd.read_csv(file_path, encoding=CONTENT_ENCODING)
             df.columns = [column.upper() for column in df.columns]
@@ -677,18 +1089,7 @@ def get_files(directory):
             df = pd.read_csv(file_path, encoding=CONTENT_ENCODING)
             df.columns = [column.upper() for column in df.columns]
             if name == STREETS:
-                streets_map = {}
-                groups = df.groupby(field_names.settlement)
-                for key, settlement in groups:
-                    streets_map[key] = [
-                        {
-                            field_names.street_sign: x[field_names.street_sign],
-                            field_names.street_name: x[field_names.street_name],
-                        }
-                        for _, x in settlement.iterrows()
-                    ]
-
-                output_files_dict[name] = streets_map
+                output_files_dict[name] = get_streets_index(df)
             elif name == NON_URBAN_INTERSECTION:
                 roads = {
                     (x[field_names.road1], x[field_names.road2], x[field_names.km]): x[
@@ -711,7 +1112,7 @@ def import_to_datastore(directory, provider_code, year, batch_size):
     try:
         assert batch_size > 0
 
-        files_from_cbs = get_files(directory)
+        files_from_cbs = get_files(directory, chunksize=batch_size)
         if len(files_from_cbs) == 0:
             return 0
         logging.info("Importing '{}'".format(directory))
@@ -719,6 +1120,7 @@ def import_to_datastore(directory, provider_code, year, batch_size):
 
         # import dictionary
         fill_dictionary_tables(files_from_cbs[DICTIONARY], provider_code, year)
+        create_year_partitions(year)
 
         new_items = 0
         accidents_count = import_accidents(**files_from_cbs)
@@ -737,6 +1139,61 @@ def import_to_datastore(directory, provider_code, year, batch_size):
         raise (e)
 
 
+def import_directory(directory, provider_code, year, batch_size):
+    """
+    import_to_datastore of a directory in a worker process of import_directories
+    :return: (number of items imported, the reason the directory failed or None)
+    """
+    try:
+        return import_to_datastore(directory, provider_code, year, batch_size), failed_dirs.get(
+            directory
+        )
+    except Exception as e:
+        logging.exception(f"Failed importing directory {directory}")
+        return 0, failed_dirs.get(directory, f"{type(e).__name__}: {e}")
+    finally:
+        db.session.remove()
+
+
+def import_directories(directories, batch_size, workers=1):
+    """
+    imports the (directory, provider_code, year) items of directories, in order, or with
+    workers > 1 concurrently by a pool of that many processes, each writing through its own
+    connection. The directories have distinct provider codes and years so they don't conflict,
+    and the setup they share is done here, once, before they are imported. The failures of the
+    pool are added to failed_dirs in the order of directories, and don't stop the other
+    directories.
+    :return: number of items imported
+    """
+    create_provider_code_table()
+    if workers <= 1:
+        total = 0
+        for directory, provider_code, year in directories:
+            logging.info("Importing Directory " + directory)
+            total += import_to_datastore(directory, provider_code, year, batch_size)
+        return total
+
+    # directories of the same year would race creating its partitions
+    for year in sorted({year for _, _, year in directories}):
+        create_year_partitions(year)
+    # workers are forked, they must not share the connections of this process
+    db.session.remove()
+    db.get_engine().dispose()
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(import_directory, directory, provider_code, year, batch_size)
+            for directory, provider_code, year in directories
+        ]
+        for (directory, _, _), future in zip(directories, futures):
+            count, failure = future.result()
+            logging.info(f"Imported Directory {directory}: {count} items")
+            total += count
+            if failure:
+                failed_dirs[directory] = failure
+    return total
+
+
 def delete_invalid_entries(batch_size):
     """
     deletes all markers in the database with null latitude or longitude
@@ -776,115 +1233,104 @@ def delete_invalid_entries(batch_size):
             db.session.commit()
 
 
-def delete_cbs_entries(start_date, batch_size):
+PARTITIONS_QUERY = """
+SELECT partition.relname, pg_get_expr(partition.relpartbound, partition.oid)
+FROM pg_inherits JOIN pg_class partition ON partition.oid = pg_inherits.inhrelid
+WHERE pg_inherits.inhparent = CAST(:table AS regclass)
+"""
+
+
+def create_year_partitions(year):
     """
-    deletes all CBS markers (provider_code=1 or provider_code=3) in the database created in year and with provider code provider_code
-    first deletes from tables Involved and Vehicle, then from table AccidentMarker
-    first deletes from tables InvolvedNoLocation and VehicleNoLocation, then from table AccidentsNoLocation
+    creates the partitions of year of the markers, involved and vehicles tables, when they are
+    partitioned by accident_year and don't have them yet, so a year is loaded into, and deleted
+    from, partitions of its own. The rows of a year that are already in the default partition
+    are left there.
     """
-
-    marker_ids_to_delete = (
-        db.session.query(AccidentMarker.id)
-            .filter(AccidentMarker.created >= datetime.strptime(start_date, "%Y-%m-%d"))
-            .filter(
-            or_(
-                (AccidentMarker.provider_code == BE_CONST.CBS_ACCIDENT_TYPE_1_CODE),
-                (AccidentMarker.provider_code == BE_CONST.CBS_ACCIDENT_TYPE_3_CODE),
-            )
+    year = int(year)
+    for table in (AccidentMarker.__table__, Involved.__table__, Vehicle.__table__):
+        relkind = db.session.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)", {"table": table.name}
+        ).scalar()
+        if relkind != "p":
+            continue
+        bounds = dict(db.session.execute(PARTITIONS_QUERY, {"table": table.name}).fetchall())
+        if f"FOR VALUES IN ({year})" in bounds.values():
+            continue
+        default = next((name for name, bound in bounds.items() if bound == "DEFAULT"), None)
+        if default is not None:
+            in_default = db.session.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {default} WHERE accident_year = :year)",
+                {"year": year},
+            ).scalar()
+            if in_default:
+                logging.warning(f"{table.name} has rows of {year} in its default partition")
+                continue
+        partition = f"{table.name}_{year}"
+        db.session.execute(
+            f"CREATE TABLE {partition} PARTITION OF {table.name} FOR VALUES IN ({year})"
         )
-            .all()
-    )
-
-    marker_ids_to_delete = [acc_id[0] for acc_id in marker_ids_to_delete]
-
-    logging.info(
-        "There are "
-        + str(len(marker_ids_to_delete))
-        + " accident ids to delete starting "
-        + str(start_date)
-    )
-
-    for ids_chunk in chunks(marker_ids_to_delete, batch_size):
-
-        logging.info("Deleting a chunk of " + str(len(ids_chunk)))
-
-        q = db.session.query(Involved).filter(Involved.accident_id.in_(ids_chunk))
-        if q.all():
-            logging.info("deleting entries from Involved")
-            q.delete(synchronize_session=False)
-            db.session.commit()
-
-        q = db.session.query(Vehicle).filter(Vehicle.accident_id.in_(ids_chunk))
-        if q.all():
-            logging.info("deleting entries from Vehicle")
-            q.delete(synchronize_session=False)
-            db.session.commit()
-
-        q = db.session.query(AccidentMarker).filter(AccidentMarker.id.in_(ids_chunk))
-        if q.all():
-            logging.info("deleting entries from AccidentMarker")
-            q.delete(synchronize_session=False)
-            db.session.commit()
+        logging.info(f"created partition {partition}")
+    db.session.commit()
 
 
-def delete_cbs_entries_from_email(provider_code, year, batch_size):
+def delete_markers(*criteria):
     """
-    deletes all CBS markers (provider_code=1 or provider_code=3) in the database created in year and with provider code provider_code
-    first deletes from tables Involved and Vehicle, then from table AccidentMarker
-    first deletes from tables InvolvedNoLocation and VehicleNoLocation, then from table AccidentsNoLocation
+    deletes the markers matching criteria, first their Involved and Vehicle entries by
+    provider_and_id, with DELETE ... USING markers statements run by the database. Criteria on
+    accident_year limit the statements to the partitions of the years.
+    :return: dict of the number of rows deleted from each table
     """
-
-    marker_ids_to_delete = (
-        db.session.query(AccidentMarker.provider_and_id)
-            .filter(
-            and_(AccidentMarker.accident_year == year),
-            AccidentMarker.provider_code == provider_code,
+    markers = AccidentMarker.__table__
+    deleted = OrderedDict()
+    for table in (Involved.__table__, Vehicle.__table__):
+        result = db.session.execute(
+            table.delete()
+            .where(table.c.provider_and_id == markers.c.provider_and_id)
+            .where(table.c.accident_year == markers.c.accident_year)
+            .where(and_(*criteria))
         )
-            .all()
-    )
+        deleted[table.name] = result.rowcount
+    result = db.session.execute(markers.delete().where(and_(*criteria)))
+    deleted[markers.name] = result.rowcount
+    db.session.commit()
+    for table_name, count in deleted.items():
+        logging.info(f"deleted {count} entries from {table_name}")
+    return deleted
 
-    marker_ids_to_delete = [acc_id[0] for acc_id in marker_ids_to_delete]
 
-    logging.info(
-        "There are "
-        + str(len(marker_ids_to_delete))
-        + " accident ids to delete for year "
-        + str(year)
+def delete_cbs_entries(start_date):
+    """
+    deletes all CBS markers (provider_code=1 or provider_code=3) in the database created since
+    start_date, first deletes from tables Involved and Vehicle, then from table AccidentMarker
+    """
+    logging.info("Deleting accidents starting " + str(start_date))
+    start_date = datetime.strptime(start_date, "%Y-%m-%d")
+    return delete_markers(
+        AccidentMarker.created >= start_date,
+        AccidentMarker.accident_year >= start_date.year,
+        AccidentMarker.provider_code.in_(
+            [BE_CONST.CBS_ACCIDENT_TYPE_1_CODE, BE_CONST.CBS_ACCIDENT_TYPE_3_CODE]
+        ),
     )
 
-    for ids_chunk in chunks(marker_ids_to_delete, batch_size):
 
-        logging.info("Deleting a chunk of " + str(len(ids_chunk)))
-
-        q = db.session.query(Involved).filter(Involved.provider_and_id.in_(ids_chunk))
-        if q.all():
-            logging.info("deleting entries from Involved")
-            q.delete(synchronize_session=False)
-            db.session.commit()
-
-        q = db.session.query(Vehicle).filter(Vehicle.provider_and_id.in_(ids_chunk))
-        if q.all():
-            logging.info("deleting entries from Vehicle")
-            q.delete(synchronize_session=False)
-            db.session.commit()
-
-        q = db.session.query(AccidentMarker).filter(AccidentMarker.provider_and_id.in_(ids_chunk))
-        if q.all():
-            logging.info("deleting entries from AccidentMarker")
-            q.delete(synchronize_session=False)
-            db.session.commit()
+def get_years_since(start_date):
+    """
+    :return: the years of the markers delete_cbs_entries(start_date) deletes
+    """
+    return range(datetime.strptime(start_date, "%Y-%m-%d").year, datetime.now().year + 1)
 
 
-def fill_db_geo_data():
+def delete_cbs_entries_from_email(provider_code, year):
     """
-    Fills empty geometry object according to coordinates in database
-    SRID = 4326
+    deletes all CBS markers in the database of year and with provider code provider_code
+    first deletes from tables Involved and Vehicle, then from table AccidentMarker
     """
-    db.session.execute(
-        "UPDATE markers SET geom = ST_SetSRID(ST_MakePoint(longitude,latitude),4326)\
-                           WHERE geom IS NULL;"
+    logging.info("Deleting accidents for year " + str(year))
+    return delete_markers(
+        AccidentMarker.accident_year == year, AccidentMarker.provider_code == provider_code
     )
-    db.session.commit()
 
 
 def get_provider_code(directory_name=None):
@@ -909,8 +1355,14 @@ def read_dictionary(dictionary_file):
 
 
 def fill_dictionary_tables(cbs_dictionary, provider_code, year):
+    """
+    upserts the values of cbs_dictionary for provider_code and year into the dictionary tables,
+    with a single INSERT ... ON CONFLICT DO UPDATE of all the values of each table, all in one
+    transaction
+    """
     if year < 2008:
         return
+    tables_values = OrderedDict()
     for k, v in cbs_dictionary.items():
         if k == 97:
             continue
@@ -921,41 +1373,33 @@ def fill_dictionary_tables(cbs_dictionary, provider_code, year):
                 "A key " + str(k) + " was added to dictionary - update models, tables and classes"
             )
             continue
+        # a table can be filled by several keys, the values of the later ones take precedence
+        table_values = tables_values.setdefault(curr_table, {})
         for inner_k, inner_v in v.items():
             if inner_v is None or (isinstance(inner_v, float) and math.isnan(inner_v)):
                 continue
-            sql_delete = (
-                    "DELETE FROM "
-                    + curr_table
-                    + " WHERE provider_code="
-                    + str(provider_code)
-                    + " AND year="
-                    + str(year)
-                    + " AND id="
-                    + str(inner_k)
-            )
-            db.session.execute(sql_delete)
-            db.session.commit()
-            sql_insert = (
-                    "INSERT INTO "
-                    + curr_table
-                    + " VALUES ("
-                    + str(inner_k)
-                    + ","
-                    + str(year)
-                    + ","
-                    + str(provider_code)
-                    + ","
-                    + "'"
-                    + inner_v.replace("'", "")
-                    + "'"
-                    + ")"
-                    + " ON CONFLICT DO NOTHING"
+            table_values[int(inner_k)] = inner_v.replace("'", "")
+    for curr_table, table_values in tables_values.items():
+        table = Base.metadata.tables[curr_table]
+        (value_column,) = [
+            c.name for c in table.columns if c.name not in dictionary_cache.DICTIONARY_KEY_COLUMNS
+        ]
+        rows = [
+            {"id": inner_k, "year": year, "provider_code": provider_code, value_column: inner_v}
+            for inner_k, inner_v in table_values.items()
+        ]
+        if rows:
+            statement = postgresql.insert(table)
+            db.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["id", "year", "provider_code"],
+                    set_={value_column: getattr(statement.excluded, value_column)},
+                ),
+                rows,
             )
-            db.session.execute(sql_insert)
-            db.session.commit()
         logging.info("Inserted/Updated dictionary values into table " + curr_table)
-    create_provider_code_table()
+    db.session.commit()
+    dictionary_cache.invalidate()
 
 
 def truncate_dictionary_tables(dictionary_file):
@@ -968,25 +1412,28 @@ def truncate_dictionary_tables(dictionary_file):
         db.session.execute(sql_truncate)
         db.session.commit()
         logging.info("Truncated table " + curr_table)
+    dictionary_cache.invalidate()
 
 
 def create_provider_code_table():
-    provider_code_table = "provider_code"
-    provider_code_class = ProviderCode
-    table_entries = db.session.query(provider_code_class)
-    table_entries.delete()
+    """
+    upserts the provider codes, in one statement, so concurrent imports don't conflict
+    """
     provider_code_dict = {
         1: "הלשכה המרכזית לסטטיסטיקה - סוג תיק 1",
         2: "איחוד הצלה",
         3: "הלשכה המרכזית לסטטיסטיקה - סוג תיק 3",
         4: "שומרי הדרך",
     }
-    for k, v in provider_code_dict.items():
-        sql_insert = (
-                "INSERT INTO " + provider_code_table + " VALUES (" + str(k) + "," + "'" + v + "'" + ")"
-        )
-        db.session.execute(sql_insert)
-        db.session.commit()
+    statement = postgresql.insert(ProviderCode.__table__)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"provider_code_hebrew": statement.excluded.provider_code_hebrew},
+        ),
+        [{"id": k, "provider_code_hebrew": v} for k, v in provider_code_dict.items()],
+    )
+    db.session.commit()
 
 
 def create_views():
@@ -1012,6 +1459,7 @@ def update_dictionary_tables(path):
     import_ui = ImporterUI(path)
     dir_name = import_ui.source_path()
     dir_list = glob.glob("{0}/*/*".format(dir_name))
+    create_provider_code_table()
 
     for directory in sorted(dir_list, reverse=True):
         directory_name = os.path.basename(os.path.normpath(directory))
@@ -1028,6 +1476,20 @@ def update_dictionary_tables(path):
         fill_dictionary_tables(files_from_cbs[DICTIONARY], provider_code, int(year))
 
 
+def update_data_versions(years, all_years=False):
+    """
+    bumps the accidents data versions of the cbs markers of years, or of all of the years
+    """
+    sources = {infographics_data_cache_updater.get_cbs_source(year) for year in years}
+    if all_years:
+        sources.update(
+            source
+            for source in infographics_data_cache_updater.get_accidents_data_versions()
+            if source.startswith(infographics_data_cache_updater.CBS_SOURCE_PREFIX)
+        )
+    infographics_data_cache_updater.bump_accidents_data_versions(sources)
+
+
 def get_file_type_and_year(file_path):
     df = pd.read_csv(file_path, encoding=CONTENT_ENCODING)
     provider_code = df.iloc[0][field_names.file_type.lower()]
@@ -1046,8 +1508,12 @@ def main(
         username="",
         password="",
         email_search_start_date="",
-        from_s3=False
+        from_s3=False,
+        workers=1,
 ):
+    # years of the markers that changed, or all of them
+    changed_years = set()
+    all_years_changed = False
     try:
         if not from_email and not from_s3:
             import_ui = ImporterUI(path, specific_folder, delete_all)
@@ -1060,11 +1526,12 @@ def main(
 
             # wipe all the AccidentMarker and Vehicle and Involved data first
             if import_ui.is_delete_all():
+                all_years_changed = True
                 truncate_tables(db, (Vehicle, Involved, AccidentMarker))
             elif delete_start_date is not None:
-                delete_cbs_entries(delete_start_date, batch_size)
-            started = datetime.now()
-            total = 0
+                changed_years.update(get_years_since(delete_start_date))
+                delete_cbs_entries(delete_start_date)
+            directories = []
             for directory in sorted(dir_list, reverse=False):
                 directory_name = os.path.basename(os.path.normpath(directory))
                 year = directory_name[1:5] if directory_name[0] == "H" else directory_name[0:4]
@@ -1073,14 +1540,16 @@ def main(
                         os.path.dirname(os.path.join(os.pardir, directory))
                     )
                     provider_code = get_provider_code(parent_directory)
-                    logging.info("Importing Directory " + directory)
-                    total += import_to_datastore(directory, provider_code, int(year), batch_size)
+                    directories.append((directory, provider_code, int(year)))
                 else:
                     logging.info(
                         "Importing only starting year {0}. Directory {1} has year {2}".format(
                             load_start_year, directory_name, year
                         )
                     )
+            changed_years.update(year for _, _, year in directories)
+            started = datetime.now()
+            total = import_directories(directories, batch_size, workers)
         elif from_s3:
             logging.info("Importing data from s3...")
             s3_handler = S3Handler()
@@ -1088,18 +1557,20 @@ def main(
             """
             Should be soon implemented as "delete_entries_from_S3"
             """
-            # delete_cbs_entries_from_email(provider_code, year, batch_size)
+            # delete_cbs_entries_from_email(provider_code, year)
             if delete_start_date is not None:
-                delete_cbs_entries(delete_start_date, batch_size)
-            started = datetime.now()
-            total = 0
+                changed_years.update(get_years_since(delete_start_date))
+                delete_cbs_entries(delete_start_date)
+            directories = []
             for provider_code in [BE_CONST.CBS_ACCIDENT_TYPE_1_CODE, BE_CONST.CBS_ACCIDENT_TYPE_3_CODE]:
                 for year in range(int(load_start_year), s3_handler.current_year + 1):
                     cbs_files_dir = os.path.join(s3_handler.local_files_directory, ACCIDENTS_TYPE_PREFIX + '_' + str(provider_code), str(year))
-                    logging.info("Importing Directory " + cbs_files_dir)
                     preprocessing_cbs_files.update_cbs_files_names(cbs_files_dir)
                     acc_data_file_path = preprocessing_cbs_files.get_accidents_file_data(cbs_files_dir)
-                    total += import_to_datastore(cbs_files_dir, provider_code, year, batch_size)
+                    directories.append((cbs_files_dir, provider_code, year))
+            changed_years.update(year for _, _, year in directories)
+            started = datetime.now()
+            total = import_directories(directories, batch_size, workers)
             shutil.rmtree(s3_handler.local_temp_directory)
         else:
             logging.info("Importing data from mail...")
@@ -1117,15 +1588,15 @@ def main(
             preprocessing_cbs_files.update_cbs_files_names(cbs_files_dir)
             acc_data_file_path = preprocessing_cbs_files.get_accidents_file_data(cbs_files_dir)
             provider_code, year = get_file_type_and_year(acc_data_file_path)
-            delete_cbs_entries_from_email(provider_code, year, batch_size)
+            changed_years.add(year)
+            delete_cbs_entries_from_email(provider_code, year)
             started = datetime.now()
             total = 0
+            create_provider_code_table()
             logging.info("Importing Directory " + cbs_files_dir)
             total += import_to_datastore(cbs_files_dir, provider_code, year, batch_size)
             shutil.rmtree(temp_dir)
 
-        fill_db_geo_data()
-
         failed = [
             "\t'{0}' ({1})".format(directory, fail_reason)
             for directory, fail_reason in failed_dirs.items()
@@ -1142,3 +1613,17 @@ def main(
         print("Exception occured while loading the cbs data: {0}".format(str(ex)))
         print("Traceback: {0}".format(traceback.format_exc()))
         # Todo - send an email that an exception occured
+
+    # after failures as well, the markers of the years may have been deleted
+    try:
+        update_data_versions(changed_years, all_years_changed)
+    except Exception:
+        logging.exception("Failed updating the accidents data versions")
+    try:
+        location_index.build(news_flash_db_adapter.init_db())
+    except Exception:
+        logging.exception("Failed building the location index")
+    try:
+        clusters_pyramid.rebuild_years(None if all_years_changed else changed_years)
+    except Exception:
+        logging.exception("Failed rebuilding the clusters pyramid")
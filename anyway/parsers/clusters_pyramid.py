@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, desc, func, not_, or_
+
+from anyway import globalmaptiles as globaltiles
+from anyway.app_and_db import db
+from anyway.constants import CONST
+from anyway.models import AccidentMarker, ClustersPyramid
+from anyway.pymapcluster import cluster_pixels_grid, latlngs_to_zoompixels
+
+# markers are pre-clustered at half the radius /clusters uses, so merging the pre-clusters of
+# neighbouring tiles, months, providers and severities stays close to clustering the markers
+PYRAMID_CLUSTER_RADIUS = 25
+PYRAMID_KEY_COLUMNS = ["accident_year", "accident_month", "provider_code", "accident_severity"]
+UNKNOWN_SEVERITY = -1
+
+
+def load_markers(years=None):
+    """
+    :param years: years of the markers to load, all of them if None
+    """
+    query_obj = (
+        db.session.query(AccidentMarker)
+        .with_entities(
+            AccidentMarker.latitude,
+            AccidentMarker.longitude,
+            AccidentMarker.created,
+            AccidentMarker.provider_code,
+            AccidentMarker.accident_severity,
+        )
+        .filter(not_(AccidentMarker.geom == None))
+        .filter(not_(AccidentMarker.latitude == None))
+        .filter(not_(AccidentMarker.longitude == None))
+        .order_by(desc(AccidentMarker.created))
+    )
+    if years is not None:
+        query_obj = query_obj.filter(
+            or_(
+                *(
+                    and_(
+                        AccidentMarker.created >= datetime(year, 1, 1),
+                        AccidentMarker.created < datetime(year + 1, 1, 1),
+                    )
+                    for year in years
+                )
+            )
+        )
+    markers = pd.read_sql_query(query_obj.statement, query_obj.session.bind)
+    # /clusters filters dates on created, so the pyramid is keyed by it as well
+    markers["accident_year"] = markers.created.dt.year
+    markers["accident_month"] = markers.created.dt.month
+    markers["accident_severity"] = markers.accident_severity.fillna(UNKNOWN_SEVERITY).astype(int)
+    return markers.drop(columns="created").reset_index(drop=True)
+
+
+def pixels_to_google_tiles(mercator, pix_x, pix_y, zoom):
+    """
+    Vectorized GlobalMercator.PixelsToTile followed by GoogleTile
+    """
+    tile_x = np.ceil(pix_x / float(mercator.tileSize)).astype(np.int64) - 1
+    tile_y = np.ceil(pix_y / float(mercator.tileSize)).astype(np.int64) - 1
+    return tile_x, (2 ** zoom - 1) - tile_y
+
+
+def build_zoom_level(markers, zoom, mercator):
+    pix_x, pix_y = latlngs_to_zoompixels(
+        mercator, markers.latitude.values, markers.longitude.values, zoom
+    )
+    tiles_x, tiles_y = pixels_to_google_tiles(mercator, pix_x, pix_y, zoom)
+    rows = []
+    # positions in each group keep the created desc order /clusters clusters markers in
+    groups = markers.groupby(PYRAMID_KEY_COLUMNS).indices
+    for (year, month, provider_code, severity), positions in groups.items():
+        centers, _, sizes = cluster_pixels_grid(
+            pix_x[positions], pix_y[positions], PYRAMID_CLUSTER_RADIUS
+        )
+        for center, size in zip(positions[centers].tolist(), sizes):
+            rows.append(
+                {
+                    "zoom": zoom,
+                    "tile_x": int(tiles_x[center]),
+                    "tile_y": int(tiles_y[center]),
+                    "accident_year": int(year),
+                    "accident_month": int(month),
+                    "provider_code": int(provider_code),
+                    "accident_severity": None if severity == UNKNOWN_SEVERITY else int(severity),
+                    "latitude": float(markers.latitude.iat[center]),
+                    "longitude": float(markers.longitude.iat[center]),
+                    "size": size,
+                }
+            )
+    return rows
+
+
+def build_pyramid(min_zoom, max_zoom, years=None):
+    """
+    :param years: years to rebuild, keeping the pyramid of the other years, all of them if None
+    """
+    start = datetime.now()
+    markers = load_markers(years)
+    db.session.commit()
+    logging.info(f"building clusters pyramid of {len(markers)} markers, zoom {min_zoom}-{max_zoom}")
+    mercator = globaltiles.GlobalMercator()
+    table = ClustersPyramid.__table__  # pylint: disable=no-member
+    # /clusters keeps using the previous pyramid until the transaction commits
+    with db.get_engine().begin() as conn:
+        if years is None:
+            conn.execute(table.delete())
+        else:
+            conn.execute(table.delete().where(table.c.accident_year.in_(years)))
+        for zoom in range(min_zoom, max_zoom + 1):
+            rows = build_zoom_level(markers, zoom, mercator)
+            if rows:
+                conn.execute(table.insert(), rows)
+            logging.debug(f"zoom {zoom}: {len(rows)} clusters")
+    logging.info(f"clusters pyramid build took:{str(datetime.now() - start)}")
+
+
+def rebuild_years(years=None):
+    """
+    rebuilds the zoom levels of the pyramid of the markers of years, after they were imported or
+    deleted, so /clusters doesn't serve the clusters of the previous markers. Does nothing if the
+    pyramid wasn't built.
+    :param years: years whose markers changed, all of them if None
+    """
+    if years is not None:
+        years = sorted(years)
+        if not years:
+            return
+    min_zoom, max_zoom = db.session.query(
+        func.min(ClustersPyramid.zoom), func.max(ClustersPyramid.zoom)
+    ).one()
+    db.session.commit()
+    if min_zoom is None:
+        logging.info("clusters pyramid wasn't built, not rebuilding it")
+        return
+    logging.info(f"rebuilding clusters pyramid of years {years or 'all'}")
+    build_pyramid(min_zoom, max_zoom, years)
+
+
+def main(min_zoom=0, max_zoom=CONST.MINIMAL_ZOOM - 1):
+    if not 0 <= min_zoom <= max_zoom < CONST.MINIMAL_ZOOM:
+        raise ValueError(
+            f"zoom levels should be in 0-{CONST.MINIMAL_ZOOM - 1}, got {min_zoom}-{max_zoom}"
+        )
+    build_pyramid(min_zoom, max_zoom)
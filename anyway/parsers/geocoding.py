@@ -0,0 +1,130 @@
+"""
+Geocoding of news flash locations, for geocode_extract (location_extraction). A geocoder is any
+object with a geocode(location) method returning a list of google maps geocoding results, empty
+if none were found:
+- GoogleGeocoder calls the google maps geocoding API through a single shared client.
+- LocalGeocoder answers from a JSON file of results, for tests and development without a maps
+  key - set LOCAL_GEOCODE_RESULTS to its path to use it.
+- CachedGeocoder keeps the results of another geocoder in the geocode_cache table, keyed by the
+  normalized location text, for GEOCODE_CACHE_TTL. Geocoding known locations again, e.g. when
+  update_all_in_db reclassifies all the news flashes, doesn't call the other geocoder.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+import googlemaps
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from anyway.app_and_db import db
+from anyway.models import GeocodeCache
+from anyway.parsers import secrets
+
+GEOCODE_CACHE_TTL = timedelta(days=int(os.environ.get("GEOCODE_CACHE_TTL_DAYS", 180)))
+LOCAL_GEOCODE_RESULTS = os.environ.get("LOCAL_GEOCODE_RESULTS")
+
+_geocoder = None
+
+
+def normalize_location(location):
+    return " ".join(location.split())
+
+
+class GoogleGeocoder:
+    def __init__(self, key=None):
+        self._key = key
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = googlemaps.Client(key=self._key or secrets.get("GOOGLE_MAPS_KEY"))
+        return self._client
+
+    def geocode(self, location):
+        return self.client.geocode(location, region="il") or []
+
+
+class LocalGeocoder:
+    def __init__(self, results):
+        """
+        :param results: dict of normalized locations to their results
+        """
+        self.results = results
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as results_file:
+            return cls(json.load(results_file))
+
+    def geocode(self, location):
+        return self.results.get(normalize_location(location), [])
+
+
+def _get_cached(location):
+    """
+    :return: (result, created) of location in the geocode cache, None if it isn't cached
+    """
+    table = GeocodeCache.__table__
+    return db.session.execute(
+        select([table.c.result, table.c.created]).where(table.c.location == location)
+    ).first()
+
+
+def _set_cached(location, result, created):
+    # committed right away in a transaction of its own, not with the news flashes of the session:
+    # concurrent update_all_in_db workers may geocode the same location, and the row lock of the
+    # upsert must not be held until the end of their batches
+    statement = postgresql.insert(GeocodeCache.__table__).values(
+        location=location, result=result, created=created
+    )
+    with db.get_engine().begin() as connection:
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=["location"],
+                set_={"result": statement.excluded.result, "created": statement.excluded.created},
+            )
+        )
+
+
+class CachedGeocoder:
+    def __init__(self, geocoder, ttl=GEOCODE_CACHE_TTL):
+        self.geocoder = geocoder
+        self.ttl = ttl
+
+    def geocode(self, location):
+        location = normalize_location(location)
+        now = datetime.now()
+        cached = _get_cached(location)
+        if cached is not None:
+            result, created = cached
+            if now - created <= self.ttl:
+                return result
+        result = self.geocoder.geocode(location)
+        _set_cached(location, result, now)
+        logging.debug(f"geocoded {location}")
+        return result
+
+
+def get_geocoder():
+    """
+    :return: the geocoder geocode_extract uses by default - the local results of
+             LOCAL_GEOCODE_RESULTS if it is set, google maps through the geocode cache otherwise
+    """
+    global _geocoder
+    if _geocoder is None:
+        if LOCAL_GEOCODE_RESULTS:
+            _geocoder = LocalGeocoder.from_file(LOCAL_GEOCODE_RESULTS)
+        else:
+            _geocoder = CachedGeocoder(GoogleGeocoder())
+    return _geocoder
+
+
+def set_geocoder(geocoder):
+    """
+    replaces the geocoder get_geocoder returns, None to choose it again by LOCAL_GEOCODE_RESULTS
+    """
+    global _geocoder
+    _geocoder = geocoder
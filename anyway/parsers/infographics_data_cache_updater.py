@@ -1,13 +1,26 @@
 # -*- coding: utf-8 -*-
 
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from sqlalchemy import not_
-from anyway.models import InfographicsDataCache, InfographicsDataCacheTemp, NewsFlash
+import hashlib
+import json
+from sqlalchemy import not_, select, tuple_
+from sqlalchemy.dialects import postgresql
+from anyway.models import (
+    AccidentsDataVersion,
+    InfographicsDataCache,
+    InfographicsDataCacheTemp,
+    NewsFlash,
+)
 from anyway.constants import CONST
 from anyway.app_and_db import db
+from anyway.utilities import chunks
 import anyway.infographics_utils
 import logging
 
+INFOGRAPHICS_CACHE_BATCH_SIZE = 100
+CBS_SOURCE_PREFIX = "cbs_"
+
 
 def is_cache_eligible(news_flash):
     return (
@@ -17,6 +30,70 @@ def is_cache_eligible(news_flash):
     )
 
 
+def get_cache_eligible_news_flashes_query():
+    return (
+        db.session.query(NewsFlash)
+        .filter(NewsFlash.accident)
+        .filter(NewsFlash.resolution.in_(["כביש בינעירוני"]))
+        .filter(not_(NewsFlash.road_segment_name == None))
+    )
+
+
+def get_cbs_source(year):
+    return f"{CBS_SOURCE_PREFIX}{year}"
+
+
+def get_accidents_data_versions():
+    """
+    :return: dict of the sources of the accidents data the infographics are computed from to
+             their versions, see AccidentsDataVersion
+    """
+    versions = dict(db.session.query(AccidentsDataVersion.source, AccidentsDataVersion.version))
+    db.session.commit()
+    return versions
+
+
+def bump_accidents_data_versions(sources):
+    """
+    increments the versions of sources after they were imported, so the next incremental
+    rebuild of the cache recomputes the items computed from them
+    """
+    rows = [{"source": source, "version": 1, "updated": datetime.now()} for source in sources]
+    if not rows:
+        return
+    table = AccidentsDataVersion.__table__
+    statement = postgresql.insert(table)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["source"],
+            set_={"version": table.c.version + 1, "updated": statement.excluded.updated},
+        ),
+        rows,
+    )
+    db.session.commit()
+    logging.info(f"bumped accidents data versions of {sorted(sources)}")
+
+
+def get_source_hash(news_flash, years_ago, data_version):
+    source = json.dumps([news_flash.serialize(), years_ago, data_version], default=str)
+    return hashlib.md5(source.encode("utf-8")).hexdigest()
+
+
+def create_cache_items(news_flash_id, source_hashes):
+    """
+    :param source_hashes: dict of the years_ago of the items to create to their source hash
+    """
+    return [
+        {
+            "news_flash_id": news_flash_id,
+            "years_ago": y,
+            "data": anyway.infographics_utils.create_infographics_data(news_flash_id, y),
+            "source_hash": source_hash,
+        }
+        for y, source_hash in source_hashes.items()
+    ]
+
+
 def is_in_cache(nf):
     return (
         len(CONST.INFOGRAPHICS_CACHE_YEARS_AGO)
@@ -33,18 +110,12 @@ def add_news_flash_to_cache(news_flash):
                 f"add_news_flash_to_cache: news flash does not qualify:{news_flash.serialize()}"
             )
             return True
+        # without a source hash, the next incremental rebuild of the cache recomputes the items
         db.get_engine().execute(
             InfographicsDataCache.__table__.insert(),  # pylint: disable=no-member
-            [
-                {
-                    "news_flash_id": news_flash.get_id(),
-                    "years_ago": y,
-                    "data": anyway.infographics_utils.create_infographics_data(
-                        news_flash.get_id(), y
-                    ),
-                }
-                for y in CONST.INFOGRAPHICS_CACHE_YEARS_AGO
-            ],
+            create_cache_items(
+                news_flash.get_id(), {y: None for y in CONST.INFOGRAPHICS_CACHE_YEARS_AGO}
+            ),
         )
         logging.info(f"{news_flash.get_id()} added to cache")
         return True
@@ -102,29 +173,100 @@ def copy_temp_into_cache():
     db.session.commit()
 
 
-def build_cache_into_temp():
-    start = datetime.now()
+def copy_cache_items_into_temp(keys):
+    """
+    copies the cache items of the (news_flash_id, years_ago) keys into the temp table
+    """
+    cache_table = InfographicsDataCache.__table__  # pylint: disable=no-member
+    temp_table = InfographicsDataCacheTemp.__table__  # pylint: disable=no-member
+    columns = [column.name for column in temp_table.columns]
+    for keys_chunk in chunks(keys, INFOGRAPHICS_CACHE_BATCH_SIZE):
+        db.session.execute(
+            temp_table.insert().from_select(
+                columns,
+                select([cache_table.c[column] for column in columns]).where(
+                    tuple_(cache_table.c.news_flash_id, cache_table.c.years_ago).in_(keys_chunk)
+                ),
+            )
+        )
+    db.session.commit()
+
+
+def insert_into_temp(items):
+    db.get_engine().execute(
+        InfographicsDataCacheTemp.__table__.insert(), items  # pylint: disable=no-member
+    )
+
+
+def clear_temp():
     db.session.query(InfographicsDataCacheTemp).delete()
     db.session.commit()
-    for y in CONST.INFOGRAPHICS_CACHE_YEARS_AGO:
-        logging.debug(f"processing years_ago:{y}")
-        db.get_engine().execute(
-            InfographicsDataCacheTemp.__table__.insert(),  # pylint: disable=no-member
-            [
-                {
-                    "news_flash_id": new_flash.get_id(),
-                    "years_ago": y,
-                    "data": anyway.infographics_utils.create_infographics_data(
-                        new_flash.get_id(), y
-                    ),
-                }
-                for new_flash in db.session.query(NewsFlash)
-                .filter(NewsFlash.accident)
-                .filter(NewsFlash.resolution.in_(["כביש בינעירוני"]))
-                .filter(not_(NewsFlash.road_segment_name == None))
-                .all()
-            ],
+
+
+def get_cached_source_hashes():
+    """
+    :return: dict of the (news_flash_id, years_ago) keys of the cache items to their source hash
+    """
+    return {
+        (news_flash_id, years_ago): source_hash
+        for news_flash_id, years_ago, source_hash in db.session.query(
+            InfographicsDataCache.news_flash_id,
+            InfographicsDataCache.years_ago,
+            InfographicsDataCache.source_hash,
         )
+    }
+
+
+def build_cache_into_temp(workers=1, incremental=False):
+    """
+    :param workers: number of processes computing the infographics data
+    :param incremental: only compute the items whose news flash or accidents data changed since
+                        they were cached, and copy the others from the cache
+    """
+    start = datetime.now()
+    clear_temp()
+    cached_hashes = get_cached_source_hashes() if incremental else {}
+    news_flashes = get_cache_eligible_news_flashes_query().all()
+    data_version = json.dumps(get_accidents_data_versions(), sort_keys=True)
+    unchanged_keys = []
+    news_flash_ids = []
+    news_flashes_source_hashes = []
+    for news_flash in news_flashes:
+        source_hashes = {}
+        for y in CONST.INFOGRAPHICS_CACHE_YEARS_AGO:
+            source_hash = get_source_hash(news_flash, y, data_version)
+            if cached_hashes.get((news_flash.get_id(), y)) == source_hash:
+                unchanged_keys.append((news_flash.get_id(), y))
+            else:
+                source_hashes[y] = source_hash
+        if source_hashes:
+            news_flash_ids.append(news_flash.get_id())
+            news_flashes_source_hashes.append(source_hashes)
+    copy_cache_items_into_temp(unchanged_keys)
+    logging.info(
+        f"{len(unchanged_keys)} cache items are unchanged, "
+        f"computing the items of {len(news_flash_ids)} news flashes"
+    )
+
+    # workers are forked, they must not share the connections of this process
+    db.session.remove()
+    db.get_engine().dispose()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        results = (executor.map if executor else map)(
+            create_cache_items, news_flash_ids, news_flashes_source_hashes
+        )
+        items = []
+        for news_flash_items in results:
+            items += news_flash_items
+            if len(items) >= INFOGRAPHICS_CACHE_BATCH_SIZE:
+                insert_into_temp(items)
+                items = []
+        if items:
+            insert_into_temp(items)
+    finally:
+        if executor:
+            executor.shutdown()
     logging.info(f"cache rebuild took:{str(datetime.now() - start)}")
 
 
@@ -132,21 +274,15 @@ def get_cache_info():
     cache_items = db.session.query(InfographicsDataCache).count()
     tmp_items = db.session.query(InfographicsDataCacheTemp).count()
     num_acc_flash_items = db.session.query(NewsFlash).filter(NewsFlash.accident).count()
-    num_acc_suburban_flash_items = (
-        db.session.query(NewsFlash)
-        .filter(NewsFlash.accident)
-        .filter(NewsFlash.resolution.in_(["כביש בינעירוני"]))
-        .filter(not_(NewsFlash.road_segment_name == None))
-        .count()
-    )
+    num_acc_suburban_flash_items = get_cache_eligible_news_flashes_query().count()
     db.session.commit()
     return f"num items in cache: {cache_items}, temp table: {tmp_items}, accident flashes:{num_acc_flash_items}, flashes processed:{num_acc_suburban_flash_items}"
 
 
-def main(update, info):
+def main(update, info, workers=1, incremental=False):
     if update:
         logging.info("Refreshing infographics cache...")
-        build_cache_into_temp()
+        build_cache_into_temp(workers=workers, incremental=incremental)
         copy_temp_into_cache()
         logging.info("Refreshing infographics cache Done")
     if info:
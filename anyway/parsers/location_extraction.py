@@ -1,14 +1,11 @@
 import logging
 import re
 
-import geohash  # python-geohash package
-import googlemaps
 import numpy as np
-from geographiclib.geodesic import Geodesic
 
 from anyway.models import NewsFlash
-from anyway.parsers import resolution_dict
-from anyway.parsers import secrets
+from anyway.parsers import location_index, resolution_dict
+from anyway.parsers import geocoding
 
 
 def extract_road_number(location):
@@ -41,43 +38,9 @@ def get_db_matching_location(db, latitude, longitude, resolution, road_no=None):
     :return: a dict containing all the geo fields stated in
     resolution dict, with values filled according to resolution
     """
-    # READ MARKERS FROM DB
-    geod = Geodesic.WGS84
     relevant_fields = resolution_dict[resolution]
-    markers = db.get_markers_for_location_extraction()
-    markers["geohash"] = markers.apply(
-        lambda x: geohash.encode(x["latitude"], x["longitude"], precision=4), axis=1
-    )
-    markers_orig = markers.copy()
-    if resolution != "אחר":
-        if (
-            road_no is not None
-            and road_no > 0
-            and ("road1" in relevant_fields or "road2" in relevant_fields)
-        ):
-            markers = markers.loc[(markers["road1"] == road_no) | (markers["road2"] == road_no)]
-        for field in relevant_fields:
-            if field == "road1":
-                markers = markers.loc[markers[field].notnull()]
-                markers = markers.loc[markers[field] > 0]
-            elif field in ["region_hebrew", "district_hebrew", "yishuv_name", "street1_hebrew"]:
-                markers = markers.loc[markers[field].notnull()]
-                markers = markers.loc[markers[field] != ""]
-    if markers.count()[0] == 0:
-        markers = markers_orig
-
-    # FILTER BY GEOHASH
-    curr_geohash = geohash.encode(latitude, longitude, precision=4)
-    if markers.loc[markers["geohash"] == curr_geohash].count()[0] > 0:
-        markers = markers.loc[markers["geohash"] == curr_geohash].copy()
-
-    # CREATE DISTANCE FIELD
-    markers["dist_point"] = markers.apply(
-        lambda x: geod.Inverse(latitude, longitude, x["latitude"], x["longitude"])["s12"], axis=1,
-    ).replace({np.nan: None})
-
-    most_fit_loc = (
-        markers.loc[markers["dist_point"] == markers["dist_point"].min()].iloc[0].to_dict()
+    most_fit_loc = location_index.get_location_index(db).match(
+        latitude, longitude, resolution, road_no
     )
 
     final_loc = {}
@@ -117,11 +80,12 @@ def set_accident_resolution(accident_row):
             logging.info("bug in accident resolution")
 
 
-def geocode_extract(location):
+def geocode_extract(location, geocoder=None):
     """
-    this method takes a string representing location and a google maps key and returns a dict of the corresponding
+    this method takes a string representing location and returns a dict of the corresponding
     location found on google maps (by that string), describing details of the location found and the geometry
     :param location: string representing location
+    :param geocoder: geocoder to find the location with, geocoding.get_geocoder() by default
     :return: a dict containing data about the found location on google maps, with the keys: street,
     road_no [road number], intersection, city, address, district and the geometry of the location.
     """
@@ -134,9 +98,8 @@ def geocode_extract(location):
     address = None
     geom = {"lat": None, "lng": None}
     try:
-        gmaps = googlemaps.Client(key=secrets.get("GOOGLE_MAPS_KEY"))
-        geocode_result = gmaps.geocode(location, region="il")
-        if geocode_result is None or geocode_result == []:
+        geocode_result = (geocoder or geocoding.get_geocoder()).geocode(location)
+        if not geocode_result:
             return None
         response = geocode_result[0]
         geom = response["geometry"]["location"]
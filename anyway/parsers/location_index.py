@@ -0,0 +1,146 @@
+"""
+Index of the distinct CBS marker locations get_db_matching_location (location_extraction) matches
+news flashes against. It is built by one query of the markers, rebuilt after CBS imports, and
+saved to the location_index table, so news flash processes load it instead of querying the
+markers for every news flash. Markers are bucketed by their precision 4 geohash, and the markers fitting a
+resolution and road number are kept as boolean masks, so a match only measures the distances to
+the markers of one bucket, with nearest_geodesic. Only the markers are saved, as gzipped JSON, and
+the buckets are computed again when they are loaded.
+"""
+import gzip
+import json
+import logging
+
+import geohash  # python-geohash package
+import numpy as np
+import pandas as pd
+
+from anyway.parsers import resolution_dict
+from anyway.utilities import nearest_geodesic
+
+GEOHASH_PRECISION = 4
+TEXT_FIELDS = ("region_hebrew", "district_hebrew", "yishuv_name", "street1_hebrew")
+
+_index = None
+_index_created = None
+
+
+class LocationIndex:
+    def __init__(self, markers):
+        """
+        :param markers: DataFrame of the locations, as returned by
+                        DBAdapter.get_markers_for_location_extraction
+        """
+        self.markers = markers.reset_index(drop=True)
+        self.latitudes = self.markers["latitude"].to_numpy(dtype=float)
+        self.longitudes = self.markers["longitude"].to_numpy(dtype=float)
+        geohashes = [
+            geohash.encode(latitude, longitude, precision=GEOHASH_PRECISION)
+            for latitude, longitude in zip(self.latitudes, self.longitudes)
+        ]
+        self.buckets = (
+            pd.Series(np.arange(len(self.markers))).groupby(geohashes).indices
+            if len(self.markers)
+            else {}
+        )
+        # get_db_matching_location told whether a set of markers is empty by the count of its
+        # first column, road1
+        self.has_road1 = self.markers["road1"].notnull().to_numpy()
+        self._masks = {}
+
+    def get_mask(self, resolution, road_no=None):
+        """
+        :return: boolean array of the markers that fit resolution and road_no
+        """
+        key = (resolution, road_no)
+        if key not in self._masks:
+            markers = self.markers
+            mask = np.ones(len(markers), dtype=bool)
+            relevant_fields = resolution_dict[resolution]
+            if resolution != "אחר":
+                if (
+                    road_no is not None
+                    and road_no > 0
+                    and ("road1" in relevant_fields or "road2" in relevant_fields)
+                ):
+                    on_road = (markers["road1"] == road_no) | (markers["road2"] == road_no)
+                    mask &= on_road.to_numpy()
+                for field in relevant_fields:
+                    if field == "road1":
+                        mask &= (markers[field].notnull() & (markers[field] > 0)).to_numpy()
+                    elif field in TEXT_FIELDS:
+                        mask &= (markers[field].notnull() & (markers[field] != "")).to_numpy()
+            if not (mask & self.has_road1).any():
+                mask = np.ones(len(markers), dtype=bool)
+            self._masks[key] = mask
+        return self._masks[key]
+
+    def get_candidates(self, latitude, longitude, resolution, road_no=None):
+        """
+        :return: indexes of the markers fitting resolution and road_no in the geohash bucket of
+                 latitude and longitude, or anywhere if there are none in it
+        """
+        mask = self.get_mask(resolution, road_no)
+        bucket = self.buckets.get(
+            geohash.encode(latitude, longitude, precision=GEOHASH_PRECISION),
+            np.array([], dtype=int),
+        )
+        candidates = bucket[mask[bucket]]
+        if self.has_road1[candidates].any():
+            return candidates
+        return np.flatnonzero(mask)
+
+    def match(self, latitude, longitude, resolution, road_no=None):
+        """
+        :return: dict of the fields of the nearest marker of get_candidates
+        """
+        candidates = self.get_candidates(latitude, longitude, resolution, road_no)
+        nearest, _ = nearest_geodesic(
+            latitude, longitude, self.latitudes[candidates], self.longitudes[candidates]
+        )
+        return self.markers.iloc[candidates[nearest]].to_dict()
+
+
+def dump_markers(markers):
+    """
+    :return: markers as gzipped JSON
+    """
+    # Series.tolist gives python values, and floats are written exactly as their repr
+    columns = {column: markers[column].tolist() for column in markers.columns}
+    return gzip.compress(json.dumps(columns, ensure_ascii=False).encode("utf-8"))
+
+
+def load_markers(data):
+    return pd.DataFrame(json.loads(gzip.decompress(data).decode("utf-8")))
+
+
+def build(db):
+    """
+    builds the location index from the markers of db and saves it to db
+    """
+    global _index, _index_created
+    index = LocationIndex(db.get_markers_for_location_extraction())
+    created = db.save_location_index(dump_markers(index.markers))
+    _index, _index_created = index, created
+    logging.info(f"built location index of {len(index.markers)} locations")
+    return index
+
+
+def get_location_index(db):
+    """
+    :return: the location index saved to db, loaded again when it is rebuilt, or built from db if
+             there is none or it can't be loaded
+    """
+    global _index, _index_created
+    created = db.get_location_index_created()
+    if created is None:
+        return build(db)
+    if created != _index_created:
+        markers, created = db.get_location_index()
+        try:
+            index = LocationIndex(load_markers(markers))
+        except (OSError, EOFError, ValueError, KeyError):
+            logging.exception("Failed loading the location index, building it again")
+            return build(db)
+        _index, _index_created = index, created
+    return _index
@@ -1,5 +1,10 @@
+import json
+import logging
 import os
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
 
 from anyway.parsers import twitter, rss_sites
 from anyway.parsers.news_flash_db_adapter import init_db
@@ -13,35 +18,153 @@ from anyway.parsers.location_extraction import extract_geo_features
 # FIX: classifier should be chosen by source (screen name), so `twitter` should be `mda`
 news_flash_classifiers = {"ynet": classify_rss, "twitter": classify_tweets, "walla": classify_rss}
 
+UPDATE_CHECKPOINT_PATH = os.environ.get(
+    "NEWS_FLASH_UPDATE_CHECKPOINT_PATH",
+    os.path.join(tempfile.gettempdir(), "anyway_news_flash_update_checkpoint.json"),
+)
+
+
+def update_newsflash(db, newsflash):
+    classify = news_flash_classifiers[newsflash.source]
+    newsflash.organization = classify_organization(newsflash.source)
+    newsflash.accident = classify(newsflash.description or newsflash.title)
+    if newsflash.accident:
+        extract_geo_features(db, newsflash)
+
+
+def update_newsflash_batch(ids):
+    """
+    updates and commits the news flashes of ids
+    :return: (number of news flashes updated, number of them classified as accidents)
+    """
+    db = init_db()
+    try:
+        newsflashes = db.get_newsflash_by_ids(ids).all()
+        for newsflash in newsflashes:
+            update_newsflash(db, newsflash)
+        db.commit()
+        return len(newsflashes), sum(bool(newsflash.accident) for newsflash in newsflashes)
+    finally:
+        db.db.session.remove()
+
+
+def read_update_checkpoint(source, path=UPDATE_CHECKPOINT_PATH):
+    """
+    :return: id of the last news flash updated by an update_all_in_db of source that didn't
+             finish, None if there is none
+    """
+    try:
+        with open(path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+    if checkpoint["source"] != source:
+        logging.warning(f"ignoring checkpoint {checkpoint} of an update of another source")
+        return None
+    return checkpoint["last_id"]
+
+
+def write_update_checkpoint(source, last_id, path=UPDATE_CHECKPOINT_PATH):
+    with tempfile.NamedTemporaryFile(
+        "w", dir=os.path.dirname(path), delete=False
+    ) as checkpoint_file:
+        json.dump({"source": source, "last_id": last_id}, checkpoint_file)
+    os.replace(checkpoint_file.name, path)
+
 
-def update_all_in_db(source=None, newsflash_id=None):
+def update_all_in_db(
+    source=None,
+    newsflash_id=None,
+    batch_size=1000,
+    workers=1,
+    resume=False,
+    checkpoint_path=UPDATE_CHECKPOINT_PATH,
+):
     """
     main function for newsflash updating.
 
     Should be executed each time the classification or location-extraction are updated.
+
+    The news flashes are updated in batches of batch_size, by ascending id, each committed on its
+    own, or with workers > 1 concurrently by a pool of that many processes. The id of the last
+    news flash of the batches committed so far is saved to checkpoint_path, and with resume an
+    update of the same source continues after it. The checkpoint is removed when the update
+    finishes.
+    :return: number of news flashes updated
     """
     db = init_db()
     if newsflash_id is not None:
-        newsflash_items = db.get_newsflash_by_id(newsflash_id)
-    elif source is not None:
-        newsflash_items = db.select_newsflash_where_source(source)
+        newsflash_items = db.get_newsflash_by_id(newsflash_id).all()
+        for newsflash in newsflash_items:
+            update_newsflash(db, newsflash)
+        db.commit()
+        return len(newsflash_items)
+
+    last_id = read_update_checkpoint(source, checkpoint_path) if resume else None
+    if last_id is not None:
+        logging.info(f"resuming update of news flashes after id {last_id}")
+
+    def get_batches(after_id):
+        while True:
+            ids = db.get_newsflash_ids(source, after_id, batch_size)
+            if not ids:
+                return
+            yield ids
+            after_id = ids[-1]
+
+    started = datetime.now()
+    total = 0
+    total_accidents = 0
+
+    def batch_done(batch_number, ids, count, accidents):
+        nonlocal total, total_accidents
+        write_update_checkpoint(source, ids[-1], checkpoint_path)
+        total += count
+        total_accidents += accidents
+        seconds = (datetime.now() - started).total_seconds()
+        logging.info(
+            f"news flash batch {batch_number} (ids {ids[0]}-{ids[-1]}): {count} updated,"
+            f" {accidents} accidents, {total} in total"
+            f" ({total / seconds if seconds else 0:.1f} news flashes/sec)"
+        )
+
+    if workers <= 1:
+        for batch_number, ids in enumerate(get_batches(last_id), 1):
+            batch_done(batch_number, ids, *update_newsflash_batch(ids))
     else:
-        newsflash_items = db.get_all_newsflash()
+        # only ids are listed up front. Workers are forked, they must not share the connections
+        # of this process
+        batches = list(get_batches(last_id))
+        db.db.session.remove()
+        db.db.get_engine().dispose()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(update_newsflash_batch, ids) for ids in batches]
+            try:
+                # in order, so the checkpoint never passes a batch that isn't committed
+                for batch_number, (ids, future) in enumerate(zip(batches, futures), 1):
+                    batch_done(batch_number, ids, *future.result())
+            except BaseException:
+                # the batches that didn't start yet are updated on resume anyway
+                for future in futures:
+                    future.cancel()
+                raise
 
-    for newsflash in newsflash_items:
-        classify = news_flash_classifiers[newsflash.source]
-        newsflash.organization = classify_organization(newsflash.source)
-        newsflash.accident = classify(newsflash.description or newsflash.title)
-        if newsflash.accident:
-            extract_geo_features(db, newsflash)
-    db.commit()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    logging.info(
+        f"updated {total} news flashes, {total_accidents} accidents,"
+        f" in {(datetime.now() - started).total_seconds():.0f} seconds"
+    )
+    return total
 
 
 def scrape_extract_store_rss(site_name, db):
     latest_date = db.get_latest_date_of_source(site_name)
-    for newsflash in rss_sites.scrape(site_name):
-        if newsflash.date <= latest_date:
-            break
+    extract_store_rss(site_name, rss_sites.scrape(site_name, latest_date), db)
+
+
+def extract_store_rss(site_name, newsflashes, db):
+    for newsflash in newsflashes:
         # TODO: pass both title and description, leaving this choice to the classifier
         newsflash.accident = classify_rss(newsflash.title or newsflash.description)
         newsflash.organization = classify_organization(site_name)
@@ -53,7 +176,12 @@ def scrape_extract_store_rss(site_name, db):
 
 def scrape_extract_store_twitter(screen_name, db):
     latest_date = db.get_latest_date_of_source("twitter")
-    for newsflash in twitter.scrape(screen_name, db.get_latest_tweet_id()):
+    newsflashes = twitter.scrape(screen_name, db.get_latest_tweet_id())
+    extract_store_twitter(newsflashes, latest_date, db)
+
+
+def extract_store_twitter(newsflashes, latest_date, db):
+    for newsflash in newsflashes:
         if newsflash.date <= latest_date:
             # We can break if we're guaranteed the order is descending
             continue
@@ -67,9 +195,24 @@ def scrape_extract_store_twitter(screen_name, db):
 def scrape_all():
     """
     main function for newsflash scraping
+
+    The sites are scraped concurrently, and their news flashes are then stored one site after
+    the other through the single db session.
     """
     sys.path.append(os.path.dirname(os.path.realpath(__file__)))
     db = init_db()
-    scrape_extract_store_rss("ynet", db)
-    scrape_extract_store_rss("walla", db)
-    scrape_extract_store_twitter("mda_israel", db)
+    rss_sites_names = ("ynet", "walla")
+    latest_dates = {
+        source: db.get_latest_date_of_source(source) for source in (*rss_sites_names, "twitter")
+    }
+    latest_tweet_id = db.get_latest_tweet_id()
+    with ThreadPoolExecutor(max_workers=len(rss_sites_names) + 1) as executor:
+        # the scrapes are lazy, so they run in full in the executor threads
+        rss_scrapes = {
+            site_name: executor.submit(list, rss_sites.scrape(site_name, latest_dates[site_name]))
+            for site_name in rss_sites_names
+        }
+        twitter_scrape = executor.submit(list, twitter.scrape("mda_israel", latest_tweet_id))
+        for site_name, rss_scrape in rss_scrapes.items():
+            extract_store_rss(site_name, rss_scrape.result(), db)
+        extract_store_twitter(twitter_scrape.result(), latest_dates["twitter"], db)
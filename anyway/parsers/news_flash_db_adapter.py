@@ -2,12 +2,15 @@ import datetime
 import logging
 import pandas as pd
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql
 from anyway.parsers import infographics_data_cache_updater
 from anyway.parsers import timezones
-from anyway.models import NewsFlash
+from anyway.models import LocationIndexData, NewsFlash
 
 # fmt: off
 
+LOCATION_INDEX_ID = 1
+
 
 def init_db() -> "DBAdapter":
     from anyway.app_and_db import db
@@ -47,6 +50,37 @@ class DBAdapter:
         df.columns = query_res.keys()
         return df
 
+    def get_location_index_created(self):
+        """
+        :return: when the saved location index was built, None if there is none
+        """
+        return self.db.session.query(LocationIndexData.created) \
+            .filter(LocationIndexData.id == LOCATION_INDEX_ID).scalar()
+
+    def get_location_index(self):
+        """
+        :return: (markers, created) of the saved location index, None if there is none
+        """
+        return self.db.session.query(LocationIndexData.markers, LocationIndexData.created) \
+            .filter(LocationIndexData.id == LOCATION_INDEX_ID).first()
+
+    def save_location_index(self, markers):
+        """
+        saves the markers of the location index, in a transaction of its own, as it may be built
+        in the middle of updating news flashes
+        :return: when it was built
+        """
+        created = datetime.datetime.now()
+        statement = postgresql.insert(LocationIndexData.__table__).values(
+            id=LOCATION_INDEX_ID, markers=markers, created=created
+        )
+        with self.db.get_engine().begin() as connection:
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=["id"],
+                set_={"markers": statement.excluded.markers, "created": statement.excluded.created},
+            ))
+        return created
+
     def remove_duplicate_rows(self):
         """
         remove duplicate rows by link
@@ -77,6 +111,21 @@ class DBAdapter:
     def get_all_newsflash(self):
         return self.db.session.query(NewsFlash)
 
+    def get_newsflash_ids(self, source=None, after_id=None, limit=None):
+        """
+        :return: ids of the news flashes of source, or of all sources, with ids greater than
+                 after_id, in ascending order
+        """
+        query = self.db.session.query(NewsFlash.id)
+        if source is not None:
+            query = query.filter(NewsFlash.source == source)
+        if after_id is not None:
+            query = query.filter(NewsFlash.id > after_id)
+        return [newsflash_id for newsflash_id, in query.order_by(NewsFlash.id).limit(limit)]
+
+    def get_newsflash_by_ids(self, ids):
+        return self.db.session.query(NewsFlash).filter(NewsFlash.id.in_(ids)).order_by(NewsFlash.id)
+
     def get_latest_date_of_source(self, source):
         """
         :return: latest date of news flash
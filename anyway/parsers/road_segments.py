@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from openpyxl import load_workbook
 
+from anyway.parsers.infographics_data_cache_updater import bump_accidents_data_versions
 from anyway.parsers.utils import batch_iterator
 from anyway.models import RoadSegments
 from anyway.app_and_db import db
@@ -41,3 +42,4 @@ def parse(filename):
     for batch in batch_iterator(_iter_rows(filename), batch_size=50):
         db.session.bulk_insert_mappings(RoadSegments, batch)
         db.session.commit()
+    bump_accidents_data_versions(["road_segments"])
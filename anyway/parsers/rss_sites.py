@@ -1,5 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
 from anyway.models import NewsFlash
 from anyway.parsers import timezones
@@ -34,11 +37,41 @@ sites_config = {
 }
 
 
+# seconds to wait for connecting to a site, and for each read from it
+FETCH_TIMEOUT = (5, 20)
+# connections kept open per host - fetches beyond it wait for a free connection
+MAX_CONNECTIONS_PER_HOST = 4
+FETCH_WORKERS = 8
+
+_session = None
+
+
+def get_session() -> requests.Session:
+    """
+    :return: session shared by all fetches, keeping up to MAX_CONNECTIONS_PER_HOST keep-alive
+             connections to each host
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=MAX_CONNECTIONS_PER_HOST, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
 def _fetch(url: str) -> str:
-    return requests.get(url).text
+    return get_session().get(url, timeout=FETCH_TIMEOUT).text
 
 
-def scrape(site_name, *, fetch_rss=_fetch, fetch_html=_fetch):
+def scrape(site_name, latest_date=None, *, fetch_rss=_fetch, fetch_html=_fetch):
+    """
+    :param latest_date: date of the latest news flash of site_name already stored - the scrape
+                        stops at the first item that isn't newer, without fetching its page
+    :return: generator of the news flashes of the RSS items, in their order. The item pages are
+             fetched concurrently by FETCH_WORKERS threads.
+    """
     config = sites_config[site_name]
     rss_text = fetch_rss(config["rss"])
 
@@ -50,20 +83,26 @@ def scrape(site_name, *, fetch_rss=_fetch, fetch_html=_fetch):
 
     assert rss_soup_items
 
+    items = []
     for item_rss_soup in rss_soup_items:
         link = item_rss_soup.guid.get_text()
         date = timezones.parse_creation_datetime(item_rss_soup.pubdate.get_text())
-
-        html_text = fetch_html(link)
-        item_html_soup = BeautifulSoup(html_text, "lxml")
-
-        author, title, description = config["parser"](item_rss_soup, item_html_soup)
-        yield NewsFlash(
-            link=link,
-            date=date,
-            source=site_name,
-            author=author,
-            title=title,
-            description=description,
-            accident=False,
-        )
+        if latest_date is not None and date <= latest_date:
+            break
+        items.append((item_rss_soup, link, date))
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        html_texts = executor.map(fetch_html, [link for _, link, _ in items])
+        for (item_rss_soup, link, date), html_text in zip(items, html_texts):
+            item_html_soup = BeautifulSoup(html_text, "lxml")
+
+            author, title, description = config["parser"](item_rss_soup, item_html_soup)
+            yield NewsFlash(
+                link=link,
+                date=date,
+                source=site_name,
+                author=author,
+                title=title,
+                description=description,
+                accident=False,
+            )
@@ -6,7 +6,7 @@ import numpy as np
 import pandas as pd
 
 from anyway.models import SchoolWithDescription
-from anyway.utilities import time_delta, chunks, ItmToWGS84
+from anyway.utilities import time_delta, chunks, CachedItmToWGS84
 from anyway.app_and_db import db
 
 school_fields = {
@@ -32,7 +32,7 @@ school_fields = {
     "y": "Y",
 }
 
-coordinates_converter = ItmToWGS84()
+coordinates_converter = CachedItmToWGS84()
 
 
 def get_numeric_value(value, func):
@@ -7,7 +7,7 @@ import pandas as pd
 from flask_sqlalchemy import SQLAlchemy
 
 from ..models import SchoolWithDescription2020
-from ..utilities import init_flask, time_delta, chunks, ItmToWGS84
+from ..utilities import init_flask, time_delta, chunks, CachedItmToWGS84
 
 school_fields = {
     "school_id": "סמל_מוסד",
@@ -24,7 +24,7 @@ school_fields = {
 
 app = init_flask()
 db = SQLAlchemy(app)
-coordinates_converter = ItmToWGS84()
+coordinates_converter = CachedItmToWGS84()
 
 
 def get_numeric_value(value, func):
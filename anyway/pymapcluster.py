@@ -1,6 +1,8 @@
 ##
 from math import cos, sin, atan2, sqrt
 
+import numpy as np
+
 from anyway import globalmaptiles as globaltiles
 
 
@@ -38,6 +40,18 @@ def latlng_to_zoompixels(mercator, lat, lng, zoom):
     return pix
 
 
+def latlngs_to_zoompixels(mercator, lats, lngs, zoom):
+    """
+    Vectorized latlng_to_zoompixels - projects whole numpy arrays of lat/lng at once.
+    GlobalMercator.LatLonToMeters uses scalar math functions, so the lat/lon -> meters step is
+    repeated here with numpy, while MetersToPixels is plain arithmetic and works on arrays as is.
+    """
+    mx = lngs * mercator.originShift / 180.0
+    my = np.log(np.tan((90 + lats) * np.pi / 360.0)) / (np.pi / 180.0)
+    my = my * mercator.originShift / 180.0
+    return mercator.MetersToPixels(mx, my, zoom)
+
+
 def in_cluster(center, radius, point):
     return sqrt((point[0] - center[0]) ** 2 + (point[1] - center[1]) ** 2) <= radius
 
@@ -82,9 +96,126 @@ def cluster_markers(mercator, latlngs, zoom, gridsize=50):
     return centers, clusters, sizes
 
 
+def _cells_keys(cells):
+    # a single sortable int64 key per (x, y) grid cell
+    return cells[:, 0] * (1 << 32) + cells[:, 1]
+
+
+def _first_center_within(points, cells, centers_pix, gridsize):
+    """
+    Vectorized grid lookup: for every point, the lowest index of a center within gridsize pixels,
+    or -1 when there is none. Centers are at least gridsize apart, so only a few share a cell.
+    """
+    centers = np.asarray(centers_pix)
+    keys = _cells_keys(np.floor(centers / gridsize).astype(np.int64))
+    by_cell = np.argsort(keys, kind="stable")
+    sorted_keys = keys[by_cell]
+    max_per_cell = np.unique(sorted_keys, return_counts=True)[1].max()
+    first_center = np.full(len(points), -1, dtype=np.int64)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour_keys = _cells_keys(cells + (dx, dy))
+            start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+            end = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+            for offset in range(max_per_cell):
+                in_cell = start + offset < end
+                cidx = by_cell[np.minimum(start + offset, len(by_cell) - 1)]
+                distance = np.sqrt(
+                    (points[:, 0] - centers[cidx, 0]) ** 2 + (points[:, 1] - centers[cidx, 1]) ** 2
+                )
+                found = (
+                    in_cell
+                    & (distance <= gridsize)
+                    & ((first_center == -1) | (cidx < first_center))
+                )
+                first_center[found] = cidx[found]
+    return first_center
+
+
+def cluster_pixels_grid(pix_x, pix_y, gridsize=50, weights=None, block_size=1024):
+    """
+    Same clustering as cluster_markers, in near-linear time, over already projected points.
+    Identical pixels are collapsed, and cluster centers are bucketed into a grid of gridsize
+    cells, so a point is only compared to the centers in the 3x3 cells around it - any center
+    within gridsize pixels must be in one of them - and the lowest-index matching center is
+    picked, keeping the "first center wins" order of cluster_markers.
+    Points are processed in blocks: a block is clustered point by point, then every later point
+    that is already within reach of an existing center is assigned in one vectorized pass, as
+    centers created later can't precede it. Only the points that may open new clusters are
+    left for the next (twice as large) block.
+    Args:
+        pix_x, pix_y: numpy arrays of pixel coordinates, in clustering order
+        gridsize: cluster radius (in pixels)
+        weights: optional numpy array of point weights summed into the cluster sizes,
+                 each point counts as 1 by default
+    Returns: see cluster_markers
+    """
+    if len(pix_x) == 0:
+        return [], [], []
+    # complex numbers sort lexicographically, which makes np.unique on them much faster than axis=0
+    distinct, first_index, inverse, counts = np.unique(
+        pix_x + 1j * pix_y, return_index=True, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+    if weights is not None:
+        counts = np.bincount(inverse, weights=weights, minlength=len(distinct))
+    points = np.column_stack((distinct.real, distinct.imag))
+    cells = np.floor(points / gridsize).astype(np.int64)
+    points_clusters = np.full(len(points), -1, dtype=np.int64)
+
+    centers = []
+    centers_pix = []
+    grid = {}
+    # duplicates of a point always end up in the cluster of its first occurrence,
+    # so going over the distinct points by first occurrence keeps the original order
+    remaining = np.argsort(first_index, kind="stable")
+    while len(remaining):
+        block, remaining = remaining[:block_size], remaining[block_size:]
+        for point_idx, point_pix, (cell_x, cell_y) in zip(
+            block.tolist(), points[block].tolist(), cells[block].tolist()
+        ):
+            assigned = None
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for cidx in grid.get((cell_x + dx, cell_y + dy), ()):
+                        if (assigned is None or cidx < assigned) and in_cluster(
+                            centers_pix[cidx], gridsize, point_pix
+                        ):
+                            assigned = cidx
+            if assigned is None:
+                assigned = len(centers)
+                centers.append(int(first_index[point_idx]))
+                centers_pix.append(point_pix)
+                grid.setdefault((cell_x, cell_y), []).append(assigned)
+            points_clusters[point_idx] = assigned
+        if len(remaining):
+            first_center = _first_center_within(
+                points[remaining], cells[remaining], centers_pix, gridsize
+            )
+            matched = first_center != -1
+            points_clusters[remaining[matched]] = first_center[matched]
+            remaining = remaining[~matched]
+        block_size *= 2
+
+    sizes = np.bincount(points_clusters, weights=counts, minlength=len(centers))
+    clusters = points_clusters[inverse].tolist()
+    return centers, clusters, sizes.astype(np.int64).tolist()
+
+
+def cluster_markers_grid(mercator, latlngs, zoom, gridsize=50, block_size=1024):
+    """
+    Near-linear equivalent of cluster_markers, see cluster_pixels_grid
+    Args & Returns: see cluster_markers
+    """
+    lats = np.fromiter((latlng.latitude for latlng in latlngs), dtype=float, count=len(latlngs))
+    lngs = np.fromiter((latlng.longitude for latlng in latlngs), dtype=float, count=len(latlngs))
+    pix_x, pix_y = latlngs_to_zoompixels(mercator, lats, lngs, zoom)
+    return cluster_pixels_grid(pix_x, pix_y, gridsize, block_size=block_size)
+
+
 def create_clusters_centers(markers, zoom, radius):
     mercator = globaltiles.GlobalMercator()
-    centers, clusters, sizes = cluster_markers(mercator, markers, zoom, radius)
+    centers, clusters, sizes = cluster_markers_grid(mercator, markers, zoom, radius)
     centers_markers = [markers[i] for i in centers]
     return centers_markers, clusters, sizes
 
@@ -114,6 +245,21 @@ def calculate_clusters(markers, zoom, radius=50):
     return json_clusts
 
 
+def calculate_weighted_clusters(lats, lngs, weights, zoom, radius=50):
+    """
+    calculate_clusters over points that stand for several markers each, e.g. precomputed clusters
+    Args:
+        lats, lngs, weights: numpy arrays, in clustering order
+    """
+    mercator = globaltiles.GlobalMercator()
+    pix_x, pix_y = latlngs_to_zoompixels(mercator, lats, lngs, zoom)
+    centers, _, sizes = cluster_pixels_grid(pix_x, pix_y, radius, weights)
+    return [
+        {"longitude": float(lngs[i]), "latitude": float(lats[i]), "size": size}
+        for i, size in zip(centers, sizes)
+    ]
+
+
 ##
 if __name__ == "__main__":
     ##
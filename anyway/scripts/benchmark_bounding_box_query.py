@@ -0,0 +1,127 @@
+"""
+Compare AccidentMarker.bounding_box_query to the compiled single statement of
+anyway.bounding_box_compiler, split into database time and python time (query building,
+SQL compilation and rows loading). Needs the DATABASE_URL of a loaded database.
+To run:
+python -m anyway.scripts.benchmark_bounding_box_query [--repeat 20]
+
+"""
+import argparse
+import datetime
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from anyway.app_and_db import db
+from anyway.bounding_box_compiler import query_markers_in_bounding_box
+from anyway.models import AccidentMarker
+
+BASE_KWARGS = {
+    "ne_lat": 32.10,
+    "ne_lng": 34.82,
+    "sw_lat": 32.04,
+    "sw_lng": 34.74,
+    "zoom": 16,
+    "start_date": datetime.date(2014, 1, 1),
+    "end_date": datetime.date(2020, 1, 1),
+    "show_markers": True,
+    "show_accidents": True,
+    "show_rsa": True,
+    "show_fatal": True,
+    "show_severe": True,
+    "show_light": True,
+    "approx": True,
+    "accurate": True,
+    "show_urban": 3,
+    "show_intersection": 3,
+    "show_lane": 3,
+    "show_day": 7,
+    "show_holiday": 0,
+    "show_time": 24,
+    "start_time": 25,
+    "end_time": 25,
+    "weather": 0,
+    "road": 0,
+    "separation": 0,
+    "surface": 0,
+    "acctype": 0,
+    "controlmeasure": 0,
+    "district": 0,
+    "case_type": 0,
+    "age_groups": "1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,99",
+    "page": 0,
+    "per_page": 0,
+}
+
+SCENARIOS = {
+    "default filters": {},
+    "severity and time": {"show_light": False, "show_time": 25, "show_day": 3},
+    "light transportation": {"age_groups": "2,3,4", "light_transportation": True},
+}
+
+
+@contextmanager
+def database_timer(timings):
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start_time"] = time.time()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        timings["db"] += time.time() - conn.info.pop("query_start_time")
+
+    engine = db.get_engine()
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+
+
+def run_bounding_box_query(kwargs):
+    result = AccidentMarker.bounding_box_query(is_thin=True, **kwargs)
+    return len(result.accident_markers.all()) + len(result.rsa_markers.all())
+
+
+def run_compiled(kwargs):
+    result = query_markers_in_bounding_box(is_thin=True, **kwargs)
+    return len(result.accident_markers) + len(result.rsa_markers)
+
+
+def measure(runner, kwargs, repeat):
+    timings = {"db": 0.0}
+    with database_timer(timings):
+        start = time.time()
+        for _ in range(repeat):
+            rows = runner(kwargs)
+            db.session.expunge_all()
+        total = time.time() - start
+    return rows, total / repeat, timings["db"] / repeat
+
+
+def main(repeat):
+    for name, scenario in SCENARIOS.items():
+        kwargs = dict(BASE_KWARGS, **scenario)
+        for runner in (run_bounding_box_query, run_compiled):
+            runner(kwargs)  # warm up caches
+            rows, total, db_time = measure(runner, kwargs, repeat)
+            print(
+                "{name} - {runner}: {rows} markers, total {total:.4f}s, "
+                "db {db:.4f}s, python {python:.4f}s".format(
+                    name=name,
+                    runner=runner.__name__,
+                    rows=rows,
+                    total=total,
+                    db=db_time,
+                    python=total - db_time,
+                )
+            )
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,65 @@
+"""
+Compare the per row create_marker of the CBS importer to the columnar create_markers on the
+accidents of a CBS files directory, e.g. a full year, and check they produce the same markers.
+Doesn't need a database.
+To run:
+python -m anyway.scripts.benchmark_cbs_import [--directory static/data/cbs/accidents_type_1/H20141041]
+
+"""
+import argparse
+import math
+import time
+
+from anyway.parsers.cbs.executor import (
+    ACCIDENTS,
+    NON_URBAN_INTERSECTION,
+    ROADS,
+    STREETS,
+    create_marker,
+    create_markers,
+    get_files,
+)
+
+
+def same_value(value, other):
+    if isinstance(value, float) and isinstance(other, float):
+        if math.isnan(value) and math.isnan(other):
+            return True
+    return type(value) is type(other) and value == other
+
+
+def main(directory):
+    files = get_files(directory)
+    accidents = files[ACCIDENTS]
+    args = files[STREETS], files[ROADS], files[NON_URBAN_INTERSECTION]
+
+    start = time.time()
+    rows_markers = [create_marker(accident, *args) for _, accident in accidents.iterrows()]
+    rows_time = time.time() - start
+
+    start = time.time()
+    columns_markers = create_markers(accidents, *args)
+    columns_time = time.time() - start
+
+    mismatches = sum(
+        not same_value(marker[field], other[field])
+        for marker, other in zip(rows_markers, columns_markers)
+        for field in marker
+    )
+    print(
+        "{count} accidents - create_marker: {rows:.2f}s, create_markers: {columns:.2f}s "
+        "({speedup:.1f}x), {mismatches} mismatching values".format(
+            count=len(accidents),
+            rows=rows_time,
+            columns=columns_time,
+            speedup=rows_time / columns_time,
+            mismatches=mismatches,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", default="static/data/cbs/accidents_type_1/H20141041")
+    args = parser.parse_args()
+    main(args.directory)
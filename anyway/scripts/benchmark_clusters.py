@@ -0,0 +1,76 @@
+"""
+Compare the clustering engines of pymapcluster on synthetic markers spread over Israel.
+To run:
+python -m anyway.scripts.benchmark_clusters [--sizes 100000 1000000] [--zoom 8] [--skip_old_above 100000]
+
+"""
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from anyway import globalmaptiles as globaltiles
+from anyway.pymapcluster import cluster_markers, cluster_markers_grid
+
+ISRAEL_LAT_RANGE = (29.5, 33.3)
+ISRAEL_LNG_RANGE = (34.25, 35.9)
+
+LatLng = namedtuple("LatLng", ["latitude", "longitude"])
+
+
+def synthetic_markers(size, seed=0):
+    # accidents concentrate around cities, so draw most points around a few centers
+    # and round to ~10m as CBS coordinates are, which also produces duplicates
+    rng = np.random.default_rng(seed)
+    cities = np.column_stack(
+        (rng.uniform(*ISRAEL_LAT_RANGE, 30), rng.uniform(*ISRAEL_LNG_RANGE, 30))
+    )
+    urban = int(size * 0.8)
+    around = cities[rng.integers(0, len(cities), urban)] + rng.normal(0, 0.05, (urban, 2))
+    spread = np.column_stack(
+        (
+            rng.uniform(*ISRAEL_LAT_RANGE, size - urban),
+            rng.uniform(*ISRAEL_LNG_RANGE, size - urban),
+        )
+    )
+    points = np.round(np.concatenate((around, spread)), 4)
+    rng.shuffle(points)
+    return [LatLng(lat, lng) for lat, lng in points.tolist()]
+
+
+def run(engine, markers, zoom, radius):
+    mercator = globaltiles.GlobalMercator()
+    start = time.time()
+    result = engine(mercator, markers, zoom, radius)
+    return time.time() - start, result
+
+
+def main(sizes, zoom, radius, skip_old_above):
+    for size in sizes:
+        markers = synthetic_markers(size)
+        new_time, new_result = run(cluster_markers_grid, markers, zoom, radius)
+        line = "{size} markers, zoom {zoom}: grid engine {new:.3f}s ({clusters} clusters)".format(
+            size=size, zoom=zoom, new=new_time, clusters=len(new_result[0])
+        )
+        if size <= skip_old_above:
+            old_time, old_result = run(cluster_markers, markers, zoom, radius)
+            line += ", old engine {old:.3f}s, x{speedup:.1f}, identical: {same}".format(
+                old=old_time, speedup=old_time / new_time, same=old_result == new_result
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100000, 1000000])
+    parser.add_argument("--zoom", type=int, default=8)
+    parser.add_argument("--radius", type=int, default=50, help="cluster radius in pixels")
+    parser.add_argument(
+        "--skip_old_above",
+        type=int,
+        default=100000,
+        help="don't run the quadratic engine on more markers than this",
+    )
+    args = parser.parse_args()
+    main(args.sizes, args.zoom, args.radius, args.skip_old_above)
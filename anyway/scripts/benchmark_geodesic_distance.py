@@ -0,0 +1,74 @@
+"""
+Compare ranking the markers of a geohash bucket by Geodesic.Inverse through DataFrame.apply, as
+get_db_matching_location did for each news flash, to nearest_geodesic, on random locations in the
+precision 4 geohash bucket of Tel Aviv.
+To run:
+python -m anyway.scripts.benchmark_geodesic_distance [--bucket-size 5000] [--flashes 100]
+
+"""
+import argparse
+import time
+
+import geohash  # python-geohash package
+import numpy as np
+import pandas as pd
+from geographiclib.geodesic import Geodesic
+
+from anyway.utilities import nearest_geodesic
+
+TEL_AVIV = (32.0853, 34.7818)
+
+
+def random_locations(size, rng):
+    latitude, longitude, latitude_error, longitude_error = geohash.decode_exactly(
+        geohash.encode(*TEL_AVIV, precision=4)
+    )
+    latitudes = rng.uniform(latitude - latitude_error, latitude + latitude_error, size)
+    longitudes = rng.uniform(longitude - longitude_error, longitude + longitude_error, size)
+    return latitudes, longitudes
+
+
+def apply_geodesic(markers, latitude, longitude):
+    geod = Geodesic.WGS84
+    distances = markers.apply(
+        lambda x: geod.Inverse(latitude, longitude, x["latitude"], x["longitude"])["s12"], axis=1
+    )
+    return int(np.argmin(distances.to_numpy())), distances.min()
+
+
+def measure(name, flashes, func):
+    start = time.time()
+    result = func()
+    total = time.time() - start
+    print(
+        "{name}: {total:.4f}s, {per_flash:.3f}ms per flash".format(
+            name=name, total=total, per_flash=total / flashes * 1e3
+        )
+    )
+    return result
+
+
+def main(bucket_size, flashes):
+    rng = np.random.default_rng(0)
+    latitudes, longitudes = random_locations(bucket_size, rng)
+    markers = pd.DataFrame({"latitude": latitudes, "longitude": longitudes})
+    locations = list(zip(*random_locations(flashes, rng)))
+    expected = measure(
+        "DataFrame.apply",
+        flashes,
+        lambda: [apply_geodesic(markers, *location) for location in locations],
+    )
+    nearest = measure(
+        "nearest_geodesic",
+        flashes,
+        lambda: [nearest_geodesic(*location, latitudes, longitudes) for location in locations],
+    )
+    assert nearest == expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bucket-size", type=int, default=5000)
+    parser.add_argument("--flashes", type=int, default=100)
+    args = parser.parse_args()
+    main(args.bucket_size, args.flashes)
@@ -0,0 +1,63 @@
+"""
+Compare the per point ItmToWGS84.convert to the array convert_many, and to CachedItmToWGS84.convert
+when the coordinates repeat, on random ITM coordinates in Israel.
+To run:
+python -m anyway.scripts.benchmark_itm_projection [--size 100000] [--distinct 10000]
+
+"""
+import argparse
+import time
+
+import numpy as np
+
+from anyway.utilities import CachedItmToWGS84, ItmToWGS84
+
+ISRAEL_ITM_X_RANGE = (120000, 280000)
+ISRAEL_ITM_Y_RANGE = (380000, 800000)
+
+
+def random_coordinates(size, distinct, seed=0):
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(*ISRAEL_ITM_X_RANGE, distinct).round()
+    ys = rng.uniform(*ISRAEL_ITM_Y_RANGE, distinct).round()
+    indices = rng.integers(0, distinct, size)
+    return xs[indices], ys[indices]
+
+
+def measure(name, size, func):
+    start = time.time()
+    result = func()
+    total = time.time() - start
+    print(
+        "{name}: {total:.4f}s, {per_point:.3f}us per point".format(
+            name=name, total=total, per_point=total / size * 1e6
+        )
+    )
+    return result
+
+
+def main(size, distinct):
+    xs, ys = random_coordinates(size, distinct)
+    converter = ItmToWGS84()
+    points = measure(
+        "convert", size, lambda: [converter.convert(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    )
+    cached_converter = CachedItmToWGS84()
+    cached_points = measure(
+        "cached convert",
+        size,
+        lambda: [cached_converter.convert(x, y) for x, y in zip(xs.tolist(), ys.tolist())],
+    )
+    longitudes, latitudes = measure("convert_many", size, lambda: converter.convert_many(xs, ys))
+    assert cached_points == points
+    expected_longitudes, expected_latitudes = np.array(points).T
+    assert np.allclose(longitudes, expected_longitudes, rtol=0, atol=1e-9)
+    assert np.allclose(latitudes, expected_latitudes, rtol=0, atol=1e-9)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--distinct", type=int, default=10000)
+    args = parser.parse_args()
+    main(args.size, args.distinct)
@@ -6,9 +6,11 @@ import sys
 import threading
 from csv import DictReader
 from datetime import datetime
-from functools import partial
+from functools import lru_cache, partial
 
+import numpy as np
 from dateutil.relativedelta import relativedelta
+from geographiclib.geodesic import Geodesic
 from flask import Flask
 from pyproj import Transformer
 
@@ -130,6 +132,83 @@ class ItmToWGS84(object):
         longitude, latitude = self.transformer.transform(x, y)
         return longitude, latitude
 
+    def convert_many(self, xs, ys):
+        """
+        converts arrays of ITM coordinates to WGS84 coordinates in a single transformation
+        :rtype: tuple
+        :return: (longitudes,latitudes) arrays
+        """
+        longitudes, latitudes = self.transformer.transform(
+            np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        )
+        return np.asarray(longitudes), np.asarray(latitudes)
+
+
+class CachedItmToWGS84(ItmToWGS84):
+    """
+    ItmToWGS84 that remembers the last maxsize coordinates convert was called with, for sources
+    that convert the same coordinates point by point again and again. Arrays are better converted
+    by convert_many, which is faster than looking each point up.
+    """
+
+    def __init__(self, maxsize=100000):
+        super().__init__()
+        self.convert = lru_cache(maxsize=maxsize)(self.convert)
+
+
+MEAN_EARTH_RADIUS = 6371008.8  # meters
+# the haversine distance on a sphere of the mean earth radius is within 0.6% of the WGS84
+# geodesic distance, the margin is wider to be safe
+HAVERSINE_RELATIVE_ERROR = 0.01
+
+
+def haversine_distances(latitude, longitude, latitudes, longitudes):
+    """
+    :return: array of the great circle distances in meters from latitude and longitude to each of
+             latitudes and longitudes, on a sphere of the mean earth radius
+    """
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    a = (
+        np.sin((latitudes - latitude) / 2) ** 2
+        + np.cos(latitude) * np.cos(latitudes) * np.sin((longitudes - longitude) / 2) ** 2
+    )
+    return 2 * MEAN_EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def nearest_geodesic(latitude, longitude, latitudes, longitudes, k=8):
+    """
+    Finds the point nearest to latitude and longitude by WGS84 geodesic distance, measuring it
+    exactly only for the k points nearest by haversine_distances, and for the points their error
+    bound can't rule out.
+    :return: (index, distance) of the nearest point, the first one of equally near points, or
+             (None, None) if no point has coordinates
+    """
+    approximate = haversine_distances(latitude, longitude, latitudes, longitudes)
+    valid = np.flatnonzero(~np.isnan(approximate))
+    if not len(valid):
+        return None, None
+    if len(valid) > k:
+        nearest = valid[np.argpartition(approximate[valid], k - 1)[:k]]
+    else:
+        nearest = valid
+    geod = Geodesic.WGS84
+    distances = {}
+
+    def measure(indexes):
+        for index in indexes.tolist():
+            if index not in distances:
+                distances[index] = geod.Inverse(
+                    latitude, longitude, latitudes[index], longitudes[index]
+                )["s12"]
+
+    measure(nearest)
+    bound = min(distances.values()) / (1 - HAVERSINE_RELATIVE_ERROR)
+    measure(valid[approximate[valid] <= bound])
+    index = min(distances, key=lambda i: (distances[i], i))
+    return index, distances[index]
+
 
 def time_delta(since):
     delta = relativedelta(datetime.now(), since)
@@ -0,0 +1,62 @@
+import logging
+import time
+
+from sqlalchemy import func, literal_column
+
+from anyway import globalmaptiles as globaltiles
+from anyway.models import AccidentMarker
+from anyway.app_and_db import db
+
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
+MVT_EXTENT = 4096
+WEB_MERCATOR_SRID = 3857
+
+
+def get_tile_bounding_box(z, x, y):
+    """
+    :return: the bounding box args of AccidentMarker.bounding_box_query for the google tile z/x/y
+    """
+    mercator = globaltiles.GlobalMercator()
+    tx, ty = mercator.GoogleTile(x, y, z)  # the conversion is symmetric, back to TMS
+    min_lat, min_lng, max_lat, max_lng = mercator.TileLatLonBounds(tx, ty, z)
+    return {"sw_lat": min_lat, "sw_lng": min_lng, "ne_lat": max_lat, "ne_lng": max_lng}
+
+
+def get_tile_layer(query, layer_name, envelope):
+    columns = query.with_entities(
+        AccidentMarker.id,
+        AccidentMarker.provider_code,
+        AccidentMarker.accident_year,
+        AccidentMarker.accident_severity,
+        AccidentMarker.location_accuracy,
+        func.to_char(AccidentMarker.created, 'YYYY-MM-DD"T"HH24:MI:SS').label("created"),
+        func.ST_AsMVTGeom(
+            func.ST_Transform(AccidentMarker.geom, WEB_MERCATOR_SRID), envelope, MVT_EXTENT
+        ).label("geom"),
+    ).subquery("tile")
+    layer = (
+        db.session.query(func.ST_AsMVT(literal_column("tile"), layer_name, MVT_EXTENT, "geom"))
+        .select_from(columns)
+        .scalar()
+    )
+    return bytes(layer) if layer else b""
+
+
+def retrieve_markers_tile(z, x, y, **kwargs):
+    """
+    Encodes the markers of the google tile z/x/y that match the /markers filters in kwargs as
+    a Mapbox Vector Tile, with an "accidents" and an "rsa" layer.
+    """
+    start_time = time.time()
+    kwargs.update(get_tile_bounding_box(z, x, y))
+    kwargs["zoom"] = z
+    result = AccidentMarker.bounding_box_query(is_thin=False, **kwargs)
+    mercator = globaltiles.GlobalMercator()
+    tx, ty = mercator.GoogleTile(x, y, z)
+    envelope = func.ST_MakeEnvelope(*mercator.TileBounds(tx, ty, z), WEB_MERCATOR_SRID)
+    # MVT layers are independent, so a tile of several layers is their concatenation
+    tile = get_tile_layer(result.accident_markers, "accidents", envelope) + get_tile_layer(
+        result.rsa_markers, "rsa", envelope
+    )
+    logging.debug("encoding tile %d/%d/%d took %f seconds" % (z, x, y, time.time() - start_time))
+    return tile
@@ -55,14 +55,21 @@ def update_news_flash():
 @update_news_flash.command()
 @click.option("--source", default="", type=str)
 @click.option("--news_flash_id", default="", type=str)
-def update(source, news_flash_id):
+@click.option("--batch_size", type=int, default=1000)
+@click.option("--workers", type=int, default=1, help="number of batches updated concurrently")
+@click.option(
+    "--resume", is_flag=True, default=False, help="continue the last update that didn't finish"
+)
+def update(source, news_flash_id, batch_size, workers, resume):
     from anyway.parsers import news_flash
 
     if not source:
         source = None
     if not news_flash_id:
         news_flash_id = None
-    return news_flash.update_all_in_db(source, news_flash_id)
+    return news_flash.update_all_in_db(
+        source, news_flash_id, batch_size=batch_size, workers=workers, resume=resume
+    )
 
 
 @update_news_flash.command()
@@ -89,6 +96,7 @@ def process():
 @click.option("--password", default="")
 @click.option("--email_search_start_date", type=str, default="")  # format - DD.MM.YYYY
 @click.option("--from_s3", is_flag=True, default=False)
+@click.option("--workers", type=int, default=1, help="number of directories imported concurrently")
 def cbs(
     specific_folder,
     delete_all,
@@ -100,7 +108,8 @@ def cbs(
     username,
     password,
     email_search_start_date,
-    from_s3
+    from_s3,
+    workers,
 ):
     from anyway.parsers.cbs.executor import main
 
@@ -115,7 +124,8 @@ def cbs(
         username=username,
         password=password,
         email_search_start_date=email_search_start_date,
-        from_s3=from_s3
+        from_s3=from_s3,
+        workers=workers,
     )
 
 
@@ -251,10 +261,27 @@ def embedded_reports(filename):
               help='Recalculates the cache (default is False)', default=False)
 @click.option('--no_info', 'info', is_flag=True,
               help='Prints info on cache (default is True)', default=True)
-def infographics_data_cache(info, update):
+@click.option('--workers', type=int, default=1,
+              help='Number of processes recalculating the cache (default is 1)')
+@click.option('--incremental', is_flag=True, default=False,
+              help='Recalculates only the items whose news flash or accidents data changed')
+def infographics_data_cache(info, update, workers, incremental):
     """Will refresh the infographics data cache"""
     from anyway.parsers.infographics_data_cache_updater import main
-    return main(update=update, info=info)
+    return main(update=update, info=info, workers=workers, incremental=incremental)
+
+
+@process.command()
+@click.option("--min_zoom", type=int, default=0)
+@click.option("--max_zoom", type=int, default=None, help="Defaults to the last clusters zoom level")
+def clusters_pyramid(min_zoom, max_zoom):
+    """Will rebuild the precomputed /clusters pyramid, cbs import rebuilds the years it changes"""
+    from anyway.constants import CONST
+    from anyway.parsers.clusters_pyramid import main
+
+    if max_zoom is None:
+        max_zoom = CONST.MINIMAL_ZOOM - 1
+    return main(min_zoom=min_zoom, max_zoom=max_zoom)
 
 
 @cli.group()
@@ -2,6 +2,7 @@ import datetime
 
 import pytest
 
+from anyway.bounding_box_compiler import query_markers_in_bounding_box
 from anyway.models import AccidentMarker  # for AccidentMarker.bounding_box_query
 
 
@@ -103,3 +104,25 @@ def test_light_severity_filter(base_kwargs):
     accident_markers = result.accident_markers
     for marker in accident_markers:
         assert marker.accident_severity != 3
+
+
+@pytest.mark.partial_db
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"show_rsa": True, "show_light": False},
+        {"approx": False, "show_time": 25, "show_day": 3},
+        {"show_urban": 2, "show_intersection": 1},
+        {"age_groups": "2,3,4", "light_transportation": True},
+    ],
+)
+def test_compiled_query_matches_bounding_box_query(base_kwargs, filters):
+    base_kwargs["age_groups"] = "1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,99"
+    base_kwargs.update(filters)
+    result = AccidentMarker.bounding_box_query(**base_kwargs)
+    compiled = query_markers_in_bounding_box(**base_kwargs)
+    assert sorted(m.id for m in compiled.accident_markers) == sorted(
+        m.id for m in result.accident_markers
+    )
+    assert sorted(m.id for m in compiled.rsa_markers) == sorted(m.id for m in result.rsa_markers)
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 # from anyway.utilities import open_utf8
+import csv
+import gzip
 import json
 from collections import Counter
 from functools import partial
+from io import StringIO
 
 import pytest
 from http import client as http_client
 from urlobject import URLObject
 
 from anyway.app_and_db import app as flask_app
+from anyway.backend_constants import BE_CONST
 
 
 @pytest.fixture
@@ -110,3 +114,34 @@ def test_markers(
         assert show_light or marker["accident_severity"] != 3
         assert show_accurate or marker["location_accuracy"] != 1
         assert show_approx or marker["location_accuracy"] == 1
+
+
+@pytest.mark.server
+def test_markers_tile(app):
+    rv = app.get(
+        "/tiles/16/39100/26597.mvt?start_date=1104537600&end_date=1484697600&show_fatal=1&show_severe=1&show_light=1&approx=1&accurate=1&show_markers=1&show_accidents=1&show_rsa=1&show_urban=3&show_intersection=3&show_lane=3&show_day=7&show_holiday=0&show_time=24&start_time=25&end_time=25&weather=0&road=0&separation=0&surface=0&acctype=0&controlmeasure=0&district=0&case_type=0"
+    )
+    assert rv.status_code == http_client.OK
+    assert rv.headers["Content-Type"] == "application/vnd.mapbox-vector-tile"
+    assert "max-age" in rv.headers["Cache-Control"]
+
+
+@pytest.mark.server
+def test_markers_tile_bad_date(app):
+    rv = app.get("/tiles/16/39100/26597.mvt?start_date=a1104537600&end_date=1484697600")
+    assert rv.status_code == http_client.BAD_REQUEST
+
+
+@pytest.mark.partial_db
+def test_markers_csv_gzip(app):
+    rv = app.get(
+        "/markers?format=csv&ne_lat=32.085413468822&ne_lng=34.797736215591385&sw_lat=32.07001357040486&sw_lng=34.775548982620194&zoom=16&start_date=1104537600&end_date=1484697600&show_fatal=1&show_severe=1&show_light=1&approx=1&accurate=1&show_markers=1&show_accidents=1&show_rsa=1&show_discussions=1&show_urban=3&show_intersection=3&show_lane=3&show_day=7&show_holiday=0&show_time=24&start_time=25&end_time=25&weather=0&road=0&separation=0&surface=0&acctype=0&controlmeasure=0&district=0&case_type=0",
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert rv.status_code == http_client.OK
+    assert rv.headers["Content-Type"].startswith("text/csv")
+    assert rv.headers["Content-Encoding"] == "gzip"
+
+    rows = list(csv.DictReader(StringIO(gzip.decompress(rv.data).decode("utf-8"))))
+    assert rows
+    assert all(row["provider_code"] != str(BE_CONST.RSA_PROVIDER_CODE) for row in rows)
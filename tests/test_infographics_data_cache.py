@@ -1,10 +1,20 @@
+import json
 import unittest
 from unittest import TestCase
 from unittest.mock import Mock, patch
+
+from sqlalchemy.dialects import postgresql
+
 from anyway.infographics_utils import get_infographics_data
 from anyway.models import NewsFlash
 from anyway.constants import CONST
-from anyway.parsers.infographics_data_cache_updater import add_news_flash_to_cache
+from anyway.parsers.infographics_data_cache_updater import (
+    add_news_flash_to_cache,
+    build_cache_into_temp,
+    bump_accidents_data_versions,
+    get_accidents_data_versions,
+    get_source_hash,
+)
 import anyway.parsers.infographics_data_cache_updater
 
 
@@ -61,6 +71,8 @@ class Test_infographics_data_from_cache(TestCase):
             self.assertEqual(invocations[i][0][0], 17, "incorrect news flash id")
             self.assertEqual(invocations[i][0][1], CONST.INFOGRAPHICS_CACHE_YEARS_AGO[i])
         assert res, "Should return True when no error occurred"
+        (_, items), _ = get_engine.return_value.execute.call_args
+        self.assertEqual([item["source_hash"] for item in items], [None] * len(items))
 
     @patch("anyway.parsers.infographics_data_cache_updater.db.get_engine")
     @patch("anyway.infographics_utils.create_infographics_data")
@@ -71,5 +83,137 @@ class Test_infographics_data_from_cache(TestCase):
         assert not res, "Should return False when error occurred"
 
 
+def create_news_flash(news_flash_id, road1):
+    return NewsFlash(
+        id=news_flash_id,
+        accident=True,
+        resolution="כביש בינעירוני",
+        road1=road1,
+        road_segment_name="name",
+    )
+
+
+def fake_create_infographics_data(news_flash_id, years_ago):
+    return {"news_flash_id": news_flash_id, "years_ago": years_ago}
+
+
+class Test_build_cache_into_temp(TestCase):
+    def setUp(self):
+        self.news_flashes = [create_news_flash(1, 1.0), create_news_flash(2, 1.0)]
+        self.news_flashes.append(create_news_flash(3, 90.0))
+        self.versions = {"cbs_2019": 1, "cbs_2020": 2, "road_segments": 1}
+        self.cached = {}
+        self.copied = []
+        self.inserted = []
+        updater = "anyway.parsers.infographics_data_cache_updater"
+        patchers = [
+            patch(f"{updater}.db"),
+            patch(f"{updater}.clear_temp"),
+            patch(
+                f"{updater}.get_cache_eligible_news_flashes_query",
+                return_value=Mock(all=Mock(return_value=self.news_flashes)),
+            ),
+            patch(
+                f"{updater}.get_accidents_data_versions", side_effect=lambda: dict(self.versions),
+            ),
+            patch(f"{updater}.get_cached_source_hashes", side_effect=lambda: dict(self.cached)),
+            patch(f"{updater}.copy_cache_items_into_temp", side_effect=self.copied.extend),
+            patch(f"{updater}.insert_into_temp", side_effect=self.inserted.extend),
+            patch(
+                "anyway.infographics_utils.create_infographics_data", fake_create_infographics_data
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build(self, **kwargs):
+        self.copied.clear()
+        self.inserted.clear()
+        build_cache_into_temp(**kwargs)
+        return sorted((item["news_flash_id"], item["years_ago"]) for item in self.inserted)
+
+    def cache_inserted(self):
+        self.cached = {
+            (item["news_flash_id"], item["years_ago"]): item["source_hash"]
+            for item in self.inserted
+        }
+
+    def all_keys(self, *news_flash_ids):
+        return [(i, y) for i in news_flash_ids for y in CONST.INFOGRAPHICS_CACHE_YEARS_AGO]
+
+    def test_full(self):
+        self.assertEqual(self.build(), self.all_keys(1, 2, 3))
+        self.assertEqual(self.copied, [])
+        for item in self.inserted:
+            self.assertEqual(item["data"]["news_flash_id"], item["news_flash_id"])
+        news_flash = self.news_flashes[2]
+        self.assertEqual(
+            [item["source_hash"] for item in self.inserted if item["news_flash_id"] == 3],
+            [
+                get_source_hash(news_flash, y, json.dumps(self.versions, sort_keys=True))
+                for y in CONST.INFOGRAPHICS_CACHE_YEARS_AGO
+            ],
+        )
+
+    def test_incremental(self):
+        self.build()
+        self.cache_inserted()
+        self.assertEqual(self.build(incremental=True), [])
+        self.assertEqual(sorted(self.copied), self.all_keys(1, 2, 3))
+
+        self.cached[(2, 1)] = "stale"
+        # added by add_news_flash_to_cache
+        self.cached[(3, 5)] = None
+        self.cached[(9, 1)] = "of a news flash that is no longer eligible"
+        self.assertEqual(self.build(incremental=True), [(2, 1), (3, 5)])
+        self.assertNotIn((9, 1), self.copied)
+        self.assertEqual(len(self.copied), 10)
+
+    def test_not_incremental(self):
+        self.build()
+        self.cache_inserted()
+        self.assertEqual(self.build(), self.all_keys(1, 2, 3))
+
+    def test_data_changed(self):
+        self.build()
+        self.cache_inserted()
+        self.news_flashes[0].title = "edited"
+        self.assertEqual(self.build(incremental=True), self.all_keys(1))
+        self.cache_inserted()
+        self.versions["cbs_2020"] += 1
+        self.assertEqual(self.build(incremental=True), self.all_keys(1, 2, 3))
+
+    def test_workers(self):
+        self.assertEqual(self.build(workers=2), self.all_keys(1, 2, 3))
+        hashes = sorted(item["source_hash"] for item in self.inserted)
+        self.build(workers=1)
+        self.assertEqual(sorted(item["source_hash"] for item in self.inserted), hashes)
+
+
+class Test_accidents_data_versions(TestCase):
+    def setUp(self):
+        patcher = patch("anyway.parsers.infographics_data_cache_updater.db")
+        self.db = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get(self):
+        self.db.session.query.return_value = [("cbs_2019", 3), ("road_segments", 1)]
+        self.assertEqual(get_accidents_data_versions(), {"cbs_2019": 3, "road_segments": 1})
+
+    def test_bump(self):
+        bump_accidents_data_versions({"cbs_2019", "cbs_2020"})
+        (statement, rows), _ = self.db.session.execute.call_args
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        self.assertIn("ON CONFLICT (source) DO UPDATE", sql)
+        self.assertIn("version = (accidents_data_versions.version + %(version_1)s)", sql)
+        self.assertEqual(sorted(row["source"] for row in rows), ["cbs_2019", "cbs_2020"])
+        self.db.session.commit.assert_called_once_with()
+
+    def test_bump_nothing(self):
+        bump_accidents_data_versions(set())
+        self.db.session.execute.assert_not_called()
+
+
 if __name__ == "__main__":
     unittest.main()
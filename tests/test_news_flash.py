@@ -108,6 +108,21 @@ def test_scrape_ynet():
     verify_cache(items_actual)
 
 
+def test_scrape_walla_since_latest_date():
+    fetched_links = []
+
+    def fetch_html(link):
+        fetched_links.append(link)
+        return fetch_html_walla(link)
+
+    latest_date = datetime.datetime(2020, 5, 23, tzinfo=timezones.ISREAL_SUMMER_TIMEZONE)
+    items_actual = list(
+        rss_sites.scrape("walla", latest_date, fetch_rss=fetch_rss_walla, fetch_html=fetch_html)
+    )
+    assert [item.link for item in items_actual] == ["https://news.walla.co.il/break/3362504"]
+    assert fetched_links == ["https://news.walla.co.il/break/3362504"]
+
+
 def test_sanity_get_latest_date():
     db = init_db()
     db.get_latest_date_of_source("ynet")
@@ -0,0 +1,113 @@
+import datetime
+import unittest
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from anyway.backend_constants import BE_CONST
+from anyway.bounding_box_compiler import get_markers_filter, get_markers_queries
+from anyway.models import MARKER_FIELDS, AccidentMarker
+
+BASE_KWARGS = {
+    "show_markers": True,
+    "show_accidents": True,
+    "show_rsa": False,
+    "approx": True,
+    "accurate": True,
+    "sw_lat": 32.067363446951944,
+    "sw_lng": 34.78877537033077,
+    "ne_lat": 32.072427482938345,
+    "ne_lng": 34.79928962966915,
+    "start_date": datetime.date(2014, 1, 1),
+    "end_date": datetime.date(2016, 1, 1),
+    "age_groups": "1,2,3",
+}
+
+
+def compile_markers_queries(is_thin=False, as_columns=False, **kwargs):
+    # builds the baked queries, without running them
+    return [
+        query._as_query().statement.compile(dialect=postgresql.dialect())
+        for query in get_markers_queries(is_thin, as_columns, **{**BASE_KWARGS, **kwargs})
+    ]
+
+
+def compile_markers_query(is_thin=False, as_columns=False, **kwargs):
+    (compiled,) = compile_markers_queries(is_thin, as_columns, **kwargs)
+    return compiled
+
+
+class MarkersQueryTest(unittest.TestCase):
+    filters = [
+        {},
+        {"show_rsa": True},
+        {"show_fatal": False, "show_urban": 2, "show_intersection": 1, "show_lane": 2},
+        {"show_time": 6, "show_day": 3, "weather": 2, "district": 11},
+        {"show_time": 25, "acctype": 21, "accurate": False},
+        {"light_transportation": True},
+    ]
+
+    def test_builds_query(self):
+        for filters in self.filters:
+            _, params = get_markers_filter({**BASE_KWARGS, **filters})
+            for is_thin in (False, True):
+                for as_columns in (False, True):
+                    compiled = compile_markers_query(is_thin, as_columns, **filters)
+                    self.assertIn("is_rsa", str(compiled), filters)
+                    self.assertLessEqual(
+                        {*params, "polygon", "start_date", "end_date"},
+                        set(compiled.params),
+                        filters,
+                    )
+
+    def test_paginated(self):
+        accidents, rsa = compile_markers_queries(show_rsa=True, page=2, per_page=10)
+        self.assertIn("LIMIT", str(accidents))
+        self.assertEqual(accidents.params["param_1"], 10)
+        self.assertNotIn("LIMIT", str(rsa))
+
+    def test_shape_cached(self):
+        compiled = compile_markers_query(show_time=6, weather=2)
+        other_values = compile_markers_query(
+            show_time=12, weather=3, start_date=datetime.date(2015, 1, 1)
+        )
+        self.assertEqual(str(compiled), str(other_values))
+        self.assertEqual(other_values.params["start_hour"], 12)
+        self.assertNotEqual(str(compiled), str(compile_markers_query(show_time=6)))
+        self.assertNotEqual(str(compiled), str(compile_markers_query(True, show_time=6, weather=2)))
+        self.assertNotEqual(
+            str(compiled), str(compile_markers_query(False, True, show_time=6, weather=2))
+        )
+
+
+class DescriptionColumnTest(unittest.TestCase):
+    def test_decoded_by_database(self):
+        compiled = str(compile_markers_query(False, True))
+        self.assertIn("CAST(markers.description AS JSON)", compiled)
+        self.assertIn("to_json(markers.description)", compiled)
+        for is_thin, as_columns in ((True, True), (False, False)):
+            self.assertNotIn("AS JSON", str(compile_markers_query(is_thin, as_columns)))
+
+    def test_serialize(self):
+        description = {"field": "value", "other": 2}
+        row = SimpleNamespace(
+            **{
+                **dict.fromkeys(MARKER_FIELDS),
+                "id": 1,
+                "provider_code": BE_CONST.CBS_ACCIDENT_TYPE_1_CODE,
+                "created": datetime.datetime(2015, 1, 1),
+                "description": description,
+            }
+        )
+        self.assertEqual(
+            AccidentMarker.serialize_fields(row)["description"].split("\n"),
+            [AccidentMarker.format_description(*item) for item in description.items()],
+        )
+        hatzala_row = SimpleNamespace(
+            **{**vars(row), "provider_code": BE_CONST.UNITED_HATZALA_CODE, "description": "text"}
+        )
+        self.assertEqual(AccidentMarker.serialize_fields(hatzala_row)["description"], "text")
+
+
+if __name__ == "__main__":
+    unittest.main()
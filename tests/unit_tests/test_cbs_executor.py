@@ -0,0 +1,421 @@
+import math
+import os
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+import pandas as pd
+
+from sqlalchemy.dialects import postgresql
+
+from anyway import field_names
+from anyway.parsers.cbs import executor
+from anyway.parsers.cbs.executor import (
+    ACCIDENTS,
+    INVOLVED,
+    NON_URBAN_INTERSECTION,
+    ROADS,
+    STREETS,
+    VEHICLES,
+    create_marker,
+    create_markers,
+    create_vehicles,
+    create_year_partitions,
+    delete_cbs_entries_from_email,
+    fill_dictionary_tables,
+    get_addresses,
+    get_files,
+    get_junction,
+    get_junctions,
+    get_street,
+    get_street_names,
+    get_streets_index,
+    import_directories,
+)
+
+CBS_DIRECTORY = "static/data/cbs/accidents_type_1/H20141041"
+
+
+class CreateMarkersTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        files = get_files(CBS_DIRECTORY)
+        cls.accidents = files[ACCIDENTS].head(1000).copy()
+        cls.args = files[STREETS], files[ROADS], files[NON_URBAN_INTERSECTION]
+
+    def assert_same_markers(self, accidents):
+        expected = [create_marker(accident, *self.args) for _, accident in accidents.iterrows()]
+        markers = create_markers(accidents, *self.args)
+        self.assertEqual(len(markers), len(expected))
+        for marker, expected_marker in zip(markers, expected):
+            self.assertEqual(marker.keys(), expected_marker.keys())
+            for field, value in expected_marker.items():
+                if isinstance(value, float) and math.isnan(value):
+                    self.assertTrue(math.isnan(marker[field]), field)
+                else:
+                    self.assertEqual(marker[field], value, field)
+                    self.assertIs(type(marker[field]), type(value), field)
+
+    def test_same_as_create_marker(self):
+        self.assert_same_markers(self.accidents)
+
+    def test_edge_values(self):
+        accidents = self.accidents.head(6).copy()
+        accidents.iloc[0, accidents.columns.get_loc(field_names.x)] = np.nan
+        accidents.iloc[1, accidents.columns.get_loc(field_names.y)] = 0
+        accidents.iloc[2, accidents.columns.get_loc(field_names.km)] = -12.5
+        accidents.iloc[3, accidents.columns.get_loc(field_names.km)] = 7
+        accidents.iloc[4, accidents.columns.get_loc(field_names.house_number)] = 9999
+        accidents.iloc[5, accidents.columns.get_loc(field_names.accident_hour)] = 96
+        self.assert_same_markers(accidents)
+
+    def test_missing_coordinates(self):
+        with self.assertRaises(ValueError):
+            create_markers(self.accidents.drop(columns=[field_names.x]), *self.args)
+
+    def test_empty(self):
+        self.assertEqual(create_markers(self.accidents.head(0), *self.args), [])
+
+
+def scan_street(yishuv_symbol, street_sign, streets):
+    # the lookup get_street did before the streets index
+    street_name = [
+        name
+        for settlement, sign, name in streets.itertuples(index=False)
+        if settlement == yishuv_symbol and sign == street_sign
+    ]
+    return street_name[0] if len(street_name) == 1 else ""
+
+
+class StreetsIndexTest(unittest.TestCase):
+    streets = pd.DataFrame(
+        {
+            field_names.settlement: [5000, 5000, 5000, 5000, 1],
+            field_names.street_sign: [1, 2, 3, 3, 1],
+            field_names.street_name: ["a", "b", "c", "d", "e"],
+        }
+    )
+    keys = [
+        (5000.0, 1.0),
+        (5000, 2),
+        (5000.0, 3.0),
+        (1.0, 2.0),
+        (2.0, 1.0),
+        (np.nan, 1.0),
+        (1.0, np.nan),
+    ]
+
+    def test_get_street(self):
+        streets = get_streets_index(self.streets)
+        for yishuv_symbol, street_sign in self.keys:
+            self.assertEqual(
+                get_street(yishuv_symbol, street_sign, streets),
+                scan_street(yishuv_symbol, street_sign, self.streets),
+            )
+
+    def test_get_street_names(self):
+        yishuv_symbols, street_signs = zip(*self.keys)
+        self.assertEqual(
+            get_street_names(yishuv_symbols, street_signs, get_streets_index(self.streets)),
+            [scan_street(*key, self.streets) for key in self.keys],
+        )
+        self.assertEqual(get_street_names([5000.0], [1.0], {}), [""])
+
+    def test_get_addresses(self):
+        streets = get_streets_index(self.streets)
+        yishuv_symbols = [1.0, 1.0, 1.0, 1.0]
+        street_signs = [1.0, 1.0, 1.0, 2.0]
+        house_numbers = [12.0, 9999.0, np.nan, 3.0]
+        self.assertEqual(
+            get_addresses(yishuv_symbols, street_signs, house_numbers, streets),
+            ["e 12", "e", "e", ""],
+        )
+
+
+class JunctionsTest(unittest.TestCase):
+    roads = {
+        (1, 0, 10): "a",
+        (1, 4, 30): "b",
+        (1, 5, 30): "c",
+        (1, 0, 50): "d",
+        (1, 6, 20): "e",
+        (2, 0, 15): "f",
+        (2, 1, 200000): "g",
+        (3, 0, np.nan): "h",
+        (4, 0, 5): "",
+    }
+
+    def assert_same_junctions(self, accidents, roads):
+        fields = (
+            field_names.road1,
+            field_names.road2,
+            field_names.km,
+            field_names.non_urban_intersection,
+        )
+        expected = [get_junction(dict(zip(fields, accident)), roads) for accident in accidents]
+        self.assertEqual(get_junctions(*zip(*accidents), roads), expected)
+
+    def test_nearest_junction(self):
+        accidents = [
+            (road1, None, km, None)
+            for road1 in (1, 1.0, 2, 3, 4, 5, np.nan)
+            for km in (-5, 0, 10, 15, 20.5, 25, 30, 40, 60, 1000, 150000, np.nan)
+        ]
+        self.assert_same_junctions(accidents, self.roads)
+
+    def test_exact_junction(self):
+        accidents = [
+            (1.0, 4.0, 30.0, 7.0),
+            (1.0, 4.0, 31.0, 7.0),
+            (4.0, 0.0, 5.0, 7.0),
+            (1.0, 4.0, None, 7.0),
+            (1.0, None, None, None),
+        ]
+        self.assert_same_junctions(accidents, self.roads)
+
+    def test_cbs_roads(self):
+        files = get_files(CBS_DIRECTORY)
+        roads, accidents = files[ROADS], files[ACCIDENTS].head(1000)
+        accidents = [
+            (road1, None, km, None)
+            for road1, km in zip(accidents[field_names.road1], accidents[field_names.km])
+        ]
+        self.assert_same_junctions(accidents, roads)
+
+
+class ChunkedFilesTest(unittest.TestCase):
+    def test_chunks_cover_files(self):
+        files = get_files(CBS_DIRECTORY)
+        chunked_files = get_files(CBS_DIRECTORY, chunksize=5000)
+        for name in (ACCIDENTS, INVOLVED, VEHICLES):
+            chunks = list(chunked_files[name])
+            self.assertTrue(all(len(chunk) <= 5000 for chunk in chunks), name)
+            self.assertEqual(len(chunks), math.ceil(len(files[name]) / 5000), name)
+            pd.testing.assert_frame_equal(
+                pd.concat(chunks), files[name], check_dtype=False, obj=name
+            )
+
+    def test_chunked_rows(self):
+        vehicles = get_files(CBS_DIRECTORY)[VEHICLES]
+        chunks = get_files(CBS_DIRECTORY, chunksize=5000)[VEHICLES]
+        chunked_rows = [row for chunk in chunks for row in create_vehicles(chunk)]
+        self.assertEqual(chunked_rows, create_vehicles(vehicles))
+
+
+def fake_import_to_datastore(directory, provider_code, year, batch_size):
+    # runs in the worker processes, which must not do the setup the directories share
+    assert os.getpid() != ImportDirectoriesTest.pid
+    if directory == "failing":
+        raise ValueError("Not parsable")
+    return year - 2000 + provider_code
+
+
+class ImportDirectoriesTest(unittest.TestCase):
+    pid = os.getpid()
+
+    def setUp(self):
+        patchers = [
+            patch.object(executor, "import_to_datastore", fake_import_to_datastore),
+            patch.object(executor, "create_provider_code_table"),
+            patch.object(executor, "create_year_partitions"),
+            patch.object(executor, "db", Mock()),
+            patch.dict(executor.failed_dirs, clear=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_workers(self):
+        directories = [("a", 1, 2014), ("b", 3, 2014), ("failing", 1, 2015)]
+        self.assertEqual(import_directories(directories, 5000, workers=2), 15 + 17)
+        self.assertEqual(list(executor.failed_dirs), ["failing"])
+        executor.create_provider_code_table.assert_called_once_with()
+        self.assertEqual(
+            [args for args, _ in executor.create_year_partitions.call_args_list], [(2014,), (2015,)]
+        )
+
+
+class FakeSession:
+    """
+    answers the catalog queries of create_year_partitions for tables with the partitions of
+    bounds, and records the statements executed
+    """
+
+    def __init__(self, relkind="p", bounds=None, in_default=False):
+        self.relkind = relkind
+        self.bounds = bounds or {}
+        self.in_default = in_default
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        if not isinstance(statement, str):
+            statement = str(statement.compile(dialect=postgresql.dialect()))
+        self.statements.append(statement)
+        if "relkind" in statement:
+            return Mock(scalar=Mock(return_value=self.relkind))
+        if "pg_inherits" in statement:
+            return Mock(fetchall=Mock(return_value=list(self.bounds.items())))
+        if "EXISTS" in statement:
+            return Mock(scalar=Mock(return_value=self.in_default))
+        return Mock(rowcount=1)
+
+    def commit(self):
+        pass
+
+    def created(self):
+        return [statement for statement in self.statements if statement.startswith("CREATE")]
+
+
+class PartitionsTest(unittest.TestCase):
+    def create_year_partitions(self, year, **kwargs):
+        session = FakeSession(**kwargs)
+        with patch.object(executor, "db", Mock(session=session)):
+            create_year_partitions(year)
+        return session
+
+    def test_unpartitioned(self):
+        self.assertEqual(self.create_year_partitions(2014, relkind="r").created(), [])
+
+    def test_creates_partitions(self):
+        session = self.create_year_partitions(
+            "2014", bounds={"markers_2013": "FOR VALUES IN (2013)", "markers_default": "DEFAULT"}
+        )
+        self.assertEqual(
+            session.created(),
+            [
+                f"CREATE TABLE {table}_2014 PARTITION OF {table} FOR VALUES IN (2014)"
+                for table in ("markers", "involved", "vehicles")
+            ],
+        )
+        self.assertIn(
+            "SELECT EXISTS (SELECT 1 FROM markers_default WHERE accident_year = :year)",
+            session.statements,
+        )
+
+    def test_without_default_partition(self):
+        session = self.create_year_partitions(2014, bounds={"markers_2013": "FOR VALUES IN (2013)"})
+        self.assertEqual(len(session.created()), 3)
+        self.assertFalse(any("EXISTS" in statement for statement in session.statements))
+
+    def test_existing_partitions(self):
+        session = self.create_year_partitions(
+            2014, bounds={"partition_of_2014": "FOR VALUES IN (2014)", "default": "DEFAULT"}
+        )
+        self.assertEqual(session.created(), [])
+
+    def test_year_in_default_partition(self):
+        session = self.create_year_partitions(
+            2014, bounds={"markers_default": "DEFAULT"}, in_default=True
+        )
+        self.assertEqual(session.created(), [])
+
+
+class DeleteMarkersTest(unittest.TestCase):
+    def test_deletes_by_accident_year(self):
+        session = FakeSession()
+        with patch.object(executor, "db", Mock(session=session)):
+            deleted = delete_cbs_entries_from_email(1, 2014)
+        self.assertEqual(list(deleted), ["involved", "vehicles", "markers"])
+        involved, vehicles, markers = session.statements
+        for table, statement in (("involved", involved), ("vehicles", vehicles)):
+            self.assertIn(f"DELETE FROM {table} USING markers", statement)
+            self.assertIn(f"{table}.provider_and_id = markers.provider_and_id", statement)
+            self.assertIn(f"{table}.accident_year = markers.accident_year", statement)
+            self.assertIn("markers.accident_year = %(accident_year_1)s", statement)
+        self.assertTrue(markers.startswith("DELETE FROM markers WHERE"))
+        self.assertIn("markers.accident_year = %(accident_year_1)s", markers)
+
+
+class FillDictionaryTablesTest(unittest.TestCase):
+    def test_one_transaction(self):
+        cbs_dictionary = {
+            1: {1: "unit 1", 2: "unit 2"},
+            2: {1: "urban"},
+            4: {1: "fatal", 2: float("nan")},
+            97: {1: "skipped"},
+        }
+        with patch.object(executor, "db", Mock()), patch.object(
+            executor.dictionary_cache, "invalidate"
+        ):
+            fill_dictionary_tables(cbs_dictionary, 1, 2014)
+            calls = [name for name, _, _ in executor.db.session.method_calls]
+        self.assertEqual(calls, ["execute", "execute", "execute", "commit"])
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.import_ui = Mock(source_path=Mock(return_value=CBS_DIRECTORY))
+        self.import_ui.is_delete_all.return_value = False
+        patchers = [
+            patch.object(executor, "ImporterUI", return_value=self.import_ui),
+            patch.object(executor, "import_directories", return_value=0),
+            patch.object(executor, "delete_cbs_entries"),
+            patch.object(executor, "truncate_tables"),
+            patch.object(executor, "create_views"),
+            patch.object(executor, "location_index"),
+            patch.object(executor, "news_flash_db_adapter"),
+            patch.object(executor, "clusters_pyramid"),
+            patch.object(
+                executor.infographics_data_cache_updater,
+                "get_accidents_data_versions",
+                return_value={"cbs_2010": 2, "road_segments": 1},
+            ),
+            patch.object(executor.infographics_data_cache_updater, "bump_accidents_data_versions"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def main(self, delete_all=False, delete_start_date=None):
+        self.import_ui.is_delete_all.return_value = delete_all
+        executor.main(
+            specific_folder=True,
+            delete_all=delete_all,
+            path=None,
+            batch_size=5000,
+            delete_start_date=delete_start_date,
+            load_start_year=2005,
+            from_email=False,
+        )
+        (changed_years,), _ = executor.clusters_pyramid.rebuild_years.call_args
+        return changed_years
+
+    def get_bumped_sources(self):
+        bump = executor.infographics_data_cache_updater.bump_accidents_data_versions
+        (sources,), _ = bump.call_args
+        return sources
+
+    def test_rebuilds_imported_years(self):
+        self.assertEqual(self.main(), {2014})
+        executor.import_directories.assert_called_once_with([(CBS_DIRECTORY, 1, 2014)], 5000, 1)
+        self.assertEqual(self.get_bumped_sources(), {"cbs_2014"})
+
+    def test_rebuilds_deleted_years(self):
+        changed_years = self.main(delete_start_date="2012-06-01")
+        self.assertEqual(changed_years, set(range(2012, datetime.now().year + 1)))
+        self.assertEqual(self.get_bumped_sources(), {f"cbs_{year}" for year in changed_years})
+
+    def test_rebuilds_all_years(self):
+        self.assertIsNone(self.main(delete_all=True))
+        self.assertEqual(self.get_bumped_sources(), {"cbs_2010", "cbs_2014"})
+
+    def test_rebuilds_after_failure(self):
+        executor.import_directories.side_effect = ValueError("Not parsable")
+        self.assertEqual(self.main(), {2014})
+        executor.location_index.build.assert_called_once_with(
+            executor.news_flash_db_adapter.init_db.return_value
+        )
+
+    def test_location_index_failure(self):
+        executor.location_index.build.side_effect = MemoryError
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertEqual(self.main(), {2014})
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("location index", logs.records[0].getMessage())
+        executor.create_views.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
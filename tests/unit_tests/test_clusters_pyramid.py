@@ -0,0 +1,317 @@
+import datetime
+import random
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, patch
+
+import pandas as pd
+from sqlalchemy.dialects import postgresql
+
+from anyway import clusters_calculator
+from anyway import globalmaptiles as globaltiles
+from anyway.backend_constants import BE_CONST
+from anyway.clusters_calculator import (
+    get_pyramid_markers_filter,
+    is_pyramid_query,
+    retrieve_clusters,
+    retrieve_clusters_from_pyramid,
+)
+from anyway.constants import CONST
+from anyway.parsers import clusters_pyramid
+from anyway.parsers.clusters_pyramid import UNKNOWN_SEVERITY, build_zoom_level
+
+KWARGS = {
+    "ne_lat": 32.5,
+    "ne_lng": 35.4,
+    "sw_lat": 31.0,
+    "sw_lng": 34.6,
+    "zoom": 8,
+    "show_fatal": True,
+    "show_severe": True,
+    "show_light": True,
+    "approx": True,
+    "accurate": True,
+    "show_markers": True,
+    "show_accidents": True,
+    "show_rsa": True,
+    "show_urban": 3,
+    "show_intersection": 3,
+    "show_lane": 3,
+    "show_day": 7,
+    "show_holiday": 0,
+    "show_time": 24,
+    "start_time": 25,
+    "end_time": 25,
+    "weather": 0,
+    "road": 0,
+    "separation": 0,
+    "surface": 0,
+    "acctype": 0,
+    "controlmeasure": 0,
+    "district": 0,
+    "case_type": 0,
+    "age_groups": str(CONST.ALL_AGE_GROUPS_LIST).strip("[]").replace(" ", ""),
+    "start_date": datetime.date(2019, 3, 15),
+    "end_date": datetime.date(2019, 7, 10),
+}
+
+
+def create_markers(count, seed=0):
+    rand = random.Random(seed)
+    markers = pd.DataFrame(
+        {
+            "latitude": [round(rand.uniform(31.0, 32.5), 3) for _ in range(count)],
+            "longitude": [round(rand.uniform(34.6, 35.4), 3) for _ in range(count)],
+            "accident_year": [rand.choice([2018, 2019]) for _ in range(count)],
+            "accident_month": [rand.randint(1, 12) for _ in range(count)],
+            "provider_code": [rand.choice([1, 3]) for _ in range(count)],
+            "accident_severity": [rand.choice([1, 2, 3, UNKNOWN_SEVERITY]) for _ in range(count)],
+        }
+    )
+    return markers
+
+
+def compile_sql(criterion):
+    return str(
+        criterion.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    )
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.criteria = []
+
+    def filter(self, criterion):
+        self.criteria.append(criterion)
+        return self
+
+    def order_by(self, *args):
+        return self
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return self.rows
+
+
+class BuildZoomLevelTest(unittest.TestCase):
+    def setUp(self):
+        self.mercator = globaltiles.GlobalMercator()
+        self.markers = create_markers(2000)
+
+    def test_sizes(self):
+        rows = build_zoom_level(self.markers, 8, self.mercator)
+        sizes = pd.DataFrame(rows).fillna({"accident_severity": UNKNOWN_SEVERITY})
+        sizes = sizes.groupby(clusters_pyramid.PYRAMID_KEY_COLUMNS)["size"].sum()
+        counts = self.markers.groupby(clusters_pyramid.PYRAMID_KEY_COLUMNS).size()
+        self.assertTrue(sizes.astype(int).equals(counts.astype(int)))
+        self.assertIn(None, {row["accident_severity"] for row in rows})
+        self.assertNotIn(UNKNOWN_SEVERITY, {row["accident_severity"] for row in rows})
+
+    def test_tiles(self):
+        for zoom in (0, 5, 10):
+            for row in build_zoom_level(self.markers, zoom, self.mercator):
+                meters = self.mercator.LatLonToMeters(row["latitude"], row["longitude"])
+                tile = self.mercator.GoogleTile(*self.mercator.MetersToTile(*meters, zoom), zoom)
+                self.assertEqual((row["tile_x"], row["tile_y"]), tile)
+
+    def test_empty(self):
+        self.assertEqual(build_zoom_level(self.markers.iloc[:0], 8, self.mercator), [])
+
+
+class IsPyramidQueryTest(unittest.TestCase):
+    def test_unfiltered(self):
+        self.assertTrue(is_pyramid_query(KWARGS))
+        self.assertTrue(is_pyramid_query(dict(KWARGS, show_fatal=False, show_rsa=False)))
+
+    def test_filtered(self):
+        for arg, value in (
+            ("show_day", 1),
+            ("road", 2),
+            ("accurate", False),
+            ("show_markers", False),
+            ("age_groups", "1,2,3,4"),
+            ("light_transportation", True),
+        ):
+            self.assertFalse(is_pyramid_query(dict(KWARGS, **{arg: value})), arg)
+        # like the markers query, hours only filter when both are set
+        self.assertTrue(is_pyramid_query(dict(KWARGS, start_time=3)))
+        self.assertFalse(is_pyramid_query(dict(KWARGS, start_time=3, end_time=5)))
+
+
+class PyramidMarkersFilterTest(unittest.TestCase):
+    def test_severity(self):
+        sql = compile_sql(get_pyramid_markers_filter(dict(KWARGS, show_fatal=False)))
+        self.assertIn("clusters_pyramid.accident_severity != 1", sql)
+        self.assertNotIn("accident_severity != 2", sql)
+        self.assertNotIn("accident_severity IN", sql)
+
+    def test_unfiltered(self):
+        sql = compile_sql(get_pyramid_markers_filter(KWARGS))
+        self.assertNotIn("accident_severity", sql)
+        self.assertIn(f"clusters_pyramid.provider_code = {BE_CONST.RSA_PROVIDER_CODE}", sql)
+
+    def test_hide_rsa(self):
+        sql = compile_sql(get_pyramid_markers_filter(dict(KWARGS, show_rsa=False)))
+        self.assertNotIn(f"clusters_pyramid.provider_code = {BE_CONST.RSA_PROVIDER_CODE}", sql)
+
+
+class RetrieveClustersFromPyramidTest(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(1)
+        self.pyramid_rows = sorted(
+            (
+                (rand.uniform(31.0, 32.5), rand.uniform(34.6, 35.4), rand.randint(1, 50))
+                for _ in range(200)
+            ),
+            key=lambda row: -row[2],
+        )
+        self.edge_markers = [
+            SimpleNamespace(latitude=rand.uniform(31.0, 32.5), longitude=rand.uniform(34.6, 35.4))
+            for _ in range(30)
+        ]
+        self.queries = []
+        patchers = [
+            patch.object(clusters_calculator, "db", Mock()),
+            patch.object(
+                clusters_calculator,
+                "query_markers_in_bounding_box",
+                side_effect=self.query_markers_in_bounding_box,
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        clusters_calculator.db.session.query.side_effect = self.query
+        self.edge_ranges = []
+
+    def query(self, *entities):
+        self.queries.append(FakeQuery(self.pyramid_rows))
+        return self.queries[-1]
+
+    def query_markers_in_bounding_box(self, is_thin, **kwargs):
+        self.edge_ranges.append((kwargs["start_date"], kwargs["end_date"]))
+        markers = self.edge_markers[:10] if len(self.edge_ranges) == 1 else self.edge_markers[10:]
+        return SimpleNamespace(accident_markers=markers, rsa_markers=[])
+
+    def test_merges_edges(self):
+        clusters = retrieve_clusters_from_pyramid(**KWARGS)
+        self.assertEqual(
+            self.edge_ranges,
+            [
+                (datetime.date(2019, 3, 15), datetime.date(2019, 4, 1)),
+                (datetime.date(2019, 7, 1), datetime.date(2019, 7, 10)),
+            ],
+        )
+        self.assertEqual(
+            sum(cluster["size"] for cluster in clusters),
+            sum(row[2] for row in self.pyramid_rows) + len(self.edge_markers),
+        )
+        criteria = " AND ".join(compile_sql(c) for c in self.queries[-1].criteria)
+        self.assertIn("clusters_pyramid.zoom = 8", criteria)
+        self.assertIn(
+            "(clusters_pyramid.accident_year, clusters_pyramid.accident_month) >= (2019, 4)",
+            criteria,
+        )
+        self.assertIn(
+            "(clusters_pyramid.accident_year, clusters_pyramid.accident_month) < (2019, 7)",
+            criteria,
+        )
+
+    def test_whole_months(self):
+        kwargs = dict(
+            KWARGS, start_date=datetime.date(2019, 3, 1), end_date=datetime.date(2019, 7, 1)
+        )
+        clusters = retrieve_clusters_from_pyramid(**kwargs)
+        self.assertEqual(self.edge_ranges, [])
+        self.assertEqual(
+            sum(cluster["size"] for cluster in clusters), sum(row[2] for row in self.pyramid_rows)
+        )
+
+    def test_no_whole_month(self):
+        kwargs = dict(
+            KWARGS, start_date=datetime.date(2019, 3, 2), end_date=datetime.date(2019, 3, 30)
+        )
+        self.assertIsNone(retrieve_clusters_from_pyramid(**kwargs))
+
+    def test_zoom_not_built(self):
+        self.pyramid_rows = []
+        self.assertIsNone(retrieve_clusters_from_pyramid(**KWARGS))
+
+    def test_falls_back_to_markers(self):
+        self.pyramid_rows = []
+        clusters = retrieve_clusters(**KWARGS)
+        self.assertEqual(
+            self.edge_ranges, [(datetime.date(2019, 3, 15), datetime.date(2019, 7, 10))]
+        )
+        self.assertEqual(sum(cluster["size"] for cluster in clusters), 10)
+
+
+class BuildPyramidTest(unittest.TestCase):
+    def setUp(self):
+        self.markers = create_markers(500)
+        patchers = [
+            patch.object(clusters_pyramid, "db", MagicMock()),
+            patch.object(clusters_pyramid, "load_markers", return_value=self.markers),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        engine = clusters_pyramid.db.get_engine.return_value
+        self.conn = engine.begin.return_value.__enter__.return_value
+
+    def get_statements(self):
+        return [(compile_sql(args[0]), args[1:]) for args, _ in self.conn.execute.call_args_list]
+
+    def test_years(self):
+        clusters_pyramid.build_pyramid(7, 8, [2019])
+        clusters_pyramid.load_markers.assert_called_once_with([2019])
+        (delete, _), *inserts = self.get_statements()
+        self.assertEqual(
+            delete, "DELETE FROM clusters_pyramid WHERE clusters_pyramid.accident_year IN (2019)"
+        )
+        self.assertEqual([rows[0][0]["zoom"] for _, rows in inserts], [7, 8])
+        self.assertEqual(sum(row["size"] for row in inserts[0][1][0]), len(self.markers))
+
+    def test_all_years(self):
+        clusters_pyramid.build_pyramid(7, 7)
+        (delete, _), _ = self.get_statements()
+        self.assertEqual(delete, "DELETE FROM clusters_pyramid")
+
+
+class RebuildYearsTest(unittest.TestCase):
+    def setUp(self):
+        patchers = [
+            patch.object(clusters_pyramid, "db", Mock()),
+            patch.object(clusters_pyramid, "build_pyramid"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.zoom_range = clusters_pyramid.db.session.query.return_value.one
+
+    def test_years(self):
+        self.zoom_range.return_value = (2, 14)
+        clusters_pyramid.rebuild_years({2020, 2019})
+        clusters_pyramid.build_pyramid.assert_called_once_with(2, 14, [2019, 2020])
+
+    def test_all_years(self):
+        self.zoom_range.return_value = (0, 15)
+        clusters_pyramid.rebuild_years(None)
+        clusters_pyramid.build_pyramid.assert_called_once_with(0, 15, None)
+
+    def test_not_built(self):
+        self.zoom_range.return_value = (None, None)
+        clusters_pyramid.rebuild_years({2019})
+        clusters_pyramid.build_pyramid.assert_not_called()
+
+    def test_no_years(self):
+        clusters_pyramid.rebuild_years(set())
+        self.zoom_range.assert_not_called()
+        clusters_pyramid.build_pyramid.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from anyway.models import AccidentMarker
+from anyway.parsers.cbs import copy_loader
+from anyway.parsers.cbs.copy_loader import (
+    MARKERS_COMPUTED_COLUMNS,
+    CopyStream,
+    copy_rows,
+    format_copy_rows,
+)
+
+
+class CopyLoaderTest(unittest.TestCase):
+    def test_format_copy_rows(self):
+        rows = [
+            {
+                "id": np.int64(7),
+                "x": 187117.5,
+                "created": datetime(2014, 3, 1, 17, 30),
+                "km_accurate": False,
+                "street1_hebrew": "a\\b\tc\nd",
+                "km_raw": None,
+            }
+        ]
+        self.assertEqual(
+            list(format_copy_rows(rows, list(rows[0]) + ["missing"])),
+            ["7\t187117.5\t2014-03-01 17:30:00\tf\ta\\\\b\\tc\\nd\t\\N\t\\N\n"],
+        )
+
+    def test_copy_stream(self):
+        lines = [f"{i}\tvalue\n" for i in range(100)]
+        stream = CopyStream(lines)
+        chunks = []
+        chunk = stream.read(13)
+        while chunk:
+            self.assertLessEqual(len(chunk), 13)
+            chunks.append(chunk)
+            chunk = stream.read(13)
+        self.assertEqual("".join(chunks), "".join(lines))
+        self.assertEqual(CopyStream(lines).read(), "".join(lines))
+
+    def test_copy_rows_computes_geom(self):
+        cursor = Mock(rowcount=1)
+        db = Mock()
+        db.session.connection.return_value.connection.cursor.return_value = cursor
+        rows = [{"id": 1, "longitude": 34.8, "latitude": 32.1}]
+        with patch.object(copy_loader, "db", db):
+            loaded = copy_rows(AccidentMarker.__table__, rows, MARKERS_COMPUTED_COLUMNS)
+        self.assertEqual(loaded, 1)
+        (copy, stream), _ = cursor.copy_expert.call_args
+        self.assertEqual(copy, 'COPY markers_staging ("id", "longitude", "latitude") FROM STDIN')
+        self.assertEqual(stream.read(), "1\t34.8\t32.1\n")
+        self.assertIn(
+            'INSERT INTO markers ("id", "longitude", "latitude", "geom") SELECT "id", "longitude",'
+            ' "latitude", ST_SetSRID(ST_MakePoint(longitude, latitude), 4326) FROM markers_staging',
+            [args[0] for args, _ in cursor.execute.call_args_list],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
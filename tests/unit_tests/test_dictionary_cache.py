@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import patch
+
+from anyway import dictionary_cache
+
+AGE_GROUP = {(1, 2019): {1: "00-04", 2: "05-09"}, (3, 2019): {1: "00-04"}}
+
+
+class DictionaryCacheTest(unittest.TestCase):
+    def setUp(self):
+        dictionary_cache.invalidate()
+
+    def tearDown(self):
+        dictionary_cache.invalidate()
+
+    @patch("anyway.dictionary_cache._load_table", return_value=AGE_GROUP)
+    def test_loads_table_once(self, load_table):
+        self.assertEqual(
+            dictionary_cache.get_dictionary("age_group", 1, 2019), {1: "00-04", 2: "05-09"}
+        )
+        self.assertEqual(dictionary_cache.get_dictionary("age_group", "3", "2019"), {1: "00-04"})
+        self.assertIsNone(dictionary_cache.get_dictionary("age_group", 1, 2008))
+        load_table.assert_called_once_with("age_group")
+
+    @patch("anyway.dictionary_cache._load_table", return_value=AGE_GROUP)
+    def test_invalidate(self, load_table):
+        dictionary_cache.get_dictionary("age_group", 1, 2019)
+        dictionary_cache.invalidate("region")
+        dictionary_cache.get_dictionary("age_group", 1, 2019)
+        self.assertEqual(load_table.call_count, 1)
+        dictionary_cache.invalidate()
+        dictionary_cache.get_dictionary("age_group", 1, 2019)
+        self.assertEqual(load_table.call_count, 2)
+
+    @patch("anyway.dictionary_cache.DICTIONARY_CACHE_TTL", -1)
+    @patch("anyway.dictionary_cache._load_table", return_value=AGE_GROUP)
+    def test_expires(self, load_table):
+        dictionary_cache.get_dictionary("age_group", 1, 2019)
+        dictionary_cache.get_dictionary("age_group", 1, 2019)
+        self.assertEqual(load_table.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from anyway.parsers import geocoding
+from anyway.parsers.location_extraction import geocode_extract
+
+BIALIK_RAMAT_GAN = [
+    {
+        "address_components": [
+            {"long_name": "ביאליק", "short_name": "ביאליק", "types": ["route"]},
+            {"long_name": "רמת גן", "short_name": "רמת גן", "types": ["locality", "political"]},
+            {
+                "long_name": "מחוז תל אביב",
+                "short_name": "מחוז תל אביב",
+                "types": ["administrative_area_level_1", "political"],
+            },
+        ],
+        "formatted_address": "ביאליק, רמת גן, ישראל",
+        "geometry": {"location": {"lat": 32.0861791, "lng": 34.8098462}},
+    }
+]
+
+
+class GeocodingTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = {}
+        patchers = [
+            patch("anyway.parsers.geocoding._get_cached", side_effect=self.cache.get),
+            patch("anyway.parsers.geocoding._set_cached", side_effect=self.set_cached),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def set_cached(self, location, result, created):
+        self.cache[location] = (result, created)
+
+    def test_local_geocoder(self):
+        geocoder = geocoding.LocalGeocoder({"רחוב ביאליק ברמת גן": BIALIK_RAMAT_GAN})
+        self.assertEqual(geocoder.geocode(" רחוב ביאליק  ברמת גן"), BIALIK_RAMAT_GAN)
+        self.assertEqual(geocoder.geocode("רחוב הרצל"), [])
+
+    def test_geocodes_once(self):
+        geocoder = Mock(geocode=Mock(return_value=BIALIK_RAMAT_GAN))
+        cached_geocoder = geocoding.CachedGeocoder(geocoder)
+        self.assertEqual(cached_geocoder.geocode("רחוב ביאליק ברמת גן"), BIALIK_RAMAT_GAN)
+        self.assertEqual(cached_geocoder.geocode("רחוב ביאליק  ברמת גן "), BIALIK_RAMAT_GAN)
+        geocoder.geocode.assert_called_once_with("רחוב ביאליק ברמת גן")
+
+    def test_caches_not_found(self):
+        geocoder = Mock(geocode=Mock(return_value=[]))
+        cached_geocoder = geocoding.CachedGeocoder(geocoder)
+        self.assertIsNone(geocode_extract("רחוב הרצל", cached_geocoder))
+        self.assertIsNone(geocode_extract("רחוב הרצל", cached_geocoder))
+        self.assertEqual(geocoder.geocode.call_count, 1)
+
+    def test_expires(self):
+        self.cache["רחוב ביאליק ברמת גן"] = ([], datetime.now() - timedelta(days=2))
+        geocoder = Mock(geocode=Mock(return_value=BIALIK_RAMAT_GAN))
+        cached_geocoder = geocoding.CachedGeocoder(geocoder, ttl=timedelta(days=1))
+        self.assertEqual(cached_geocoder.geocode("רחוב ביאליק ברמת גן"), BIALIK_RAMAT_GAN)
+        self.assertEqual(self.cache["רחוב ביאליק ברמת גן"][0], BIALIK_RAMAT_GAN)
+
+    def test_geocode_extract(self):
+        geocoder = geocoding.LocalGeocoder({"רחוב ביאליק ברמת גן": BIALIK_RAMAT_GAN})
+        self.assertEqual(
+            geocode_extract("רחוב ביאליק ברמת גן", geocoder),
+            {
+                "street": "ביאליק",
+                "road_no": None,
+                "intersection": None,
+                "city": "רמת גן",
+                "address": "ביאליק, רמת גן, ישראל",
+                "subdistrict": None,
+                "district": "מחוז תל אביב",
+                "geom": {"lat": 32.0861791, "lng": 34.8098462},
+            },
+        )
+
+
+class SetCachedTest(unittest.TestCase):
+    def test_own_transaction(self):
+        with patch("anyway.parsers.geocoding.db") as db:
+            connection = db.get_engine.return_value.begin.return_value.__enter__.return_value
+            geocoding._set_cached("רחוב הרצל", [], datetime(2020, 1, 1))
+        db.session.execute.assert_not_called()
+        (statement,), _ = connection.execute.call_args
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        self.assertIn("INSERT INTO geocode_cache", sql)
+        self.assertIn("ON CONFLICT (location) DO UPDATE", sql)
+        db.get_engine.return_value.begin.return_value.__exit__.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
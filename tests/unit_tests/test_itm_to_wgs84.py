@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from anyway.utilities import CachedItmToWGS84, ItmToWGS84
+
+XS = [187117.0, 219000.5, 178200.0, 187117.0]
+YS = [693833.0, 631500.0, 663800.0, 693833.0]
+
+
+class ItmToWGS84Test(unittest.TestCase):
+    def test_convert_many(self):
+        converter = ItmToWGS84()
+        longitudes, latitudes = converter.convert_many(XS, YS)
+        for x, y, longitude, latitude in zip(XS, YS, longitudes, latitudes):
+            self.assertEqual(converter.convert(x, y), (longitude, latitude))
+
+    def test_convert_many_empty(self):
+        longitudes, latitudes = ItmToWGS84().convert_many([], [])
+        self.assertEqual(len(longitudes), 0)
+        self.assertEqual(len(latitudes), 0)
+
+    def test_cached_convert(self):
+        converter = ItmToWGS84()
+        cached_converter = CachedItmToWGS84()
+        for x, y in zip(XS, YS):
+            self.assertEqual(cached_converter.convert(x, y), converter.convert(x, y))
+        self.assertEqual(cached_converter.convert.cache_info().hits, 1)
+        np.testing.assert_array_equal(
+            cached_converter.convert_many(XS, YS), converter.convert_many(XS, YS)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
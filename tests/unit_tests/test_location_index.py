@@ -0,0 +1,134 @@
+import gzip
+import itertools
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+import pandas as pd
+
+from anyway.parsers import location_index
+from anyway.parsers.news_flash_db_adapter import DBAdapter
+
+MARKERS = pd.DataFrame(
+    {
+        "road1": [1.0, 1.0, 4.0, None, 90.0],
+        "road2": [None, 4.0, None, None, None],
+        "non_urban_intersection_hebrew": [None, "j", None, None, None],
+        "yishuv_name": [None, None, None, "תל אביב -יפו", None],
+        "street1_hebrew": [None, None, None, "דיזנגוף", None],
+        "street2_hebrew": [None, None, None, None, None],
+        "district_hebrew": [None, None, None, "תל אביב", None],
+        "region_hebrew": [None, None, None, "תל אביב", None],
+        "road_segment_name": ["s1", "s2", "s4", None, "s90"],
+        "longitude": [34.80, 34.81, 34.82, 34.78, 35.40],
+        "latitude": [32.10, 32.11, 32.12, 32.08, 31.00],
+    }
+)
+
+
+# unique across the tests, as the loaded index is kept by the module
+BUILD_TIMES = itertools.count()
+
+
+class FakeDB:
+    def __init__(self):
+        self.queries = 0
+        self.saved = None
+
+    def get_markers_for_location_extraction(self):
+        self.queries += 1
+        return MARKERS.copy()
+
+    def get_location_index_created(self):
+        return self.saved and self.saved[1]
+
+    def get_location_index(self):
+        return self.saved
+
+    def save_location_index(self, markers):
+        self.saved = (markers, next(BUILD_TIMES))
+        return self.saved[1]
+
+
+class LocationIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = location_index.LocationIndex(MARKERS)
+
+    def test_match_road(self):
+        self.assertEqual(
+            self.index.match(32.119, 34.819, "כביש בינעירוני", 1)["road_segment_name"], "s2"
+        )
+        self.assertEqual(
+            self.index.match(32.119, 34.819, "כביש בינעירוני", 4)["road_segment_name"], "s4"
+        )
+
+    def test_match_outside_bucket(self):
+        # no road 90 marker in the geohash of the location, the nearest one anywhere is taken
+        self.assertEqual(
+            self.index.match(32.1, 34.8, "כביש בינעירוני", 90)["road_segment_name"], "s90"
+        )
+
+    def test_match_street(self):
+        # the street marker has no road1, so as before all markers are candidates
+        self.assertEqual(self.index.match(32.101, 34.801, "רחוב")["road_segment_name"], "s1")
+
+    def test_get_location_index(self):
+        db = FakeDB()
+        index = location_index.get_location_index(db)
+        self.assertIsNotNone(db.saved)
+        self.assertIs(location_index.get_location_index(db), index)
+        self.assertEqual(db.queries, 1)
+
+        # built by another process
+        other_db = FakeDB()
+        location_index.build(other_db)
+        db.saved = other_db.saved
+        reloaded = location_index.get_location_index(db)
+        self.assertIsNot(reloaded, index)
+        self.assertIs(location_index.get_location_index(db), reloaded)
+        self.assertEqual(db.queries, 1)
+        pd.testing.assert_frame_equal(reloaded.markers, MARKERS)
+
+    def test_saved_as_json(self):
+        db = FakeDB()
+        location_index.build(db)
+        markers, _ = db.saved
+        self.assertEqual(json.loads(gzip.decompress(markers))["yishuv_name"][3], "תל אביב -יפו")
+        index = location_index.LocationIndex(location_index.load_markers(markers))
+        self.assertEqual(
+            {bucket: list(positions) for bucket, positions in index.buckets.items()},
+            {bucket: list(positions) for bucket, positions in self.index.buckets.items()},
+        )
+        pd.testing.assert_series_equal(
+            pd.Series(index.match(32.119, 34.819, "כביש בינעירוני", 4)),
+            pd.Series(self.index.match(32.119, 34.819, "כביש בינעירוני", 4)),
+        )
+
+    def test_corrupt(self):
+        for markers in (b"not gzip", gzip.compress(b"not json"), gzip.compress(b"[1, 2")):
+            db = FakeDB()
+            db.saved = (markers, next(BUILD_TIMES))
+            with self.assertLogs(level="ERROR"):
+                index = location_index.get_location_index(db)
+            self.assertEqual(db.queries, 1)
+            pd.testing.assert_frame_equal(index.markers, MARKERS)
+            self.assertIs(location_index.get_location_index(db), index)
+
+
+class SaveLocationIndexTest(unittest.TestCase):
+    def test_own_transaction(self):
+        db = MagicMock()
+        connection = db.get_engine.return_value.begin.return_value.__enter__.return_value
+        created = DBAdapter(db).save_location_index(b"markers")
+        (statement,), _ = connection.execute.call_args
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        self.assertIn("INSERT INTO location_index", sql)
+        self.assertIn("ON CONFLICT (id) DO UPDATE", sql)
+        self.assertEqual(statement.compile(dialect=postgresql.dialect()).params["created"], created)
+        db.session.commit.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
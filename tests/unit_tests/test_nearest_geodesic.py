@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+from geographiclib.geodesic import Geodesic
+
+from anyway.utilities import haversine_distances, nearest_geodesic
+
+
+def brute_force_nearest(latitude, longitude, latitudes, longitudes):
+    distances = [
+        Geodesic.WGS84.Inverse(latitude, longitude, lat, lng)["s12"]
+        for lat, lng in zip(latitudes, longitudes)
+    ]
+    index = int(np.nanargmin(distances))
+    return index, distances[index]
+
+
+class NearestGeodesicTest(unittest.TestCase):
+    def test_haversine_distances(self):
+        distances = haversine_distances(32.0, 34.8, [32.0, 33.0, np.nan], [34.8, 34.8, 35.0])
+        self.assertEqual(distances[0], 0)
+        self.assertAlmostEqual(
+            distances[1], Geodesic.WGS84.Inverse(32.0, 34.8, 33.0, 34.8)["s12"], delta=1000
+        )
+        self.assertTrue(np.isnan(distances[2]))
+
+    def test_same_as_brute_force(self):
+        rng = np.random.default_rng(0)
+        latitudes = rng.uniform(29.5, 33.3, 2000)
+        longitudes = rng.uniform(34.2, 35.9, 2000)
+        latitudes[::7] = np.nan
+        for latitude, longitude in zip(rng.uniform(29.5, 33.3, 50), rng.uniform(34.2, 35.9, 50)):
+            for k in (1, 8):
+                self.assertEqual(
+                    nearest_geodesic(latitude, longitude, latitudes, longitudes, k=k),
+                    brute_force_nearest(latitude, longitude, latitudes, longitudes),
+                )
+
+    def test_ties_and_missing(self):
+        self.assertEqual(
+            nearest_geodesic(32.0, 34.8, [np.nan, 32.0, 32.0, 32.0], [34.8, 34.9, 35.0, 34.9])[0], 1
+        )
+        self.assertEqual(nearest_geodesic(32.0, 34.8, [np.nan], [34.8]), (None, None))
+        self.assertEqual(nearest_geodesic(32.0, 34.8, [], []), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
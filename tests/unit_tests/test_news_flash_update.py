@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from anyway.parsers import news_flash
+
+
+class FakeDBAdapter:
+    def __init__(self, newsflashes):
+        self.newsflashes = newsflashes
+        self.db = Mock()
+        self.commit = Mock()
+
+    def get_newsflash_ids(self, source=None, after_id=None, limit=None):
+        ids = sorted(
+            newsflash.id
+            for newsflash in self.newsflashes
+            if (source is None or newsflash.source == source)
+            and (after_id is None or newsflash.id > after_id)
+        )
+        return ids[:limit]
+
+    def get_newsflash_by_ids(self, ids):
+        return Mock(all=Mock(return_value=[n for n in self.newsflashes if n.id in ids]))
+
+
+class InProcessExecutor:
+    """
+    runs the calls submitted to it in this process, in order, when the result of one of them is
+    waited for or the executor is shut down
+    """
+
+    def __init__(self, max_workers):
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.run()
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.result = lambda timeout=None: self.run(future) or Future.result(future)
+        self.calls.append((future, fn, args))
+        return future
+
+    def run(self, until=None):
+        for future, fn, args in self.calls:
+            if not future.done() and future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            if future is until:
+                return
+
+
+class UpdateAllInDbTest(unittest.TestCase):
+    def setUp(self):
+        self.newsflashes = [
+            SimpleNamespace(id=newsflash_id, source="ynet" if newsflash_id % 3 else "walla")
+            for newsflash_id in range(1, 11)
+        ]
+        self.db = FakeDBAdapter(self.newsflashes)
+        self.checkpoint_path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+        self.updated = []
+        patchers = [
+            patch("anyway.parsers.news_flash.init_db", return_value=self.db),
+            patch("anyway.parsers.news_flash.update_newsflash", side_effect=self.update),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def update(self, db, newsflash):
+        self.updated.append(newsflash.id)
+        newsflash.accident = newsflash.id % 2 == 0
+
+    def test_batches(self):
+        self.assertEqual(
+            news_flash.update_all_in_db(batch_size=3, checkpoint_path=self.checkpoint_path), 10
+        )
+        self.assertEqual(self.updated, list(range(1, 11)))
+        self.assertEqual(self.db.commit.call_count, 4)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_source(self):
+        news_flash.update_all_in_db("walla", batch_size=2, checkpoint_path=self.checkpoint_path)
+        self.assertEqual(self.updated, [3, 6, 9])
+
+    def test_resume(self):
+        def fail_on_8(db, newsflash):
+            if newsflash.id == 8:
+                raise ValueError
+            self.update(db, newsflash)
+
+        with patch("anyway.parsers.news_flash.update_newsflash", side_effect=fail_on_8):
+            with self.assertRaises(ValueError):
+                news_flash.update_all_in_db(batch_size=3, checkpoint_path=self.checkpoint_path)
+        self.assertEqual(news_flash.read_update_checkpoint(None, self.checkpoint_path), 6)
+        self.assertIsNone(news_flash.read_update_checkpoint("ynet", self.checkpoint_path))
+
+        self.updated.clear()
+        news_flash.update_all_in_db(batch_size=3, resume=True, checkpoint_path=self.checkpoint_path)
+        self.assertEqual(self.updated, [7, 8, 9, 10])
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_workers(self):
+        with patch("anyway.parsers.news_flash.ProcessPoolExecutor", InProcessExecutor):
+            self.assertEqual(
+                news_flash.update_all_in_db(
+                    batch_size=3, workers=2, checkpoint_path=self.checkpoint_path
+                ),
+                10,
+            )
+        self.assertEqual(self.updated, list(range(1, 11)))
+        self.assertEqual(self.db.commit.call_count, 4)
+        self.db.db.get_engine.return_value.dispose.assert_called_once()
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_workers_failure(self):
+        def fail_on_5(db, newsflash):
+            if newsflash.id == 5:
+                raise ValueError
+            self.update(db, newsflash)
+
+        with patch("anyway.parsers.news_flash.ProcessPoolExecutor", InProcessExecutor), patch(
+            "anyway.parsers.news_flash.update_newsflash", side_effect=fail_on_5
+        ):
+            with self.assertRaises(ValueError):
+                news_flash.update_all_in_db(
+                    batch_size=3, workers=2, checkpoint_path=self.checkpoint_path
+                )
+        # the batches after the failed one are cancelled
+        self.assertEqual(self.updated, [1, 2, 3, 4])
+        self.assertEqual(news_flash.read_update_checkpoint(None, self.checkpoint_path), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import random
+import unittest
+from collections import namedtuple
+
+from anyway import globalmaptiles as globaltiles
+from anyway.pymapcluster import calculate_clusters, cluster_markers, cluster_markers_grid
+
+LatLng = namedtuple("LatLng", ["latitude", "longitude"])
+
+
+class ClusterMarkersGridTest(unittest.TestCase):
+    def setUp(self):
+        self.mercator = globaltiles.GlobalMercator()
+        rand = random.Random(0)
+        self.markers = [
+            LatLng(round(rand.uniform(31.0, 32.5), 3), round(rand.uniform(34.6, 35.4), 3))
+            for _ in range(3000)
+        ]
+
+    def test_same_as_cluster_markers(self):
+        for zoom in (7, 10, 13):
+            self.assertEqual(
+                cluster_markers(self.mercator, self.markers, zoom),
+                cluster_markers_grid(self.mercator, self.markers, zoom, block_size=64),
+            )
+
+    def test_empty(self):
+        self.assertEqual(cluster_markers_grid(self.mercator, [], 10), ([], [], []))
+
+    def test_calculate_clusters(self):
+        clusters = calculate_clusters(self.markers, 8)
+        self.assertEqual(sum(cluster["size"] for cluster in clusters), len(self.markers))
+        self.assertEqual(set(clusters[0]), {"longitude", "latitude", "size"})